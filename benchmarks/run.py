@@ -0,0 +1,199 @@
+"""
+Run the jackdir benchmark scenarios against a synthetic repository.
+
+    python -m benchmarks.run --files 10000 --output results.json
+    python -m benchmarks.run --files 10000 --baseline results.json --threshold 0.2
+
+Each scenario is timed --repeat times; the median is what gets compared.
+With --baseline, the run fails (exit status 1) when a scenario's median is
+more than --threshold slower than the baseline's.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from benchmarks.synthetic_repo import generate
+from jackdir.entities.directory_processor import DirectoryProcessor
+from jackdir.use_cases.copy_to_clipboard import CopyMultiplePathsUseCase
+
+
+class NullClipboard:
+    """
+    Stands in for the system clipboard, which isn't available headless.
+    """
+
+    def copy(self, text):
+        self.size = len(text)
+
+
+def _processor():
+    # Same settings as the CLI, without the on-disk content cache
+    return DirectoryProcessor(respect_gitignore=True)
+
+
+def scenario_generate_tree(root):
+    _processor().generate_tree(root)
+
+
+def scenario_collect_file_contents(root):
+    _processor().collect_file_contents(root)
+
+
+def scenario_copy_multiple_paths(root):
+    # A directory plus overlapping and separate picks, like a UI selection
+    children = sorted(os.path.join(root, name) for name in os.listdir(root) if not name.startswith('.'))
+    paths = children[:3] + [root] + children[-2:]
+    CopyMultiplePathsUseCase(_processor(), NullClipboard()).execute(paths)
+
+
+def _flask_client(tree_cache):
+    from jackdir.flask_app import app
+    app.config['TREE_CACHE'] = tree_cache
+    return app.test_client()
+
+
+def _api_tree(root, tree_format, accept='application/json'):
+    resp = _flask_client(False).post('/api/tree', json={'directory': root, 'format': tree_format},
+                                     headers={'Accept': accept})
+    assert resp.status_code == 200, resp.status_code
+    # Reported next to the timings, to compare the wire formats
+    return len(resp.data)
+
+
+def scenario_api_tree(root):
+    return _api_tree(root, 'nested')
+
+
+def scenario_api_tree_flat(root):
+    return _api_tree(root, 'flat')
+
+
+def scenario_api_tree_flat_msgpack(root):
+    return _api_tree(root, 'flat', 'application/msgpack')
+
+
+def scenario_api_tree_lazy(root):
+    resp = _flask_client(False).post('/api/tree', json={'directory': root, 'lazy': True, 'depth': 1})
+    assert resp.status_code == 200, resp.status_code
+
+
+def scenario_api_copy_selected(root):
+    with mock.patch('jackdir.flask_app.ClipboardAdapter', NullClipboard):
+        resp = _flask_client(False).post('/api/copy_selected', json={
+            'selected_paths': [root], 'use_cache': False,
+        })
+    assert resp.get_json()['error'] is None, resp.get_json()
+
+
+SCENARIOS = {
+    'generate_tree': scenario_generate_tree,
+    'collect_file_contents': scenario_collect_file_contents,
+    'copy_multiple_paths': scenario_copy_multiple_paths,
+    'api_tree': scenario_api_tree,
+    'api_tree_flat': scenario_api_tree_flat,
+    'api_tree_lazy': scenario_api_tree_lazy,
+    'api_copy_selected': scenario_api_copy_selected,
+}
+if importlib.util.find_spec('msgpack') is not None:
+    SCENARIOS['api_tree_flat_msgpack'] = scenario_api_tree_flat_msgpack
+
+
+def time_scenario(func, root, repeat, warmup=1):
+    # Untimed runs first, so imports and first-use setup don't skew the numbers
+    for _ in range(warmup):
+        func(root)
+    runs = []
+    size = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = func(root)
+        runs.append(time.perf_counter() - start)
+    result = {'median': statistics.median(runs), 'min': min(runs), 'runs': runs}
+    if size is not None:
+        result['bytes'] = size
+    return result
+
+
+def check_regressions(results, baseline, threshold):
+    """
+    Compare medians with a baseline run. Returns a list of messages, one per
+    scenario that got more than 'threshold' (a fraction) slower.
+    """
+    failures = []
+    for name, result in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        ratio = result['median'] / before['median'] if before['median'] else 1.0
+        if ratio > 1 + threshold:
+            failures.append(
+                f"{name}: {result['median']:.3f}s vs {before['median']:.3f}s baseline ({ratio - 1:+.0%})"
+            )
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark jackdir on a synthetic repository.')
+    parser.add_argument('--files', type=int, default=10000, help='Source files in the synthetic tree (default: 10000)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic tree (default: 0)')
+    parser.add_argument('--tree-dir', help='Where to generate (and reuse) the tree (default: a directory under the system temp dir)')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='Scenario to run; repeat to pick several (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per scenario (default: 3)')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs before the timed ones (default: 1)')
+    parser.add_argument('--output', '-o', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Results file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown against the baseline, as a fraction (default: 0.2)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tree_dir = args.tree_dir or os.path.join(tempfile.gettempdir(), f'jackdir-bench-{args.files}-{args.seed}')
+
+    start = time.perf_counter()
+    summary = generate(tree_dir, args.files, args.seed)
+    print(f"Tree ready in {time.perf_counter() - start:.1f}s: {tree_dir}", file=sys.stderr)
+
+    results = {
+        'meta': {
+            'files': args.files,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'tree': summary,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'scenarios': {},
+    }
+    for name in args.scenario or SCENARIOS:
+        result = time_scenario(SCENARIOS[name], tree_dir, args.repeat, args.warmup)
+        results['scenarios'][name] = result
+        size = f"  {result['bytes']:,} bytes" if 'bytes' in result else ''
+        print(f"{name:<24} median {result['median']:.3f}s  min {result['min']:.3f}s{size}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = check_regressions(results, baseline, args.threshold)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        if failures:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
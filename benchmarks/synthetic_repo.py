@@ -0,0 +1,162 @@
+"""
+Deterministic generator for large synthetic source trees.
+
+The same (files, seed) always produces the same tree: directory layout, file
+names, sizes and contents. Besides ordinary source files, the tree contains
+what jackdir has to cope with in real repositories: nested .gitignore files
+and the directories they ignore, node_modules / __pycache__ / build output,
+hidden files, binaries and a few large files.
+"""
+import json
+import os
+import random
+import shutil
+
+# Written last, so an interrupted generation is never mistaken for a complete one
+MARKER = '.jackdir-bench.json'
+
+SOURCE_EXTENSIONS = ['.py', '.js', '.ts', '.md', '.txt', '.json', '.css', '.html', '.go', '.rs']
+DIR_WORDS = [
+    'src', 'lib', 'core', 'utils', 'api', 'models', 'views', 'tests', 'docs', 'config',
+    'services', 'handlers', 'internal', 'pkg', 'common', 'components', 'hooks', 'assets',
+]
+FILE_WORDS = [
+    'main', 'index', 'app', 'client', 'server', 'helpers', 'parser', 'types', 'schema',
+    'router', 'store', 'cache', 'loader', 'worker', 'config', 'errors', 'format', 'io',
+]
+LINE_TEMPLATES = [
+    'def {w}_{n}(value):\n    return value + {n}\n',
+    'const {w}{n} = require("./{w}");\n',
+    '# {w} {n}: lorem ipsum dolor sit amet, consectetur adipiscing elit\n',
+    'class {W}{n}:\n    pass\n',
+    '{{"{w}": {n}, "enabled": true}}\n',
+]
+
+# Share of files (before ignored/generated extras) of each special kind
+BINARY_SHARE = 0.02
+LARGE_SHARE = 0.001
+HIDDEN_SHARE = 0.01
+LARGE_FILE_BYTES = 2 * 1024 * 1024
+# Files per directory, and subdirectories per directory
+FILES_PER_DIR = (5, 40)
+SUBDIRS_PER_DIR = (1, 6)
+
+
+def _text(rng, size):
+    parts = []
+    total = 0
+    while total < size:
+        word = rng.choice(FILE_WORDS)
+        line = rng.choice(LINE_TEMPLATES).format(w=word, W=word.capitalize(), n=rng.randrange(1000))
+        parts.append(line)
+        total += len(line)
+    return ''.join(parts)[:size]
+
+
+def _source_size(rng):
+    # Mostly small files with a long tail, like real code bases
+    return min(int(rng.lognormvariate(7.5, 1.1)), 256 * 1024)
+
+
+def _write(path, data):
+    mode = 'wb' if isinstance(data, bytes) else 'w'
+    with open(path, mode) as f:
+        f.write(data)
+
+
+def _layout(rng, files):
+    """
+    Plan the directory tree: a list of relative directory paths with the
+    number of source files each one gets, adding up to 'files'.
+    """
+    dirs = [('', rng.randint(*FILES_PER_DIR))]
+    planned = dirs[0][1]
+    frontier = ['']
+    while planned < files:
+        parent = frontier.pop(0) if len(frontier) > 1 and rng.random() < 0.7 else rng.choice(frontier)
+        depth = parent.count('/') + 1 if parent else 0
+        for _ in range(rng.randint(*SUBDIRS_PER_DIR)):
+            name = f'{rng.choice(DIR_WORDS)}_{len(dirs)}'
+            rel = f'{parent}/{name}' if parent else name
+            count = min(rng.randint(*FILES_PER_DIR), files - planned)
+            dirs.append((rel, count))
+            planned += count
+            if depth < 12:
+                frontier.append(rel)
+            if planned >= files:
+                break
+        if not frontier:
+            frontier.append(rng.choice(dirs)[0])
+    return dirs
+
+
+def generate(root, files=10000, seed=0):
+    """
+    Create a synthetic repository with about 'files' source files under
+    root (extra ignored and generated files come on top). Returns a summary
+    dict. An existing tree generated with the same parameters is reused.
+    """
+    params = {'files': files, 'seed': seed, 'version': 1}
+    marker_path = os.path.join(root, MARKER)
+    try:
+        with open(marker_path) as f:
+            summary = json.load(f)
+        if summary['params'] == params:
+            return summary
+    except (OSError, ValueError, KeyError):
+        pass
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.makedirs(root)
+
+    rng = random.Random(seed)
+    summary = {'params': params, 'source_files': 0, 'binary_files': 0, 'large_files': 0,
+               'hidden_files': 0, 'ignored_files': 0, 'directories': 0, 'bytes': 0}
+
+    _write(os.path.join(root, '.gitignore'), '*.log\n/coverage/\n*.tmp\n!keep.tmp\n')
+    os.makedirs(os.path.join(root, '.git', 'info'))
+    _write(os.path.join(root, '.git', 'info', 'exclude'), '*.swp\n')
+
+    for rel_dir, count in _layout(rng, files):
+        path = os.path.join(root, *rel_dir.split('/')) if rel_dir else root
+        os.makedirs(path, exist_ok=True)
+        summary['directories'] += 1
+        for i in range(count):
+            roll = rng.random()
+            if roll < LARGE_SHARE:
+                name, data = f'dump_{i}.sql', _text(rng, LARGE_FILE_BYTES)
+                summary['large_files'] += 1
+            elif roll < LARGE_SHARE + BINARY_SHARE:
+                name, data = f'image_{i}.png', b'\x89PNG\r\n\x1a\n\0' + rng.randbytes(rng.randrange(512, 64 * 1024))
+                summary['binary_files'] += 1
+            elif roll < LARGE_SHARE + BINARY_SHARE + HIDDEN_SHARE:
+                name, data = f'.{rng.choice(FILE_WORDS)}rc_{i}', _text(rng, 200)
+                summary['hidden_files'] += 1
+            else:
+                name = f'{rng.choice(FILE_WORDS)}_{i}{rng.choice(SOURCE_EXTENSIONS)}'
+                data = _text(rng, _source_size(rng))
+                summary['source_files'] += 1
+            _write(os.path.join(path, name), data)
+            summary['bytes'] += len(data)
+
+        # Things that are excluded: logs, nested ignores, generated folders
+        if rng.random() < 0.05:
+            _write(os.path.join(path, f'debug_{rel_dir.count("/")}.log'), _text(rng, 2000))
+            summary['ignored_files'] += 1
+        if rng.random() < 0.03:
+            _write(os.path.join(path, '.gitignore'), 'generated/\n*.snap\n')
+            os.makedirs(os.path.join(path, 'generated'))
+            for i in range(20):
+                _write(os.path.join(path, 'generated', f'out_{i}.js'), _text(rng, 500))
+            summary['ignored_files'] += 20
+        if rng.random() < 0.01:
+            for folder in ('node_modules/left-pad', '__pycache__', 'build'):
+                target = os.path.join(path, *folder.split('/'))
+                os.makedirs(target, exist_ok=True)
+                for i in range(30):
+                    _write(os.path.join(target, f'gen_{i}.js'), _text(rng, 300))
+                summary['ignored_files'] += 30
+
+    with open(marker_path, 'w') as f:
+        json.dump(summary, f)
+    return summary
@@ -0,0 +1,56 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Compressed output is flushed to the client at least every this many input bytes
+FLUSH_EVERY = 1024 * 1024
+
+
+def supported_encodings():
+    encodings = ['gzip']
+    if zstandard is not None:
+        encodings.append('zstd')
+    return encodings
+
+
+class CompressionAdapter:
+    """
+    Compresses a stream of text chunks on the fly, for use as an HTTP
+    Content-Encoding. Output is flushed after the first chunk (so clients
+    get bytes right away) and then every FLUSH_EVERY input bytes.
+    """
+
+    def __init__(self, encoding):
+        if encoding not in supported_encodings():
+            raise ValueError(f'Unsupported compression: {encoding}')
+        self.encoding = encoding
+
+    def _compressor(self):
+        if self.encoding == 'gzip':
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+            return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+        compressor = zstandard.ZstdCompressor().compressobj()
+        return (
+            compressor.compress,
+            lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+            compressor.flush,
+        )
+
+    def compress(self, chunks):
+        compress, sync_flush, finish = self._compressor()
+        pending = 0
+        first = True
+        for chunk in chunks:
+            data = chunk.encode('utf-8', 'surrogateescape')
+            out = compress(data)
+            pending += len(data)
+            if first or pending >= FLUSH_EVERY:
+                out += sync_flush()
+                pending = 0
+                first = False
+            if out:
+                yield out
+        yield finish()
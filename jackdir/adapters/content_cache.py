@@ -0,0 +1,170 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Total size of cached content kept on disk before LRU eviction kicks in
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def default_cache_dir():
+    if os.environ.get('JACKDIR_CACHE_DIR'):
+        return os.environ['JACKDIR_CACHE_DIR']
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'jackdir')
+
+
+def open_content_cache(cache_dir=None):
+    """
+    Open the content cache, or return None if it can't be used
+    (e.g. read-only home directory), so callers just run uncached.
+    """
+    try:
+        return ContentCache(cache_dir)
+    except (OSError, sqlite3.Error):
+        return None
+
+
+class ContentCache:
+    """
+    Persistent cache of rendered file contents, stored in a SQLite database.
+    Entries are keyed by (path, size, mtime_ns, inode) plus the reader settings,
+    so any change to the file produces a new key and stale entries simply age
+    out. The least recently used entries are evicted once the cache grows past
+    max_bytes. Safe to share between threads.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.cache_dir, 'content.db'),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, content TEXT NOT NULL, '
+            'size INTEGER NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    @staticmethod
+    def make_key(path, stat_result, signature=''):
+        raw = f'{path}\0{stat_result.st_size}\0{stat_result.st_mtime_ns}\0{stat_result.st_ino}\0{signature}'
+        return hashlib.sha1(raw.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT content FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def put(self, key, content):
+        size = len(content.encode('utf-8', 'surrogateescape'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, content, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, content, size, time.time()),
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until we are back under 90% of the limit
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute('SELECT key, size FROM entries ORDER BY last_used')
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany('DELETE FROM entries WHERE key = ?', evicted)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM entries')
+            self._conn.execute('VACUUM')
+            self._total_bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# In-memory content kept by a long-running process (the daemon)
+DEFAULT_MEMORY_BYTES = 512 * 1024 * 1024
+
+
+class MemoryContentCache:
+    """
+    LRU cache of rendered file contents held in memory, with the same
+    interface as ContentCache. Misses fall through to an optional backing
+    ContentCache, and hits from it are kept in memory from then on.
+    Sizes are counted in characters. Safe to share between threads.
+    """
+
+    make_key = staticmethod(ContentCache.make_key)
+
+    def __init__(self, backing=None, max_bytes=DEFAULT_MEMORY_BYTES):
+        self.backing = backing
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _remember(self, key, content):
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old)
+            self._entries[key] = content
+            self._total_bytes += len(content)
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def get(self, key):
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+                return content
+        if self.backing is None:
+            return None
+        content = self.backing.get(key)
+        if content is not None:
+            self._remember(key, content)
+        return content
+
+    def put(self, key, content):
+        self._remember(key, content)
+        if self.backing is not None:
+            self.backing.put(key, content)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+        if self.backing is not None:
+            self.backing.clear()
+
+    def close(self):
+        if self.backing is not None:
+            self.backing.close()
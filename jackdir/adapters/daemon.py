@@ -0,0 +1,224 @@
+import json
+import os
+import socket
+import socketserver
+import struct
+from jackdir.adapters.content_cache import default_cache_dir
+
+# Frames are a one-byte kind and a payload length, followed by the payload
+_FRAME = struct.Struct('!cI')
+REQUEST = b'Q'    # client -> daemon: JSON options
+DATA = b'D'       # daemon -> client: an output chunk (UTF-8)
+RESULT = b'R'     # daemon -> client: JSON result, ends a successful run
+ERROR = b'X'      # daemon -> client: error message, ends a failed run
+
+# Payloads are split into frames of at most this many bytes
+MAX_FRAME = 1024 * 1024
+
+
+def default_socket_path():
+    """
+    $JACKDIR_SOCKET, or jackdir.sock in $XDG_RUNTIME_DIR, or daemon.sock in
+    the cache directory.
+    """
+    path = os.environ.get('JACKDIR_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'jackdir.sock')
+    return os.path.join(default_cache_dir(), 'daemon.sock')
+
+
+class DaemonUnavailable(Exception):
+    """
+    No daemon is listening on the socket.
+    """
+
+
+class DaemonError(Exception):
+    """
+    The daemon failed while handling a request.
+    """
+
+
+def send_frame(sock, kind, payload=b''):
+    for start in range(0, max(len(payload), 1), MAX_FRAME):
+        part = payload[start:start + MAX_FRAME]
+        sock.sendall(_FRAME.pack(kind, len(part)) + part)
+
+
+def _read_exactly(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise EOFError('connection closed')
+    return data
+
+
+def read_frame(f):
+    kind, size = _FRAME.unpack(_read_exactly(f, _FRAME.size))
+    return kind, _read_exactly(f, size)
+
+
+class SocketStreamAdapter:
+    """
+    StreamAdapter stand-in used by the daemon: output chunks go back to the
+    client as DATA frames instead of to a file.
+    """
+
+    path = None
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, chunks):
+        buffered = []
+        size = 0
+        for chunk in chunks:
+            buffered.append(chunk)
+            size += len(chunk)
+            # Fewer, larger frames: one syscall per ~64K of output
+            if size >= 64 * 1024:
+                send_frame(self.sock, DATA, ''.join(buffered).encode('utf-8', 'surrogateescape'))
+                buffered = []
+                size = 0
+        if buffered:
+            send_frame(self.sock, DATA, ''.join(buffered).encode('utf-8', 'surrogateescape'))
+
+
+class DaemonClient:
+    """
+    Runs a request on the daemon. Stands in for a DirectoryProcessor in the
+    use cases: iter_output() yields the output the daemon streams back.
+    """
+
+    stats = None
+
+    def __init__(self, socket_path, options):
+        self.options = options
+        # Set from the daemon's RESULT frame once the output has been read
+        self.result = None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except OSError as e:
+            sock.close()
+            raise DaemonUnavailable(str(e))
+        self._sock = sock
+
+    def iter_output(self, dir_path):
+        options = dict(self.options, directory=dir_path)
+        try:
+            send_frame(self._sock, REQUEST, json.dumps(options).encode('utf-8'))
+            with self._sock.makefile('rb') as f:
+                while True:
+                    kind, payload = read_frame(f)
+                    if kind == DATA:
+                        yield payload.decode('utf-8', 'surrogateescape')
+                    elif kind == RESULT:
+                        self.result = json.loads(payload)
+                        return
+                    else:
+                        raise DaemonError(payload.decode('utf-8', 'replace'))
+        except (OSError, EOFError) as e:
+            raise DaemonError(f'lost the connection to the daemon: {e}')
+        finally:
+            self._sock.close()
+
+    def close(self):
+        self._sock.close()
+
+
+class DaemonServer:
+    """
+    Serves requests on a Unix socket, one thread per connection. Each
+    request is passed to handle(options, stream_adapter), whose return
+    value (a JSON-serialisable dict) is sent back when the output is done.
+    A request with {"command": "stop"} shuts the daemon down.
+    """
+
+    def __init__(self, socket_path, handle):
+        self.socket_path = socket_path
+        self.handle = handle
+        self._remove_stale_socket()
+        os.makedirs(os.path.dirname(socket_path) or '.', exist_ok=True)
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server._serve_connection(self.request)
+
+        # Only the current user may connect
+        old_umask = os.umask(0o077)
+        try:
+            self._server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        finally:
+            os.umask(old_umask)
+        # server_close() waits for requests in progress, including a "stop"
+        # that is still answering its client
+        self._server.daemon_threads = False
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f'A daemon is already listening on {self.socket_path}')
+
+    def _serve_connection(self, sock):
+        with sock.makefile('rb') as f:
+            try:
+                kind, payload = read_frame(f)
+            except EOFError:
+                return
+        if kind != REQUEST:
+            send_frame(sock, ERROR, b'expected a request')
+            return
+        options = json.loads(payload)
+        if options.get('command') == 'stop':
+            # Only answer once the socket is gone, so the next client can't connect to it
+            self._server.shutdown()
+            self._unlink_socket()
+            send_frame(sock, RESULT, b'{}')
+            return
+        try:
+            result = self.handle(options, SocketStreamAdapter(sock))
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; nothing left to tell it
+            return
+        except Exception as e:
+            send_frame(sock, ERROR, str(e).encode('utf-8', 'replace'))
+            return
+        send_frame(sock, RESULT, json.dumps(result or {}).encode('utf-8'))
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            self._unlink_socket()
+
+    def _unlink_socket(self):
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+
+    def shutdown(self):
+        self._server.shutdown()
+
+
+def stop_daemon(socket_path):
+    """
+    Ask the daemon on socket_path to exit. Raises DaemonUnavailable if none runs.
+    """
+    client = DaemonClient(socket_path, {'command': 'stop'})
+    for _ in client.iter_output(None):
+        pass
@@ -0,0 +1,203 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+# inotify event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+    | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Seconds between two scans of the polling watcher
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+class InotifyWatcher:
+    """
+    Watches individual directories with Linux inotify (through ctypes) and
+    calls on_change(dir_path, name) for every change inside them. 'name' is
+    the changed entry ('' if unknown), or None when the directory itself went
+    away or events were lost (callers should then drop everything under
+    dir_path).
+    """
+
+    def __init__(self, on_change):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.on_change = on_change
+        self._paths = {}
+        self._wds = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='jackdir-inotify', daemon=True)
+        self._thread.start()
+
+    def watch(self, dir_path):
+        """
+        Start watching dir_path. Returns False if the watch couldn't be added
+        (e.g. the inotify watch limit was reached).
+        """
+        with self._lock:
+            if dir_path in self._wds:
+                return True
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), _WATCH_MASK)
+            if wd < 0:
+                return False
+            self._wds[dir_path] = wd
+            self._paths[wd] = dir_path
+            return True
+
+    def unwatch(self, dir_path):
+        with self._lock:
+            wd = self._wds.pop(dir_path, None)
+            if wd is None:
+                return
+            del self._paths[wd]
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if not ready:
+                    continue
+                data = os.read(self._fd, 64 * 1024)
+            except OSError:
+                return
+            self._dispatch(data)
+
+    def _dispatch(self, data):
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            raw_name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length]
+            offset += _EVENT_HEADER.size + length
+            name = os.fsdecode(raw_name.rstrip(b'\0'))
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, so nothing we cached can be trusted
+                with self._lock:
+                    watched = list(self._wds)
+                for dir_path in watched:
+                    self.on_change(dir_path, None)
+                continue
+            with self._lock:
+                dir_path = self._paths.get(wd)
+                if mask & IN_IGNORED and dir_path is not None:
+                    del self._paths[wd]
+                    self._wds.pop(dir_path, None)
+            if dir_path is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                self.on_change(dir_path, None)
+            else:
+                self.on_change(dir_path, name)
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """
+    Portable fallback: every 'interval' seconds, re-stats each watched
+    directory (and its .gitignore) and reports a change when the mtime moved.
+    Entries added, removed or renamed are caught this way; in-place edits of
+    regular files are not, since they don't touch the directory's mtime.
+    """
+
+    def __init__(self, on_change, interval=DEFAULT_POLL_INTERVAL):
+        self.on_change = on_change
+        self.interval = interval
+        self._stamps = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='jackdir-poller', daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _stamp(dir_path):
+        try:
+            dir_mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return None
+        try:
+            ignore_mtime = os.stat(os.path.join(dir_path, '.gitignore')).st_mtime_ns
+        except OSError:
+            ignore_mtime = None
+        return dir_mtime, ignore_mtime
+
+    def watch(self, dir_path):
+        stamp = self._stamp(dir_path)
+        with self._lock:
+            self._stamps[dir_path] = stamp
+        return True
+
+    def unwatch(self, dir_path):
+        with self._lock:
+            self._stamps.pop(dir_path, None)
+
+    def poll(self):
+        """
+        Check every watched directory once; called by the background thread.
+        """
+        with self._lock:
+            watched = list(self._stamps.items())
+        for dir_path, old_stamp in watched:
+            stamp = self._stamp(dir_path)
+            if stamp == old_stamp:
+                continue
+            with self._lock:
+                if stamp is None:
+                    self._stamps.pop(dir_path, None)
+                else:
+                    self._stamps[dir_path] = stamp
+            if stamp is None:
+                self.on_change(dir_path, None)
+            elif old_stamp is not None and stamp[1] != old_stamp[1]:
+                self.on_change(dir_path, '.gitignore')
+            else:
+                self.on_change(dir_path, '')
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.poll()
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join()
+
+
+def create_watcher(on_change, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Use inotify where available, and fall back to polling elsewhere.
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(on_change)
+        except (OSError, AttributeError) as e:
+            logging.info(f"inotify unavailable ({e}), falling back to polling")
+    return PollingWatcher(on_change, poll_interval)
@@ -0,0 +1,162 @@
+import os
+import re
+import subprocess
+
+# Entry modes that aren't regular files or symlinks: submodules and the
+# directory entries of a sparse index
+_GITLINK = 0o160000
+_SPARSE_DIR = 0o040000
+
+_EXTENDED_FLAG = 0x4000
+
+
+class GitError(Exception):
+    """
+    The directory is not in a git repository, or git failed.
+    """
+
+
+def find_repository(path):
+    """
+    (work tree, git directory) of the repository containing path, or None.
+    A '.git' file (worktrees, submodules) is followed to its git directory.
+    """
+    current = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(current, '.git')
+        if os.path.isdir(dot_git):
+            return current, dot_git
+        if os.path.isfile(dot_git):
+            with open(dot_git) as f:
+                line = f.readline().strip()
+            if line.startswith('gitdir:'):
+                return current, os.path.normpath(os.path.join(current, line[len('gitdir:'):].strip()))
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def _hash_size(git_dir):
+    # Repositories using SHA-256 object names say so in their config
+    try:
+        with open(os.path.join(git_dir, 'config')) as f:
+            config = f.read()
+    except OSError:
+        return 20
+    return 32 if re.search(r'^\s*objectformat\s*=\s*sha256\s*$', config, re.I | re.M) else 20
+
+
+def read_index(git_dir):
+    """
+    Paths (POSIX-style, relative to the work tree) of the files tracked in
+    git_dir's index, in index order. Understands index versions 2 to 4.
+    """
+    index_path = os.path.join(git_dir, 'index')
+    try:
+        with open(index_path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        # A repository without commits or staged files has no index yet
+        return []
+    if data[:4] != b'DIRC':
+        raise GitError(f'Not a git index: {index_path}')
+    version = int.from_bytes(data[4:8], 'big')
+    count = int.from_bytes(data[8:12], 'big')
+    if version not in (2, 3, 4):
+        raise GitError(f'Unsupported git index version {version}: {index_path}')
+
+    # ctime, mtime, dev, ino, mode, uid, gid, size (4 bytes each but the
+    # times, which are 8), then the object name and 16 bits of flags
+    hash_size = _hash_size(git_dir)
+    flags_at = 40 + hash_size
+    paths = []
+    previous = b''
+    pos = 12
+    for _ in range(count):
+        start = pos
+        mode = int.from_bytes(data[start + 24:start + 28], 'big')
+        flags = int.from_bytes(data[start + flags_at:start + flags_at + 2], 'big')
+        pos = start + flags_at + 2
+        if version >= 3 and flags & _EXTENDED_FLAG:
+            pos += 2
+        if version == 4:
+            # The name is the previous one minus N trailing bytes, plus a suffix
+            strip = data[pos] & 0x7f
+            while data[pos] & 0x80:
+                pos += 1
+                strip = ((strip + 1) << 7) | (data[pos] & 0x7f)
+            pos += 1
+            end = data.index(b'\0', pos)
+            name = previous[:len(previous) - strip] + data[pos:end]
+            pos = end + 1
+        else:
+            end = data.index(b'\0', pos)
+            name = data[pos:end]
+            # Entries are NUL-padded to a multiple of eight bytes
+            pos = start + ((end - start) // 8 + 1) * 8
+        previous = name
+        # Conflicted files have up to three entries (one per stage), in a row
+        if mode & 0o170000 in (_GITLINK, _SPARSE_DIR) or (paths and paths[-1] == name):
+            continue
+        paths.append(name)
+    return [os.fsdecode(path) for path in paths]
+
+
+def _git(work_tree, *args):
+    try:
+        result = subprocess.run(['git', '-C', work_tree, *args], capture_output=True)
+    except FileNotFoundError:
+        raise GitError('git is not installed')
+    if result.returncode != 0:
+        raise GitError(result.stderr.decode('utf-8', 'replace').strip())
+    return [os.fsdecode(path) for path in result.stdout.split(b'\0') if path]
+
+
+def untracked_files(work_tree):
+    """
+    Files that aren't tracked and aren't ignored by .gitignore and friends.
+    """
+    return _git(work_tree, 'ls-files', '--others', '--exclude-standard', '-z')
+
+
+def changed_files(work_tree, ref):
+    """
+    Tracked files whose content in the work tree differs from ref (committed
+    or not). Deleted files are left out.
+    """
+    return _git(work_tree, 'diff', '--name-only', '--no-renames', '--diff-filter=d', '-z', ref, '--')
+
+
+class GitFileSource:
+    """
+    File list for DirectoryProcessor(file_source=...): the files git knows
+    about instead of a walk of the directory. Tracked files come straight
+    from .git/index; untracked files and --changed-since run git.
+    """
+
+    def __init__(self, untracked=False, changed_since=None):
+        self.untracked = untracked
+        self.changed_since = changed_since
+
+    def list_files(self, dir_path):
+        """
+        Sorted POSIX-style paths, relative to dir_path, of the files below it.
+        """
+        repository = find_repository(dir_path)
+        if repository is None:
+            raise GitError(f'Not a git repository: {dir_path}')
+        work_tree, git_dir = repository
+
+        if self.changed_since is not None:
+            paths = set(changed_files(work_tree, self.changed_since))
+        else:
+            paths = set(read_index(git_dir))
+        if self.untracked:
+            paths.update(untracked_files(work_tree))
+
+        prefix = os.path.relpath(os.path.abspath(dir_path), work_tree).replace(os.sep, '/')
+        if prefix == '.':
+            return sorted(paths)
+        prefix += '/'
+        return sorted(path[len(prefix):] for path in paths if path.startswith(prefix))
@@ -0,0 +1,113 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from openai import OpenAI
+
+# Clients kept alive at most; the least recently used one is closed beyond
+# this (once no request is using it any more)
+MAX_CLIENTS = 16
+
+
+class LLMAdapter:
+    """
+    Talks to an OpenAI-compatible Responses API. Clients (and the HTTP
+    connection pools inside them) are created once per API key and reused
+    across requests. base_url points at another backend, e.g. a local
+    stand-in server; None means the OpenAI default.
+    """
+
+    def __init__(self, base_url=None, client_factory=OpenAI, max_clients=MAX_CLIENTS):
+        self.base_url = base_url
+        self.client_factory = client_factory
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        # id(client) -> calls in progress on it
+        self._leases = {}
+        # id(client) -> client dropped from the pool while in use, to close
+        # when its last call ends
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def client(self, api_key):
+        return self._get(api_key, lease=False)
+
+    def _get(self, api_key, lease):
+        with self._lock:
+            client = self._clients.get(api_key)
+            evicted = []
+            if client is not None:
+                self._clients.move_to_end(api_key)
+            else:
+                client = self.client_factory(api_key=api_key, base_url=self.base_url)
+                self._clients[api_key] = client
+                while len(self._clients) > self.max_clients:
+                    old = self._clients.popitem(last=False)[1]
+                    if self._leases.get(id(old)):
+                        self._retired[id(old)] = old
+                    else:
+                        evicted.append(old)
+            if lease:
+                self._leases[id(client)] = self._leases.get(id(client), 0) + 1
+        for old in evicted:
+            old.close()
+        return client
+
+    @contextmanager
+    def _leased(self, api_key):
+        # The client for api_key, which isn't closed while the block runs
+        client = self._get(api_key, lease=True)
+        try:
+            yield client
+        finally:
+            with self._lock:
+                count = self._leases.pop(id(client)) - 1
+                if count:
+                    self._leases[id(client)] = count
+                    retired = None
+                else:
+                    retired = self._retired.pop(id(client), None)
+            if retired is not None:
+                retired.close()
+
+    def complete(self, api_key, model, instructions, prompt):
+        """
+        Return the whole response text once it is complete.
+        """
+        with self._leased(api_key) as client:
+            response = client.responses.create(
+                model=model,
+                instructions=instructions,
+                input=prompt,
+            )
+        return response.output_text
+
+    def stream(self, api_key, model, instructions, prompt):
+        """
+        Yield the response text in pieces, as the backend produces them.
+        """
+        with self._leased(api_key) as client:
+            events = client.responses.create(
+                model=model,
+                instructions=instructions,
+                input=prompt,
+                stream=True,
+            )
+            try:
+                for event in events:
+                    if event.type == 'response.output_text.delta':
+                        yield event.delta
+                    elif event.type == 'error':
+                        raise RuntimeError(event.message)
+                    elif event.type == 'response.failed':
+                        error = event.response.error
+                        raise RuntimeError(error.message if error else 'Response failed')
+            finally:
+                # Stops reading (and frees the connection) if the caller gave up early
+                events.close()
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
@@ -0,0 +1,101 @@
+import bisect
+import threading
+from collections import defaultdict
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# RunStats attribute -> (metric name, help text)
+_RUN_COUNTERS = (
+    ('dirs_scanned', 'jackdir_dirs_scanned_total', 'Directories listed from disk.'),
+    ('entries_scanned', 'jackdir_entries_scanned_total', 'Directory entries looked at.'),
+    ('files_read', 'jackdir_files_read_total', 'Files whose content was rendered.'),
+    ('cache_hits', 'jackdir_content_cache_hits_total', 'File contents served from the content cache.'),
+    ('bytes_read', 'jackdir_bytes_read_total', 'Bytes read from files on disk.'),
+)
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _value(value):
+    # Integral values are printed in full (e.g. byte counts), the rest as floats
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """
+    Cumulative counters and request latency histograms for the server,
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = defaultdict(float)
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._latency = {}
+
+    def inc(self, name, help_text, value=1, **labels):
+        with self._lock:
+            self._help[name] = help_text
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def observe_request(self, endpoint, method, status, seconds):
+        labels = (('endpoint', endpoint), ('method', method))
+        self.inc('jackdir_http_requests_total', 'HTTP requests handled.',
+                 endpoint=endpoint, method=method, status=str(status))
+        with self._lock:
+            series = self._latency.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            series[bisect.bisect_left(self.buckets, seconds)] += 1
+            series[-1] += seconds
+
+    def add_run(self, stats):
+        """
+        Add the counters of a finished RunStats.
+        """
+        for attribute, name, help_text in _RUN_COUNTERS:
+            self.inc(name, help_text, getattr(stats, attribute))
+        # By kind, never by pattern: patterns come from every .gitignore served
+        for reason, count in stats.excluded_kinds.items():
+            self.inc('jackdir_entries_excluded_total', 'Directory entries excluded, by kind (hidden, default, gitignore, symlink).',
+                     count, reason=reason)
+        for phase, seconds in stats.phase_seconds.items():
+            self.inc('jackdir_phase_seconds_total', 'Wall time spent per phase.', seconds, phase=phase)
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            latency = sorted(self._latency.items())
+            help_texts = dict(self._help)
+
+        lines = []
+        current = None
+        for (name, labels), value in counters:
+            if name != current:
+                lines.append(f'# HELP {name} {help_texts[name]}')
+                lines.append(f'# TYPE {name} counter')
+                current = name
+            lines.append(f'{name}{_labels(labels)} {_value(value)}')
+
+        if latency:
+            name = 'jackdir_http_request_duration_seconds'
+            lines.append(f'# HELP {name} Time from receiving a request until its response was closed.')
+            lines.append(f'# TYPE {name} histogram')
+            bounds = [f'{bound:g}' for bound in self.buckets] + ['+Inf']
+            for labels, series in latency:
+                cumulative = 0
+                for bound, count in zip(bounds, series):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", bound),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_value(series[-1])}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,34 @@
+import os
+import sys
+
+class StreamAdapter:
+    """
+    Writes output chunks incrementally to a file, or to stdout when no
+    path is given.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def write(self, chunks):
+        """
+        On stdout, stops quietly when the reader goes away (e.g. piped
+        into head), as command-line tools do.
+        """
+        if self.path is None:
+            try:
+                for chunk in chunks:
+                    sys.stdout.write(chunk)
+                sys.stdout.flush()
+            except BrokenPipeError:
+                # Stop producing output, and point stdout at devnull so the
+                # flush at exit doesn't fail again
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, sys.stdout.fileno())
+                os.close(devnull)
+        else:
+            with open(self.path, 'w') as f:
+                for chunk in chunks:
+                    f.write(chunk)
@@ -12,11 +12,30 @@ import Icons from "uikit/dist/js/uikit-icons"
 
 UIkit.use(Icons)
 
+// Rebuild the nested tree from the "flat" /api/tree format (parallel arrays;
+// parents always come before their children)
+const inflateFlatTree = (flat) => {
+  const nodes = flat.name.map((name, i) => ({
+    name,
+    path: i === 0 ? flat.path : null,
+    type: flat.kind[i] === "d" ? "directory" : "file",
+    children: [],
+  }))
+  for (let i = 1; i < nodes.length; i++) {
+    const parent = nodes[flat.parent[i]]
+    nodes[i].path = parent.path + flat.sep + nodes[i].name
+    parent.children.push(nodes[i])
+  }
+  return nodes[0]
+}
+
 function App() {
   const [treeData, setTreeData] = useState(null)
   const [includeHidden, setIncludeHidden] = useState(false)
   const [selectedPaths, setSelectedPaths] = useState(new Set())
   const [chatVisible, setChatVisible] = useState(false)
+  const [searchQuery, setSearchQuery] = useState("")
+  const [searchResults, setSearchResults] = useState([])
 
   // Lifted state from ChatPanel to persist messages and API settings
   const [messages, setMessages] = useState([])
@@ -81,14 +100,44 @@ function App() {
         directory: ".",
         include_hidden: includeHidden,
         respect_gitignore: true,
+        format: "flat",
       })
-      setTreeData(response.data.tree)
+      setTreeData(inflateFlatTree(response.data.tree))
       setSelectedPaths(new Set())
     } catch (error) {
       console.error("Error:", error)
     }
   }
 
+  // Search file names and contents as the query changes
+  useEffect(() => {
+    if (!searchQuery.trim()) {
+      setSearchResults([])
+      return
+    }
+    let cancelled = false
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.post("http://localhost:6789/api/search", {
+          directory: ".",
+          query: searchQuery,
+          include_hidden: includeHidden,
+          respect_gitignore: true,
+          limit: 30,
+        })
+        if (!cancelled) {
+          setSearchResults(response.data.results || [])
+        }
+      } catch (error) {
+        console.error("Error searching:", error)
+      }
+    }, 150)
+    return () => {
+      cancelled = true
+      clearTimeout(timer)
+    }
+  }, [searchQuery, includeHidden])
+
   // Toggle or untoggle a node in the directory tree
   const handleToggle = (node, isChecked) => {
     const newSelected = new Set(selectedPaths)
@@ -136,16 +185,43 @@ function App() {
 
     try {
       setIsLoading(true)
-      const response = await axios.post("http://localhost:6789/api/chat", {
-        prompt: input,
-        api_key: apiKey,
-        model: model,
-        selected_paths: Array.from(selectedPaths),
-        include_hidden: true,
-        respect_gitignore: true,
+      // Streamed as server-sent events, so the answer shows up while it is generated
+      const response = await fetch("http://localhost:6789/api/chat", {
+        method: "POST",
+        headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+        body: JSON.stringify({
+          prompt: input,
+          api_key: apiKey,
+          model: model,
+          selected_paths: Array.from(selectedPaths),
+          include_hidden: true,
+          respect_gitignore: true,
+          stream: true,
+        }),
       })
+      if (!response.ok) throw new Error(`HTTP ${response.status}`)
 
-      setMessages([...newMessages, { role: "assistant", content: response.data.response }])
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ""
+      let content = ""
+      for (;;) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const events = buffer.split("\n\n")
+        buffer = events.pop()
+        for (const raw of events) {
+          const event = (raw.match(/^event: (.*)$/m) || [])[1]
+          const data = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || "{}")
+          if (event === "error") throw new Error(data.error)
+          if (event === "delta") {
+            content += data.delta
+            setMessages([...newMessages, { role: "assistant", content }])
+          }
+        }
+      }
+      setMessages([...newMessages, { role: "assistant", content }])
     } catch (error) {
       console.error("Chat error:", error)
       setMessages([...newMessages, { role: "error", content: "Error communicating with AI" }])
@@ -196,6 +272,37 @@ function App() {
                 <span>Include Hidden Files</span>
               </label>
             </div>
+            <div className="uk-margin-small">
+              <input
+                className="uk-input uk-form-small"
+                type="search"
+                placeholder="Search files by name or content"
+                value={searchQuery}
+                onChange={(e) => setSearchQuery(e.target.value)}
+              />
+              {searchResults.length > 0 && (
+                <ul className="uk-list uk-list-collapse uk-margin-small-top">
+                  {searchResults.map((result) => (
+                    <li key={`${result.match}:${result.path}`}>
+                      <label className="uk-flex uk-flex-middle">
+                        <input
+                          className="uk-checkbox uk-margin-small-right"
+                          type="checkbox"
+                          checked={selectedPaths.has(result.path)}
+                          onChange={(e) => handleToggle({ path: result.path }, e.target.checked)}
+                        />
+                        <span>{result.rel_path}</span>
+                        {result.match === "content" && (
+                          <span className="uk-text-meta uk-margin-small-left">
+                            {result.line}: {result.snippet}
+                          </span>
+                        )}
+                      </label>
+                    </li>
+                  ))}
+                </ul>
+              )}
+            </div>
             {treeData && <DirectoryTree data={treeData} selectedPaths={selectedPaths} onToggle={handleToggle} />}
           </div>
         </div>
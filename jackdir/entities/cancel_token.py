@@ -0,0 +1,42 @@
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """
+    Raised by CancelToken.check() once the work should stop.
+    """
+
+
+class CancelToken:
+    """
+    Tells long-running work (walks, reads) to stop early: either because
+    cancel() was called (e.g. the client went away) or because the optional
+    timeout (in seconds) has run out. Workers call check() between units of
+    work.
+    """
+
+    def __init__(self, timeout=None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set() or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+    def remaining(self):
+        """
+        Seconds left before the deadline, or None without one.
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled('Cancelled')
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise Cancelled('Timed out')
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ExpiringCache:
+    """
+    LRU cache of strings, bounded by their total length in characters.
+    With 'ttl' (seconds), entries also expire that long after they were
+    put. Safe to share between threads.
+    """
+
+    def __init__(self, max_chars, ttl=None, clock=time.monotonic):
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (expiry time or None, value)
+        self._entries = OrderedDict()
+        self._total_chars = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                return None
+            expires, value = hit
+            if expires is not None and self.clock() >= expires:
+                del self._entries[key]
+                self._total_chars -= len(value)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value) > self.max_chars:
+            return
+        expires = self.clock() + self.ttl if self.ttl else None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_chars -= len(old[1])
+            self._entries[key] = (expires, value)
+            self._total_chars += len(value)
+            while self._total_chars > self.max_chars:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._total_chars -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_chars = 0
+
+
+def _digest(parts):
+    raw = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+def context_key(selected_paths, options, tree_version=None):
+    """
+    Key of the chat context built for selected_paths with 'options' (a
+    JSON-serializable description of everything else it depends on), or
+    None if it can't be told whether the context changed.
+
+    Files are keyed by their metadata (size, mtime, inode), so this costs a
+    stat per path and no reads. Directories only contribute their tree,
+    which is as fresh as 'tree_version' (e.g. the listing cache's instance
+    and generation); without one, contexts with directories aren't cached.
+    """
+    parts = [options]
+    for path in selected_paths:
+        abs_path = os.path.abspath(path)
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            parts.append([abs_path, None])
+            continue
+        if os.path.isdir(abs_path):
+            if tree_version is None:
+                return None
+            parts.append([abs_path, 'dir', tree_version])
+        else:
+            parts.append([abs_path, st.st_size, st.st_mtime_ns, st.st_ino])
+    return _digest(parts)
+
+
+def response_key(model, instructions, prompt, context, backend=None, api_key=None):
+    """
+    Key of the LLM's answer to prompt plus context, from 'backend' (e.g.
+    its base URL) for 'api_key', so one key's answers are never served to
+    another. The key is only stored hashed, as part of the digest.
+    """
+    return _digest([backend, api_key, model, instructions, prompt, context])
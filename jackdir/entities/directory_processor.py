@@ -1,10 +1,98 @@
+import hashlib
 import os
-from pathspec import PathSpec
+import stat
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from jackdir.entities.exclusion_matcher import ExclusionMatcher
+from jackdir.entities.file_reader import FileReader
+from jackdir.entities.ignore_rules import IgnoreRules
+from jackdir.entities.run_stats import timed
+from jackdir.entities.token_budget import estimate_text_tokens
+
+# Number of files read concurrently by default
+DEFAULT_JOBS = 8
+# Upper bound on the bytes of files being read (or read but not yet emitted)
+DEFAULT_MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+# Number of directories listed concurrently by default. Local disks answer
+# from the kernel's caches, where one thread is fastest; raise it for network
+# and FUSE mounts, where every listing is a round trip.
+DEFAULT_WALK_JOBS = 1
+
+@lru_cache(maxsize=32)
+def _compile_matcher(patterns):
+    # Matchers are immutable, so processors with the same patterns share one
+    return ExclusionMatcher(patterns)
+
+# Contents shorter than this are never replaced by a reference to a duplicate
+# (this also keeps placeholders such as '<Binary file skipped>' as they are)
+DEDUPE_MIN_CHARS = 256
+
+# Result of a single DirectoryProcessor.scan() pass
+ScanResult = namedtuple('ScanResult', ['tree_lines', 'files'])
+
+
+class PathEntry:
+    """
+    Minimal os.DirEntry stand-in for a plain path, so files that were not
+    found by a walk (e.g. selected individually) go through the same code.
+    """
+
+    def __init__(self, path, name=None):
+        self.path = path
+        self.name = name or os.path.basename(path)
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def is_symlink(self):
+        return os.path.islink(self.path)
+
 
 class DirectoryProcessor:
     
-    def __init__(self, include_hidden=False, spec=None):
+    def __init__(self, include_hidden=False, spec=None, jobs=DEFAULT_JOBS,
+                 max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES, file_reader=None,
+                 content_cache=None, respect_gitignore=False, listing_cache=None,
+                 token_budget=None, dedupe_content=False, stats=None, ignore_rules=None,
+                 cancel=None, file_source=None, walk_jobs=DEFAULT_WALK_JOBS,
+                 follow_symlinks=False, one_filesystem=False):
         self.include_hidden = include_hidden
+        # Directories listed concurrently by walk()
+        self.walk_jobs = max(1, walk_jobs)
+        # Descend into symlinked directories (symlinks back up the tree are
+        # skipped), and/or not into directories on other file systems
+        self.follow_symlinks = follow_symlinks
+        self.one_filesystem = one_filesystem
+        # Optional object whose list_files(dir_path) gives the files to walk
+        # (e.g. the files tracked by git) instead of listing the directories
+        self.file_source = file_source
+        # Optional CancelToken, checked before every directory listing and file read
+        self.cancel = cancel
+        # Optional RunStats collecting timings and counters
+        self.stats = stats
+        # Content digest -> path of the first block emitted with that content.
+        # Like the token budget, this spans every output of the processor.
+        self.seen_contents = {} if dedupe_content else None
+        # Optional TokenBudget deciding which file contents make it into the output
+        self.token_budget = token_budget
+        # Watcher-backed cache of filtered listings, shared across walks
+        self.listing_cache = listing_cache
+        # Nested .gitignore / .git/info/exclude handling, applied during walks.
+        # Pass ignore_rules to share compiled ignore files between processors.
+        self.ignore_rules = (ignore_rules or IgnoreRules()) if respect_gitignore else None
+        self.file_reader = file_reader or FileReader()
+        self.content_cache = content_cache
+        self.jobs = max(1, jobs)
+        self.max_inflight_bytes = max_inflight_bytes
         
         # Default patterns to exclude common files/directories
         default_patterns = [
@@ -24,88 +112,521 @@ class DirectoryProcessor:
             'pnpm-lock.yaml',
             'venv/'
         ]
-        default_spec = PathSpec.from_lines('gitwildmatch', default_patterns)
         
         # Combine with provided spec if available
         if spec is not None:
             provided_patterns = [p.pattern for p in spec.patterns]
             combined_patterns = default_patterns + provided_patterns
-            self.spec = PathSpec.from_lines('gitwildmatch', combined_patterns)
         else:
-            self.spec = default_spec
+            combined_patterns = default_patterns
+        self.matcher = _compile_matcher(tuple(combined_patterns))
 
-    def should_exclude(self, path, is_dir, dir_path):
-        name = os.path.basename(path)
-        if not self.include_hidden and name.startswith('.'):
+    def covers(self, dir_path, path):
+        """
+        Whether walk(dir_path) reaches path: it lies inside dir_path and
+        neither it nor any directory on the way is excluded or (unless
+        following symlinks) a symlinked directory. Only the entries on the
+        way are looked at.
+        """
+        rel_path = os.path.relpath(path, dir_path)
+        if rel_path == os.curdir:
             return True
-        
+        if rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep):
+            return False
+        chain = self.ignore_rules.base_chain(dir_path) if self.ignore_rules is not None else ()
+        current = ''
+        parent = dir_path
+        for part in rel_path.split(os.sep):
+            if self.ignore_rules is not None:
+                chain = self.ignore_rules.extend_chain(chain, parent, current)
+            current = f'{current}/{part}' if current else part
+            parent = os.path.join(parent, part)
+            is_dir = os.path.isdir(parent)
+            if self._is_excluded(part, current, is_dir, chain):
+                return False
+            if is_dir and not self.follow_symlinks and os.path.islink(parent):
+                return False
+        return True
+
+    def should_exclude(self, path, is_dir, dir_path):
         # Get relative path and normalize to POSIX-style
         rel_path = os.path.relpath(path, dir_path).replace(os.sep, '/')
-        
+        chain = self._ignore_chain(dir_path, rel_path.rpartition('/')[0])
+        return self._is_excluded(os.path.basename(path), rel_path, is_dir, chain)
+
+    def _ignore_chain(self, dir_path, rel_dir):
+        """
+        Nested ignore rules in effect for entries of rel_dir (relative to dir_path).
+        """
+        if self.ignore_rules is None:
+            return ()
+        chain = self.ignore_rules.base_chain(dir_path)
+        current = ''
+        for part in [''] + (rel_dir.split('/') if rel_dir else []):
+            current = f'{current}/{part}' if current else part
+            chain = self.ignore_rules.extend_chain(chain, os.path.join(dir_path, current), current)
+        return chain
+
+    def _is_excluded(self, name, rel_path, is_dir, chain=()):
+        if not self.include_hidden and name.startswith('.'):
+            return True
+
         # Append trailing slash for directories to match gitignore patterns
         if is_dir:
             rel_path += '/'
-        
-        return self.spec.match_file(rel_path)
 
+        # .gitignore files take precedence over the default and provided patterns
+        if chain:
+            ignored = IgnoreRules.check(chain, rel_path)
+            if ignored is not None:
+                return ignored
+        return self.matcher.match_file(rel_path)
 
-    def generate_tree(self, dir_path):
+    def _exclusion_kind(self, name, rel_path, is_dir, chain=()):
+        # _is_excluded, telling what excluded the entry ('hidden', 'gitignore'
+        # or 'default'), or None if it is kept. Kept separate so the walk
+        # without stats doesn't pay for it.
+        if not self.include_hidden and name.startswith('.'):
+            return 'hidden'
+        if is_dir:
+            rel_path += '/'
+        if chain:
+            ignored = IgnoreRules.check(chain, rel_path)
+            if ignored is not None:
+                return 'gitignore' if ignored else None
+        return 'default' if self.matcher.match_file(rel_path) else None
+
+    def _exclusion_reason(self, name, rel_path, is_dir, chain):
+        if not self.include_hidden and name.startswith('.'):
+            return 'hidden'
+        if is_dir:
+            rel_path += '/'
+        reason = IgnoreRules.explain(chain, rel_path) if chain else None
+        return reason or self.matcher.explain(rel_path)
+
+    def _scan_dir(self, path, rel_dir, chain):
+        """
+        List a single directory with os.scandir and split it into sorted,
+        non-excluded (dirs, files) lists of os.DirEntry objects.
+        Symlinked directories are dropped, as os.walk(followlinks=False) did,
+        unless following symlinks. Also returns the ignore chain for the directory's children.
+        """
+        if self.cancel is not None:
+            self.cancel.check()
+        if self.listing_cache is None:
+            return self._list_entries(path, rel_dir, chain)
+        listing = self.listing_cache.get(path, rel_dir)
+        if listing is None:
+            token = self.listing_cache.begin(path)
+            listing = self._list_entries(path, rel_dir, chain)
+            self.listing_cache.put(path, rel_dir, listing, token)
+        return listing
+
+    def _list_entries(self, path, rel_dir, chain):
+        started = time.perf_counter() if self.stats is not None else None
+        with os.scandir(path) as it:
+            entries = list(it)
+
+        # Only directories that actually contain a .gitignore pay for loading one
+        if self.ignore_rules is not None and any(e.name == '.gitignore' for e in entries):
+            chain = self.ignore_rules.extend_chain(chain, path, rel_dir)
+
+        dirs = []
+        files = []
+        # Excluded entries per kind, when collecting stats
+        kinds = Counter() if started is not None else None
+        for entry in entries:
+            rel_path = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+            is_dir = entry.is_dir()
+            if kinds is None:
+                if self._is_excluded(entry.name, rel_path, is_dir, chain):
+                    continue
+            else:
+                kind = self._exclusion_kind(entry.name, rel_path, is_dir, chain)
+                if kind is not None:
+                    kinds[kind] += 1
+                    continue
+            if not is_dir:
+                files.append(entry)
+            elif self.follow_symlinks or not entry.is_symlink():
+                dirs.append(entry)
+            elif kinds is not None:
+                kinds['symlink'] += 1
+        dirs.sort(key=lambda e: e.name)
+        files.sort(key=lambda e: e.name)
+        if started is not None:
+            excluded_by = self._explain_dir(rel_dir, chain, entries, dirs, files) if self.stats.explain else None
+            self.stats.record_dir(path, time.perf_counter() - started, len(entries), kinds, excluded_by)
+        return dirs, files, chain
+
+    def _explain_dir(self, rel_dir, chain, entries, dirs, files):
+        # Work out which pattern excluded each missing entry (for --stats)
+        kept = {e.name for e in dirs} | {e.name for e in files}
+        excluded_by = Counter()
+        for entry in entries:
+            if entry.name in kept:
+                continue
+            rel_path = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+            is_dir = entry.is_dir()
+            reason = self._exclusion_reason(entry.name, rel_path, is_dir, chain)
+            excluded_by[reason or ('symlinked directory' if is_dir else 'unknown')] += 1
+        return excluded_by
+
+    def check_ignore_files(self, dir_path):
+        """
+        Have the listing cache notice changes to the ignore files above
+        dir_path, which its watcher doesn't see (see ListingCache.check_files).
+        walk() does this itself; call it before trusting the cache's
+        generation for dir_path otherwise.
+        """
+        if self.listing_cache is not None and self.ignore_rules is not None:
+            self.listing_cache.check_files(dir_path, self.ignore_rules.base_files(dir_path))
+
+    def list_dir(self, dir_path, rel_dir='', chain=None):
+        """
+        List a single directory (rel_dir, relative to the walk root dir_path)
+        with the same exclusion rules walk() would apply, without descending.
+        Returns (dirs, files, child_chain); pass child_chain back in when
+        listing its subdirectories to skip rebuilding the nested ignore rules.
+        Raises OSError if the directory can't be read.
+        """
+        if chain is None:
+            if not rel_dir:
+                chain = self.ignore_rules.base_chain(dir_path) if self.ignore_rules is not None else ()
+            else:
+                chain = self._ignore_chain(dir_path, rel_dir.rpartition('/')[0])
+        path = os.path.join(dir_path, *rel_dir.split('/')) if rel_dir else dir_path
+        return self._scan_dir(path, rel_dir, chain)
+
+    def walk(self, dir_path):
+        """
+        Top-down traversal of dir_path, filtering every entry exactly once.
+        Yields (rel_dir, dirs, files) per directory, where rel_dir is the
+        POSIX-style path relative to dir_path ('' for the root) and dirs/files
+        are name-sorted lists of os.DirEntry objects (their type and stat data
+        are cached, so consumers can reuse them without extra syscalls).
+        Excluded directories (including ones ignored by a nested .gitignore)
+        are pruned before descending, as are symlink loops and, with
+        one_filesystem, directories on other file systems.
+        With walk_jobs > 1 directories are listed concurrently (see
+        _walk_parallel); the output is the same.
+        With a file_source, its files are walked instead (see _walk_listed).
+        """
+        if self.file_source is not None:
+            yield from self._walk_listed(dir_path)
+            return
+        self.check_ignore_files(dir_path)
+        base_chain = self.ignore_rules.base_chain(dir_path) if self.ignore_rules is not None else ()
+        ancestors = None
+        if self.follow_symlinks or self.one_filesystem:
+            try:
+                st = os.stat(dir_path)
+            except OSError:
+                return
+            ancestors = ((st.st_dev, st.st_ino),)
+        root = (dir_path, '', base_chain, ancestors)
+        if self.walk_jobs > 1:
+            yield from self._walk_parallel(root)
+            return
+        stack = [root]
+        while stack:
+            path, rel_dir, chain, ancestors = stack.pop()
+            try:
+                dirs, files, children = self._walk_step(path, rel_dir, chain, ancestors)
+            except OSError:
+                # Unreadable directories are skipped, like os.walk does
+                continue
+            yield rel_dir, dirs, files
+            stack.extend(reversed(children))
+
+    def _walk_step(self, path, rel_dir, chain, ancestors):
+        """
+        List one directory for walk(). Returns (dirs, files, children),
+        children being the (path, rel_dir, chain, ancestors) to list next, in
+        order. 'ancestors' holds the (st_dev, st_ino) of the directories from
+        the root down to this one, or None when neither symlinks are followed
+        nor one_filesystem is set (a walk can't loop then).
+        """
+        dirs, files, child_chain = self._scan_dir(path, rel_dir, chain)
+        prefix = f'{rel_dir}/' if rel_dir else ''
+        if ancestors is None:
+            return dirs, files, [(entry.path, prefix + entry.name, child_chain, None) for entry in dirs]
+        kept = []
+        children = []
+        for entry in dirs:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            identity = (st.st_dev, st.st_ino)
+            # A link back up the tree would be walked forever
+            if identity in ancestors:
+                continue
+            if self.one_filesystem and st.st_dev != ancestors[0][0]:
+                continue
+            kept.append(entry)
+            children.append((entry.path, prefix + entry.name, child_chain, ancestors + (identity,)))
+        return kept, files, children
+
+    def _walk_parallel(self, root):
+        """
+        walk() with up to walk_jobs directories listed at once. Each listing
+        queues its subdirectories as soon as it is done, so the workers stay
+        busy wherever the tree is (idle workers take whatever is queued),
+        while the listings are yielded in the order a serial walk would.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.walk_jobs, thread_name_prefix='jackdir-walk')
+        stopped = threading.Event()
+
+        def list_dir(item):
+            if stopped.is_set():
+                return None
+            try:
+                dirs, files, children = self._walk_step(*item)
+            except OSError:
+                return None
+            futures = []
+            for child in children:
+                try:
+                    futures.append((child[1], executor.submit(list_dir, child)))
+                except RuntimeError:
+                    # The walk was abandoned and the executor shut down
+                    return None
+            return dirs, files, futures
+
+        try:
+            stack = [(root[1], executor.submit(list_dir, root))]
+            while stack:
+                rel_dir, future = stack.pop()
+                listing = future.result()
+                if listing is None:
+                    continue
+                dirs, files, futures = listing
+                yield rel_dir, dirs, files
+                stack.extend(reversed(futures))
+        finally:
+            stopped.set()
+            executor.shutdown(cancel_futures=True)
+
+    def _walk_listed(self, dir_path):
+        """
+        walk() over the files given by file_source.list_files(dir_path), with
+        PathEntry objects standing in for DirEntry. The source decides what
+        is ignored, so only the hidden-file and default patterns apply here.
+        Files that no longer exist (or are now directories) are left out.
+        """
+        # rel_dir -> (path, subdirectory names, file entries), for included directories only
+        listings = {'': (dir_path, [], [])}
+        excluded_dirs = set()
+
+        def include_dir(rel_dir):
+            if rel_dir in listings:
+                return True
+            if rel_dir in excluded_dirs:
+                return False
+            parent, _, name = rel_dir.rpartition('/')
+            if not include_dir(parent) or self._is_excluded(name, rel_dir, True):
+                excluded_dirs.add(rel_dir)
+                return False
+            parent_path, parent_dirs, _ = listings[parent]
+            listings[rel_dir] = (os.path.join(parent_path, name), [], [])
+            parent_dirs.append(name)
+            return True
+
+        for rel_path in self.file_source.list_files(dir_path):
+            rel_dir, _, name = rel_path.rpartition('/')
+            if not include_dir(rel_dir) or self._is_excluded(name, rel_path, False):
+                continue
+            path, _, files = listings[rel_dir]
+            entry = PathEntry(os.path.join(path, name), name)
+            try:
+                if stat.S_ISDIR(entry.stat().st_mode):
+                    continue
+            except OSError:
+                continue
+            files.append(entry)
+
+        stack = ['']
+        while stack:
+            if self.cancel is not None:
+                self.cancel.check()
+            rel_dir = stack.pop()
+            path, names, files = listings[rel_dir]
+            names.sort()
+            files.sort(key=lambda e: e.name)
+            yield rel_dir, [PathEntry(os.path.join(path, name), name) for name in names], files
+            for name in reversed(names):
+                stack.append(f'{rel_dir}/{name}' if rel_dir else name)
+
+    def scan(self, dir_path):
+        """
+        Walk dir_path once and return a ScanResult holding both the tree lines
+        and the list of (relative_file_path, DirEntry) sorted by relative path.
+        """
         tree_lines = []
-        for root, dirs, files in os.walk(dir_path):
-            dirs[:] = sorted([
-                d for d in dirs if not self.should_exclude(os.path.join(root, d), True, dir_path)
-            ])
-            files[:] = sorted([
-                f for f in files if not self.should_exclude(os.path.join(root, f), False, dir_path)
-            ])
-            
-            # Calculate the relative path and level
-            rel_path = os.path.relpath(root, dir_path)
-            if root == dir_path:
+        files = []
+        for rel_dir, dirs, dir_files in self.walk(dir_path):
+            if not rel_dir:
                 level = 0
-                indent = ''
                 tree_lines.append('.')
             else:
-                level = rel_path.count(os.sep) + 1  # Increment level for subdirectories
+                level = rel_dir.count('/') + 1  # Increment level for subdirectories
                 indent = '    ' * level
-                tree_lines.append(f'{indent}{os.path.basename(root)}/')
-            
+                tree_lines.append(f'{indent}{rel_dir.rsplit("/", 1)[-1]}/')
+
             sub_indent = '    ' * (level + 1)
-            for f in files:
-                tree_lines.append(f'{sub_indent}{f}')
-        return tree_lines
+            prefix = rel_dir.replace('/', os.sep) + os.sep if rel_dir else ''
+            for entry in dir_files:
+                tree_lines.append(f'{sub_indent}{entry.name}')
+                files.append((prefix + entry.name, entry))
+
+        # Sort the files by relative file path
+        files.sort(key=lambda x: x[0])
+        return ScanResult(tree_lines, files)
+
+    def generate_tree(self, dir_path):
+        return self.scan(dir_path).tree_lines
 
     def collect_file_contents(self, dir_path):
-        file_contents_list = []
-        for root, dirs, files in os.walk(dir_path):
-            dirs[:] = sorted([
-                d for d in dirs if not self.should_exclude(os.path.join(root, d), True, dir_path)
-            ])
-            files[:] = sorted([
-                f for f in files if not self.should_exclude(os.path.join(root, f), False, dir_path)
-            ])
-            
-            for f in files:
-                file_path = os.path.join(root, f)
-                relative_file_path = os.path.relpath(file_path, dir_path)
-                try:
-                    with open(file_path, 'r') as file:
-                        content = file.read()
-                except Exception as e:
-                    content = f'<Error reading file: {e}>'
-                
-                # Collect as tuples for sorting
-                file_contents_list.append((relative_file_path, content))
-        
-        # Sort the file contents by relative file path
-        file_contents_list.sort(key=lambda x: x[0])
-        
-        # Build the final file_contents list
-        file_contents = []
-        for relative_file_path, content in file_contents_list:
-            file_contents.append(
-                f'----BEGINNING OF {relative_file_path}------\n{content}\n----END OF {relative_file_path}-------\n'
-            )
-        return file_contents
+        return self.render_file_contents(self.scan(dir_path).files)
+
+    def iter_output(self, dir_path):
+        """
+        Yield the full output for dir_path (tree, blank line, file blocks)
+        chunk by chunk, so callers never need to hold it all in memory.
+        Joining the chunks gives '\n'.join(tree) + '\n\n' + '\n'.join(blocks).
+        With a token budget, files that don't fit are only listed in the tree
+        and a note saying so follows the blocks.
+        """
+        with timed(self.stats, 'walk'):
+            scan = self.scan(dir_path)
+        tree_text = '\n'.join(scan.tree_lines)
+        files, readers, omitted = scan.files, None, []
+        if self.token_budget is not None:
+            with timed(self.stats, 'budget'):
+                files, readers, omitted = self.token_budget.pack(
+                    scan.files, estimate_text_tokens(tree_text), self.file_reader
+                )
+        yield tree_text
+        yield '\n\n'
+        blocks = self.iter_file_contents(files, readers)
+        if self.stats is not None:
+            blocks = self.stats.timed_iter('read', blocks)
+        for i, block in enumerate(blocks):
+            if i:
+                yield '\n'
+            yield block
+        if omitted:
+            yield '\n' if files else ''
+            yield self.budget_note(omitted)
+
+    def budget_note(self, omitted):
+        return (
+            f'<{len(omitted)} file(s) listed in the tree only, '
+            f'to fit the {self.token_budget.max_tokens} token budget>\n'
+        )
+
+    def render_file_contents(self, files):
+        """
+        Read every (relative_file_path, DirEntry) pair from scan() and return
+        the list of '----BEGINNING OF ...' blocks in the same order.
+        """
+        return list(self.iter_file_contents(files))
+
+    def iter_file_contents(self, files, readers=None):
+        """
+        Yield the rendered block of each (relative_file_path, DirEntry) pair,
+        in order, reading up to self.jobs files concurrently. Reads are only
+        scheduled while the bytes in flight stay under max_inflight_bytes
+        (a single file larger than the limit is still read on its own).
+        'readers' optionally maps relative paths to a FileReader to use
+        instead of self.file_reader (e.g. to truncate them).
+        """
+        readers = readers or {}
+        if self.jobs == 1:
+            for relative_file_path, entry in files:
+                yield self.render_block(relative_file_path, self._read_entry(entry, readers.get(relative_file_path)))
+            return
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            pending = deque()
+            inflight_bytes = 0
+            for relative_file_path, entry in files:
+                size = self._entry_size(entry)
+                # Drain the oldest reads until this one fits in the budget
+                while pending and (
+                    inflight_bytes + size > self.max_inflight_bytes
+                    or len(pending) >= self.jobs * 4
+                ):
+                    pending_path, future, future_size = pending.popleft()
+                    inflight_bytes -= future_size
+                    yield self.render_block(pending_path, future.result())
+                future = executor.submit(self._read_entry, entry, readers.get(relative_file_path))
+                pending.append((relative_file_path, future, size))
+                inflight_bytes += size
+            while pending:
+                pending_path, future, _ = pending.popleft()
+                yield self.render_block(pending_path, future.result())
+
+    @staticmethod
+    def _entry_size(entry):
+        try:
+            return entry.stat().st_size
+        except OSError:
+            return 0
+
+    def read_file(self, path, stat_result=None, file_reader=None):
+        """
+        Return the content of a single file through the file reader, serving
+        it from the content cache when the file has not changed.
+        """
+        file_reader = file_reader or self.file_reader
+        started = time.perf_counter() if self.stats is not None else None
+        if stat_result is None:
+            stat_result = os.stat(path)
+        cached = False
+        if self.content_cache is None:
+            content = file_reader.read(path, stat_result.st_size)
+        else:
+            key = self.content_cache.make_key(os.path.abspath(path), stat_result, file_reader.cache_signature())
+            content = self.content_cache.get(key)
+            cached = content is not None
+            if content is None:
+                content = file_reader.read(path, stat_result.st_size)
+                self.content_cache.put(key, content)
+        if self.token_budget is not None and file_reader is self.file_reader:
+            # Remember the real size for the next budget decisions
+            self.token_budget.estimator.record(path, stat_result, content)
+        if started is not None:
+            size = stat_result.st_size
+            cap = file_reader.max_file_size
+            if cap is not None and size > cap:
+                # Oversized files are only read in part (truncate) or not at all
+                size = cap if file_reader.truncate else 0
+            self.stats.record_file(path, time.perf_counter() - started, size, cached)
+        return content
 
+    def _read_entry(self, entry, file_reader=None):
+        if self.cancel is not None:
+            self.cancel.check()
+        try:
+            # DirEntry caches its stat result, so this costs at most one syscall.
+            # Cached listings may outlive that result, so stat again in that case.
+            stat_result = entry.stat() if self.listing_cache is None else os.stat(entry.path)
+            return self.read_file(entry.path, stat_result, file_reader)
+        except Exception as e:
+            return f'<Error reading file: {e}>'
 
+    def render_block(self, relative_file_path, content):
+        """
+        Wrap one file's content in its '----BEGINNING OF ...' block. With
+        dedupe_content, content already emitted under another path is
+        replaced by a reference to that path. Blocks must be rendered in
+        output order, so the first occurrence is the one kept.
+        """
+        if self.seen_contents is not None and len(content) >= DEDUPE_MIN_CHARS:
+            digest = hashlib.blake2b(content.encode('utf-8', 'surrogateescape'), digest_size=16).digest()
+            first_path = self.seen_contents.setdefault(digest, relative_file_path)
+            if first_path != relative_file_path:
+                content = f'<Same content as {first_path}>'
+        return f'----BEGINNING OF {relative_file_path}------\n{content}\n----END OF {relative_file_path}-------\n'
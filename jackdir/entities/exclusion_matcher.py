@@ -0,0 +1,124 @@
+import re
+
+# Shape of the regex pathspec generates for patterns without a '/' (other than
+# a trailing one): an optional '*' prefix, a literal body, an optional simple
+# character class, then either "file or directory" or "directory only".
+_BASENAME_REGEX = re.compile(
+    r'\^\(\?:\.\+/\)\?'
+    r'(?P<star>\[\^/\]\*)?'
+    r'(?P<body>(?:\\[^A-Za-z0-9]|[^\\\[\]().*+?{}|^$])+)'
+    r'(?P<cls>\[[A-Za-z0-9_.-]+\])?'
+    r'(?:(?P<any>\(\?:\(\?P<ps_d>/\)\|\$\))|(?P<dir>\(\?P<ps_d>/\)))$'
+)
+_NAMED_GROUP = re.compile(r'\(\?P<\w+>')
+_ESCAPE = re.compile(r'\\(.)')
+
+
+class _Segment:
+    """
+    Patterns of the same polarity, matched together: basename literals go in
+    sets, '*literal' patterns become suffix checks, and everything else is
+    folded into one combined regex.
+    """
+
+    def __init__(self):
+        self.names = set()
+        self.dir_names = set()
+        self.suffixes = []
+        self.dir_suffixes = []
+        self.regexes = []
+        self.regex = None
+
+    def add(self, regex):
+        m = _BASENAME_REGEX.match(regex)
+        if m is None:
+            self.regexes.append(_NAMED_GROUP.sub('(?:', regex))
+            return
+        body = _ESCAPE.sub(r'\1', m.group('body'))
+        # A simple class like [co] just expands to one literal per character
+        cls = m.group('cls')
+        literals = [body + c for c in cls[1:-1]] if cls else [body]
+        dir_only = m.group('dir') is not None
+        if m.group('star'):
+            (self.dir_suffixes if dir_only else self.suffixes).extend(literals)
+        else:
+            (self.dir_names if dir_only else self.names).update(literals)
+
+    def finish(self):
+        self.suffixes = tuple(self.suffixes)
+        self.dir_suffixes = tuple(self.dir_suffixes)
+        if self.regexes:
+            self.regex = re.compile('|'.join(f'(?:{r})' for r in self.regexes))
+
+    def match(self, rel_path):
+        names = self.names
+        dir_names = self.dir_names
+        suffixes = self.suffixes
+        dir_suffixes = self.dir_suffixes
+        if names or dir_names or suffixes or dir_suffixes:
+            parts = rel_path.split('/')
+            last = len(parts) - 1
+            for i, part in enumerate(parts):
+                if not part:
+                    continue
+                if part in names or (suffixes and part.endswith(suffixes)):
+                    return True
+                # Directory-only patterns need the component to be followed by '/'
+                if i < last and (part in dir_names or (dir_suffixes and part.endswith(dir_suffixes))):
+                    return True
+        return self.regex is not None and self.regex.match(rel_path) is not None
+
+
+class ExclusionMatcher:
+    """
+    Precompiled gitignore-style matcher with the same semantics as
+    PathSpec.from_lines('gitwildmatch', lines), minus the per-pattern loop.
+
+    Paths are POSIX-style and relative, with a trailing '/' for directories.
+    Patterns are grouped into runs of equal polarity (ignore or '!' negation);
+    since the last matching pattern wins, runs are checked from the last one
+    backwards and the first run that matches decides.
+    """
+
+    def __init__(self, lines):
+        # Imported here: pathspec is slow to import, and thin clients
+        # (e.g. the CLI talking to the daemon) never compile patterns
+        from pathspec import PathSpec
+
+        self.segments = []
+        # Kept for explain(), which is only used for statistics
+        self.patterns = []
+        current = None
+        for pattern in PathSpec.from_lines('gitwildmatch', lines).patterns:
+            if pattern.include is None:
+                continue
+            self.patterns.append(pattern)
+            if current is None or current[0] != pattern.include:
+                current = (pattern.include, _Segment())
+                self.segments.append(current)
+            current[1].add(pattern.regex.pattern)
+        for _, segment in self.segments:
+            segment.finish()
+        self.segments.reverse()
+
+    def check(self, rel_path):
+        """
+        Returns True (ignored), False (re-included by a negation) or None (no match).
+        """
+        for include, segment in self.segments:
+            if segment.match(rel_path):
+                return include
+        return None
+
+    def explain(self, rel_path):
+        """
+        The text of the pattern that decides rel_path, or None if none matches.
+        Slow (one regex per pattern), so only meant for reporting.
+        """
+        for pattern in reversed(self.patterns):
+            if pattern.match_file(rel_path) is not None:
+                return pattern.pattern
+        return None
+
+    def match_file(self, rel_path):
+        return self.check(rel_path) is True
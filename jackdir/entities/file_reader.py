@@ -0,0 +1,100 @@
+import mmap
+import os
+
+# Bytes sniffed from the start of a file to decide whether it is binary
+SNIFF_SIZE = 8192
+# Files at least this big are decoded straight from an mmap
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# Printable ASCII, bytes >= 0x80 (UTF-8 and legacy encodings) and the control
+# characters that legitimately appear in text files
+_TEXT_BYTES = bytes([7, 8, 9, 10, 12, 13, 27]) + bytes(range(32, 127)) + bytes(range(128, 256))
+
+BINARY_PLACEHOLDER = '<Binary file skipped>'
+
+
+def is_binary(header):
+    """
+    Classify a file from its first bytes: NUL bytes or a high share of
+    non-text control characters mean binary (images, sqlite, archives...).
+    """
+    if not header:
+        return False
+    if b'\x00' in header:
+        return True
+    non_text = header.translate(None, _TEXT_BYTES)
+    return len(non_text) / len(header) > 0.3
+
+
+def _normalize_newlines(text):
+    # Same translation as open(..., 'r') with universal newlines
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+class FileReader:
+    """
+    Reads a file for output, skipping binaries and capping sizes.
+
+    - Binary files (sniffed from the first SNIFF_SIZE bytes) become a placeholder.
+    - Files over max_file_size become a placeholder without reading the body,
+      or, with truncate=True, their head and tail around a truncation marker.
+    - Large text files are decoded straight from an mmap.
+    Errors opening or decoding the file are raised to the caller.
+    """
+
+    def __init__(self, max_file_size=None, truncate=False, encoding='utf-8', errors='strict'):
+        self.max_file_size = max_file_size
+        self.truncate = truncate
+        self.encoding = encoding
+        self.errors = errors
+
+    def cache_signature(self):
+        """
+        Settings that change what read() returns, for use in cache keys.
+        """
+        return f'{self.max_file_size}:{self.truncate}:{self.encoding}:{self.errors}'
+
+    def read(self, path, size=None):
+        if size is None:
+            size = os.stat(path).st_size
+        too_large = self.max_file_size is not None and size > self.max_file_size
+        if too_large and not self.truncate:
+            return f'<File too large: {size} bytes, limit is {self.max_file_size} bytes>'
+
+        with open(path, 'rb') as f:
+            header = f.read(SNIFF_SIZE)
+            if is_binary(header):
+                return BINARY_PLACEHOLDER
+            if too_large:
+                return self._read_head_and_tail(f, header, size)
+            if size >= MMAP_THRESHOLD:
+                try:
+                    return self._read_mmap(f)
+                except (OSError, ValueError):
+                    # Some filesystems can't mmap; read the rest normally
+                    f.seek(len(header))
+            data = header + f.read()
+        return _normalize_newlines(data.decode(self.encoding, self.errors))
+
+    def _read_mmap(self, f):
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            with memoryview(m) as view:
+                text = str(view, self.encoding, self.errors)
+        return _normalize_newlines(text)
+
+    def _read_head_and_tail(self, f, header, size):
+        half = self.max_file_size // 2
+        head = header[:half]
+        if len(head) < half:
+            head += f.read(half - len(head))
+        f.seek(max(size - half, len(head)))
+        tail = f.read(half)
+        omitted = size - len(head) - len(tail)
+        # Cut points may split a multi-byte character, so drop partial ones
+        return (
+            _normalize_newlines(head.decode(self.encoding, 'ignore'))
+            + f'\n<... truncated {omitted} bytes ...>\n'
+            + _normalize_newlines(tail.decode(self.encoding, 'ignore'))
+        )
@@ -0,0 +1,142 @@
+import os
+from jackdir.entities.exclusion_matcher import ExclusionMatcher
+
+
+def compile_patterns(lines):
+    """
+    Compile gitignore-style lines into a matcher, or None if there are no
+    usable patterns.
+    """
+    matcher = ExclusionMatcher(lines)
+    return matcher if matcher.segments else None
+
+
+def _find_repo_root(dir_path):
+    current = dir_path
+    while True:
+        if os.path.exists(os.path.join(current, '.git')):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+class IgnoreRules:
+    """
+    Nested .gitignore support. Every directory may contribute an ignore file
+    whose patterns are relative to that directory; deeper files take
+    precedence over shallower ones, and .git/info/exclude sits below the
+    repository's top-level .gitignore.
+
+    Matchers are compiled once per ignore file and cached, keyed by the file's
+    path, mtime and size, so repeated walks don't re-read them.
+    """
+
+    def __init__(self):
+        self._matchers = {}
+
+    def load(self, ignore_path):
+        """
+        Return the cached matcher for an ignore file, or None if it is
+        missing or has no patterns.
+        """
+        try:
+            st = os.stat(ignore_path)
+        except OSError:
+            return None
+        cache_key = (st.st_mtime_ns, st.st_size)
+        cached = self._matchers.get(ignore_path)
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+        try:
+            with open(ignore_path, 'r', encoding='utf-8', errors='ignore') as f:
+                matcher = compile_patterns(f.read().splitlines())
+        except OSError:
+            matcher = None
+        self._matchers[ignore_path] = (cache_key, matcher)
+        return matcher
+
+    def base_chain(self, dir_path):
+        """
+        Build the matcher chain that applies to the walk root itself:
+        .git/info/exclude and the .gitignore files of every directory from the
+        repository root down to (but excluding) dir_path.
+
+        A chain is a tuple of (strip, prefix, matcher) levels, shallowest first.
+        A path relative to the walk root maps to the path relative to a level's
+        directory as prefix + rel_path[strip:].
+        """
+        dir_path = os.path.abspath(dir_path)
+        repo_root = _find_repo_root(dir_path)
+        if repo_root is None:
+            return ()
+
+        chain = []
+        rel_root = os.path.relpath(dir_path, repo_root).replace(os.sep, '/')
+        rel_root = '' if rel_root == '.' else rel_root + '/'
+        info_exclude = self.load(os.path.join(repo_root, '.git', 'info', 'exclude'))
+        if info_exclude is not None:
+            chain.append((0, rel_root, info_exclude))
+
+        # Ancestors between the repository root and the walk root
+        current = repo_root
+        parts = [part for part in rel_root.split('/') if part]
+        for depth in range(len(parts)):
+            matcher = self.load(os.path.join(current, '.gitignore'))
+            if matcher is not None:
+                prefix = '/'.join(parts[depth:]) + '/'
+                chain.append((0, prefix, matcher))
+            current = os.path.join(current, parts[depth])
+        return tuple(chain)
+
+    def base_files(self, dir_path):
+        """
+        The ignore files base_chain(dir_path) reads (whether they exist or
+        not): .git/info/exclude and the .gitignore of every directory from
+        the repository root down to (but excluding) dir_path.
+        """
+        dir_path = os.path.abspath(dir_path)
+        repo_root = _find_repo_root(dir_path)
+        if repo_root is None:
+            return []
+        paths = [os.path.join(repo_root, '.git', 'info', 'exclude')]
+        current = dir_path
+        while current != repo_root:
+            current = os.path.dirname(current)
+            paths.append(os.path.join(current, '.gitignore'))
+        return paths
+
+    def extend_chain(self, chain, dir_path, rel_dir):
+        """
+        Add dir_path's own .gitignore (if any) to the chain inherited from its parent.
+        """
+        matcher = self.load(os.path.join(dir_path, '.gitignore'))
+        if matcher is None:
+            return chain
+        strip = len(rel_dir) + 1 if rel_dir else 0
+        return chain + ((strip, '', matcher),)
+
+    @staticmethod
+    def check(chain, rel_path):
+        """
+        Evaluate rel_path (relative to the walk root, with a trailing slash for
+        directories) against the chain, deepest level first.
+        Returns True (ignored), False (re-included) or None (no match).
+        """
+        for strip, prefix, matcher in reversed(chain):
+            result = matcher.check(prefix + rel_path[strip:])
+            if result is not None:
+                return result
+        return None
+
+    @staticmethod
+    def explain(chain, rel_path):
+        """
+        The pattern that check() bases its answer on, or None.
+        """
+        for strip, prefix, matcher in reversed(chain):
+            local_path = prefix + rel_path[strip:]
+            if matcher.check(local_path) is not None:
+                return matcher.explain(local_path)
+        return None
@@ -0,0 +1,183 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+# Directories watched (and whose listings are cached) at most; the least
+# recently used ones are dropped beyond that, watch included
+DEFAULT_MAX_DIRS = 100000
+# Values kept by memoize() at most
+MAX_MEMOS = 64
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ListingCache:
+    """
+    In-memory cache of filtered directory listings for one set of exclusion
+    options, kept fresh by a filesystem watcher.
+
+    DirectoryProcessor stores each directory's (dirs, files, child_chain)
+    here and reuses it on later walks. Listings are keyed by the directory
+    and its path relative to the walk root, since anchored patterns depend
+    on where the walk started. The watcher reports changes through
+    invalidate(), which drops only the affected listings and bumps
+    'generation', so callers can tell cheaply whether anything changed
+    (e.g. to answer HTTP conditional requests).
+
+    Without a watcher nothing is cached, as there would be no way to notice
+    changes. The same goes for directories that can't be watched (e.g. past
+    the inotify watch limit): each scan of one bumps 'generation', so
+    nothing built from it is reused or reported as unchanged.
+
+    At most max_dirs directories are watched; the least recently used are
+    dropped beyond that (which counts as a change, since changes there go
+    unnoticed from then on).
+    """
+
+    def __init__(self, watcher_factory=None, max_dirs=DEFAULT_MAX_DIRS):
+        self.instance_id = uuid.uuid4().hex
+        self.generation = 0
+        self.max_dirs = max_dirs
+        self._listings = {}
+        # Watched directories, least recently used first
+        self._watched = OrderedDict()
+        # Bumped per directory on every change, to spot listings that went
+        # stale while they were being scanned
+        self._epochs = {}
+        self._memo = OrderedDict()
+        # Walk root -> stamps of the ignore files above it (see check_files)
+        self._outside = OrderedDict()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.watcher = watcher_factory(self.invalidate) if watcher_factory else None
+
+    def get(self, dir_path, rel_dir):
+        with self._lock:
+            listing = self._listings.get(dir_path, {}).get(rel_dir)
+            if listing is not None:
+                self._watched.move_to_end(dir_path)
+            return listing
+
+    def begin(self, dir_path):
+        """
+        Call before scanning dir_path: starts watching it and returns a token
+        for put(), or None if the listing can't be cached (no watcher, or the
+        watch couldn't be added).
+        """
+        if self.watcher is None or not self.watcher.watch(dir_path):
+            # Changes there would go unnoticed, so count the scan as one
+            with self._lock:
+                self.generation += 1
+            return None
+        with self._lock:
+            self._watched[dir_path] = None
+            self._watched.move_to_end(dir_path)
+            token = self._epochs.get(dir_path, 0)
+            evicted = self._evict()
+        for path in evicted:
+            self.watcher.unwatch(path)
+        return token
+
+    def _evict(self):
+        # Drop the least recently used directories beyond max_dirs; called with the lock held
+        evicted = []
+        while len(self._watched) > self.max_dirs:
+            path, _ = self._watched.popitem(last=False)
+            self._listings.pop(path, None)
+            self._epochs.pop(path, None)
+            evicted.append(path)
+        if evicted:
+            self.generation += 1
+        return evicted
+
+    def put(self, dir_path, rel_dir, listing, token):
+        with self._lock:
+            # Skip listings that changed after begin() was called, or whose
+            # watch has been dropped since
+            if token is not None and dir_path in self._watched and self._epochs.get(dir_path, 0) == token:
+                self._listings.setdefault(dir_path, {})[rel_dir] = listing
+
+    def check_files(self, dir_path, paths):
+        """
+        Listings below dir_path can depend on files the watcher doesn't see,
+        such as the .gitignore files of the directories above it and
+        .git/info/exclude. Compare their (mtime, size) with the previous
+        call, and treat any difference as a change of everything below
+        dir_path. Call before each walk of dir_path.
+        """
+        stamps = tuple((path, _file_stamp(path)) for path in paths)
+        with self._lock:
+            old = self._outside.pop(dir_path, None)
+            self._outside[dir_path] = stamps
+            while len(self._outside) > self.max_dirs:
+                self._outside.popitem(last=False)
+        if old is not None and old != stamps:
+            self.invalidate(dir_path, None)
+
+    def invalidate(self, dir_path, name=''):
+        """
+        Forget what changed: the listing of dir_path itself, the entry 'name'
+        inside it, and, when the directory vanished (name is None) or its
+        .gitignore changed, every listing below it.
+        """
+        with self._lock:
+            self.generation += 1
+            self._epochs[dir_path] = self._epochs.get(dir_path, 0) + 1
+            self._listings.pop(dir_path, None)
+            if name:
+                self._listings.pop(os.path.join(dir_path, name), None)
+            if name is None or name == '.gitignore':
+                prefix = os.path.join(dir_path, '')
+                for path in [p for p in self._listings if p.startswith(prefix)]:
+                    del self._listings[path]
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(dir_path, name)
+
+    def subscribe(self, listener):
+        """
+        Also pass every change to listener(dir_path, name), after the
+        affected listings have been dropped. Listeners run on the watcher's
+        thread, so they should only take note of the change.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def memoize(self, key, build):
+        """
+        Return the value built for 'key' during the current generation,
+        building (and remembering) it if the tree changed since. Values
+        during whose build the generation changed aren't remembered.
+        """
+        generation = self.generation
+        with self._lock:
+            hit = self._memo.get(key)
+            if hit is not None:
+                self._memo.move_to_end(key)
+        if hit is not None and hit[0] == generation:
+            return hit[1]
+        value = build()
+        with self._lock:
+            if self.generation != generation:
+                return value
+            self._memo[key] = (generation, value)
+            self._memo.move_to_end(key)
+            while len(self._memo) > MAX_MEMOS:
+                self._memo.popitem(last=False)
+        return value
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.close()
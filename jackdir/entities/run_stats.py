@@ -0,0 +1,150 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+# Number of slowest files and directories kept
+SLOWEST_KEPT = 10
+# Why walks leave entries out: hidden names, the default (and provided)
+# patterns, .gitignore rules, or symlinked directories not followed
+EXCLUSION_KINDS = ('hidden', 'default', 'gitignore', 'symlink')
+
+
+class RunStats:
+    """
+    Instrumentation for one run (a CLI invocation or an HTTP request).
+
+    Phases ('walk', 'read', 'clipboard', ...) are timed exclusively: while a
+    nested phase runs, the enclosing one is paused, so the phase times add up
+    to the time spent inside phases. Phases are timed on the thread driving
+    the output; per-file and per-directory records may come from any thread.
+
+    Excluded entries are counted per kind (see EXCLUSION_KINDS). With
+    'explain', they are also counted per matching pattern, which costs a
+    pattern-by-pattern lookup for each of them (fine for --stats, too slow
+    for every server request).
+    """
+
+    def __init__(self, explain=False):
+        self.explain = explain
+        self.phase_seconds = Counter()
+        self.dirs_scanned = 0
+        self.entries_scanned = 0
+        self.entries_excluded = 0
+        # Exclusion kind -> entries
+        self.excluded_kinds = Counter()
+        # Exclusion reason (the matching pattern, or 'hidden') -> entries, with 'explain'
+        self.excluded_by = Counter()
+        self.files_read = 0
+        self.bytes_read = 0
+        self.cache_hits = 0
+        self.slowest_files = []
+        self.slowest_dirs = []
+        self._lock = threading.Lock()
+        self._stack = []
+
+    def _push(self, name):
+        now = time.perf_counter()
+        if self._stack:
+            parent, started = self._stack[-1]
+            self.phase_seconds[parent] += now - started
+        self._stack.append((name, now))
+
+    def _pop(self):
+        now = time.perf_counter()
+        name, started = self._stack.pop()
+        self.phase_seconds[name] += now - started
+        if self._stack:
+            self._stack[-1] = (self._stack[-1][0], now)
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def timed_iter(self, name, iterable):
+        """
+        Yield from iterable, timing the work done to produce each item (but
+        not what the consumer does with it) as phase 'name'.
+        """
+        iterator = iter(iterable)
+        while True:
+            self._push(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._pop()
+            yield item
+
+    @staticmethod
+    def _keep_slowest(heap, seconds, path):
+        if len(heap) < SLOWEST_KEPT:
+            heapq.heappush(heap, (seconds, path))
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, (seconds, path))
+
+    def record_dir(self, path, seconds, scanned, excluded_kinds, excluded_by=None):
+        with self._lock:
+            self.dirs_scanned += 1
+            self.entries_scanned += scanned
+            self.entries_excluded += sum(excluded_kinds.values())
+            self.excluded_kinds.update(excluded_kinds)
+            if excluded_by:
+                self.excluded_by.update(excluded_by)
+            self._keep_slowest(self.slowest_dirs, seconds, path)
+
+    def record_file(self, path, seconds, size, cached=False):
+        with self._lock:
+            self.files_read += 1
+            if cached:
+                self.cache_hits += 1
+            else:
+                self.bytes_read += size
+            self._keep_slowest(self.slowest_files, seconds, path)
+
+    def format(self, total_seconds=None):
+        """
+        Human-readable report, as printed by --stats.
+        """
+        lines = ['jackdir stats']
+        if total_seconds is not None:
+            lines.append(f'  total        {total_seconds:9.3f}s')
+        for name, seconds in self.phase_seconds.most_common():
+            lines.append(f'  {name:<12} {seconds:9.3f}s')
+        lines.append(
+            f'  directories scanned: {self.dirs_scanned}, entries scanned: {self.entries_scanned}, '
+            f'excluded: {self.entries_excluded}'
+        )
+        for reason, count in (self.excluded_by or self.excluded_kinds).most_common():
+            lines.append(f'    {count:8d}  {reason}')
+        lines.append(
+            f'  files read: {self.files_read} ({self.cache_hits} from cache), bytes read: {self.bytes_read}'
+        )
+        for title, heap in (('slowest files', self.slowest_files), ('slowest directories', self.slowest_dirs)):
+            if heap:
+                lines.append(f'  {title}:')
+                for seconds, path in sorted(heap, reverse=True):
+                    lines.append(f'    {seconds * 1000:9.1f}ms  {path}')
+        return '\n'.join(lines) + '\n'
+
+
+def timed(stats, name):
+    """
+    stats.phase(name), or a no-op when stats is None.
+    """
+    return stats.phase(name) if stats is not None else nullcontext()
+
+
+class _Phase:
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.stats._push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.stats._pop()
@@ -0,0 +1,373 @@
+import heapq
+import os
+import re
+import sys
+import threading
+from array import array
+from jackdir.entities.cancel_token import Cancelled
+from jackdir.entities.file_reader import BINARY_PLACEHOLDER, FileReader
+
+# Files larger than this are only found by name
+CONTENT_MAX_BYTES = 1024 * 1024
+# Results returned by default
+DEFAULT_LIMIT = 50
+# Longest snippet returned for a content match
+SNIPPET_CHARS = 200
+# Postings are compacted once at least this many documents are stale, and
+# stale ones outnumber live ones
+COMPACT_MIN_STALE = 1000
+
+# Possessive quantifiers (Python 3.11+) keep the name regex from backtracking
+_POSSESSIVE = '+' if sys.version_info >= (3, 11) else ''
+
+# Characters after which a match counts as the start of a word
+_WORD_BOUNDARIES = frozenset('/_-. ')
+
+
+def trigrams(text):
+    # zip and map keep the loop in C, which matters at this scale
+    return set(map(''.join, zip(text, text[1:], text[2:])))
+
+
+def _subsequence_score(query, path, lower, start):
+    score = 0
+    previous = -2
+    pos = start
+    for ch in query:
+        i = lower.find(ch, pos)
+        if i < 0:
+            return None
+        score += 1
+        if i == previous + 1:
+            score += 4
+        if i == 0 or path[i - 1] in _WORD_BOUNDARIES or (path[i].isupper() and path[i - 1].islower()):
+            score += 3
+        previous = i
+        pos = i + 1
+    return score
+
+
+def fuzzy_score(query, path):
+    """
+    Score of path (POSIX-style) for a lowercase query, or None unless the
+    query's characters appear in path in order. Runs of consecutive
+    characters, characters starting a word and matches within the file name
+    score higher.
+    """
+    lower = path.lower()
+    score = _subsequence_score(query, path, lower, lower.rfind('/') + 1)
+    if score is not None:
+        return score + 10
+    return _subsequence_score(query, path, lower, 0)
+
+
+class SearchIndex:
+    """
+    Fuzzy file name and substring content search over the files below
+    'root', as found by directory_processor's walk (so the same exclusion
+    rules apply).
+
+    Contents are indexed by trigram: a query's candidates are the files
+    holding all of its trigrams, which are then checked on disk. Changed
+    and removed files get a new document id and leave a stale one behind;
+    stale ids are filtered out at query time and compacted away now and
+    then.
+
+    Given the processor's ListingCache, the index follows the changes its
+    watcher reports: they are queued and applied (by re-listing only the
+    directories concerned) before the next query.
+
+    Give the processor a CancelToken so close() can stop a build that is
+    still running.
+    """
+
+    def __init__(self, root, directory_processor, listing_cache=None):
+        self.root = root
+        self.dp = directory_processor
+        self.listing_cache = listing_cache
+        self.file_reader = FileReader(max_file_size=CONTENT_MAX_BYTES, errors='replace')
+        # File names are all indexed once names_ready is set, contents once ready is
+        self.names_ready = False
+        self.ready = False
+        self._lock = threading.RLock()
+        # rel_path -> (document id, (mtime, size)); rel_dir -> (subdirectory names, file names)
+        self._docs = {}
+        self._dirs = {}
+        # Document id -> rel_path, or None once stale
+        self._paths = []
+        self._stale = 0
+        self._postings = {}
+        # Paths of the indexed files for name search, or None until needed again
+        self._names = None
+        # Directories to re-list before the next query: rel_dir -> whole subtree?
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._thread = None
+        if listing_cache is not None:
+            listing_cache.subscribe(self.on_change)
+
+    def start(self):
+        """
+        Build the index on a background thread.
+        """
+        self._thread = threading.Thread(target=self.build, name='jackdir-search-index', daemon=True)
+        self._thread.start()
+
+    def build(self):
+        try:
+            self._build()
+        except Cancelled:
+            # Closed before it was done
+            pass
+
+    def _build(self):
+        # Names first, so name search works within moments of starting;
+        # reading and indexing the contents takes much longer
+        cancel = self.dp.cancel
+        for rel_dir, dirs, files in self.dp.walk(self.root):
+            self._index_listing(rel_dir, dirs, files, contents=False)
+        self.names_ready = True
+        with self._lock:
+            docs = list(self._docs.items())
+        for rel_path, (doc, stamp) in docs:
+            if cancel is not None:
+                cancel.check()
+            grams = self._read_trigrams(os.path.join(self.root, *rel_path.split('/')), stamp[1])
+            with self._lock:
+                # Skip files that changed meanwhile; they were indexed again
+                if self._paths[doc] is not None:
+                    self._add_postings(doc, grams)
+        self.ready = True
+
+    def on_change(self, dir_path, name=''):
+        """
+        Watcher callback (see ListingCache.subscribe): remember which
+        directory to re-list, and whether everything below it is affected.
+        """
+        rel_dir = os.path.relpath(dir_path, self.root)
+        if rel_dir == os.pardir or rel_dir.startswith(os.pardir + os.sep):
+            return
+        rel_dir = '' if rel_dir == os.curdir else rel_dir.replace(os.sep, '/')
+        with self._pending_lock:
+            self._pending[rel_dir] = self._pending.get(rel_dir, False) or name is None or name == '.gitignore'
+
+    def _read_trigrams(self, path, size):
+        if size > CONTENT_MAX_BYTES:
+            return ()
+        try:
+            content = self.file_reader.read(path, size)
+        except OSError:
+            return ()
+        if content == BINARY_PLACEHOLDER:
+            return ()
+        return trigrams(content.lower())
+
+    def _add_postings(self, doc, grams):
+        postings = self._postings
+        for gram in grams:
+            if gram in postings:
+                postings[gram].append(doc)
+            else:
+                postings[gram] = array('I', (doc,))
+
+    def _index_listing(self, rel_dir, dirs, files, contents=True):
+        """
+        Add the files of one listing, or update those that changed since
+        they were indexed. Contents are only read with 'contents'.
+        """
+        prefix = f'{rel_dir}/' if rel_dir else ''
+        # Read outside the lock, so queries aren't held up by the disk
+        changed = []
+        for entry in files:
+            rel_path = prefix + entry.name
+            try:
+                stat_result = entry.stat()
+            except OSError:
+                continue
+            stamp = (stat_result.st_mtime_ns, stat_result.st_size)
+            known = self._docs.get(rel_path)
+            if known is not None and known[1] == stamp:
+                continue
+            grams = self._read_trigrams(entry.path, stamp[1]) if contents else ()
+            changed.append((rel_path, stamp, grams))
+        with self._lock:
+            self._dirs[rel_dir] = ({entry.name for entry in dirs}, {entry.name for entry in files})
+            for rel_path, stamp, grams in changed:
+                self._remove_file(rel_path)
+                doc = len(self._paths)
+                self._paths.append(rel_path)
+                self._docs[rel_path] = (doc, stamp)
+                self._add_postings(doc, grams)
+            if changed:
+                self._names = None
+
+    def _remove_file(self, rel_path):
+        known = self._docs.pop(rel_path, None)
+        if known is not None:
+            self._names = None
+            self._paths[known[0]] = None
+            self._stale += 1
+
+    def _remove_dir(self, rel_dir):
+        listing = self._dirs.pop(rel_dir, None)
+        if listing is None:
+            return
+        prefix = f'{rel_dir}/' if rel_dir else ''
+        for name in listing[1]:
+            self._remove_file(prefix + name)
+        for name in listing[0]:
+            self._remove_dir(prefix + name)
+
+    def _refresh_dir(self, rel_dir, subtree):
+        """
+        Re-list rel_dir and update the index to match. New subdirectories
+        are indexed in full; with 'subtree', every known directory below is
+        re-listed as well (e.g. after a .gitignore changed).
+        """
+        # (rel_dir, re-list everything below, not indexed yet)
+        stack = [(rel_dir, subtree, False)]
+        while stack:
+            rel_dir, recurse, new = stack.pop()
+            with self._lock:
+                known = self._dirs.get(rel_dir)
+            if known is None and not new:
+                # Not indexed (excluded, or removed with a parent): nothing to update
+                continue
+            try:
+                dirs, files, _ = self.dp.list_dir(self.root, rel_dir)
+            except OSError:
+                with self._lock:
+                    self._remove_dir(rel_dir)
+                continue
+            old_dirs, old_files = known or (set(), set())
+            prefix = f'{rel_dir}/' if rel_dir else ''
+            with self._lock:
+                for name in old_files - {entry.name for entry in files}:
+                    self._remove_file(prefix + name)
+                for name in old_dirs - {entry.name for entry in dirs}:
+                    self._remove_dir(prefix + name)
+            self._index_listing(rel_dir, dirs, files)
+            for entry in dirs:
+                is_new = entry.name not in old_dirs
+                if recurse or is_new:
+                    stack.append((prefix + entry.name, recurse or is_new, is_new))
+
+    def apply_pending(self):
+        """
+        Apply the changes reported since the last call.
+        """
+        if not self.ready or self.closed:
+            return
+        # Reported through on_change if the ignore files above the root changed
+        self.dp.check_ignore_files(self.root)
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for rel_dir in sorted(pending):
+            self._refresh_dir(rel_dir, pending[rel_dir])
+        with self._lock:
+            if self._stale >= max(COMPACT_MIN_STALE, len(self._docs)):
+                self._compact()
+
+    def _compact(self):
+        paths = self._paths
+        self._postings = {
+            gram: postings
+            for gram, postings in (
+                (gram, array('I', (doc for doc in postings if paths[doc] is not None)))
+                for gram, postings in self._postings.items()
+            )
+            if postings
+        }
+        self._stale = 0
+
+    def search(self, query, limit=DEFAULT_LIMIT, mode='all'):
+        """
+        Up to 'limit' matches for query, best first: file names matching it
+        fuzzily (mode 'name' or 'all'), then files containing it, ignoring
+        case (mode 'content' or 'all', for queries of 3+ characters). Each
+        result is a dict with "path" (absolute), "rel_path" and "match"
+        ("name" or "content"); content matches also carry the first matching
+        "line" number and its text as "snippet".
+        """
+        self.apply_pending()
+        query = query.strip().lower()
+        if not query:
+            return []
+        results = []
+        if mode in ('all', 'name'):
+            results = [self._result(rel_path, 'name') for rel_path in self._match_names(query, limit)]
+        if mode in ('all', 'content') and len(query) >= 3 and len(results) < limit:
+            found = {result['rel_path'] for result in results}
+            for rel_path in self._content_candidates(query):
+                if rel_path in found:
+                    continue
+                result = self._check_content(rel_path, query)
+                if result is not None:
+                    results.append(result)
+                    if len(results) >= limit:
+                        break
+        return results
+
+    def _name_list(self):
+        # Paths of the indexed files, rebuilt after files were added or removed
+        with self._lock:
+            if self._names is None:
+                self._names = list(self._docs)
+            return self._names
+
+    def _match_names(self, query, limit):
+        # A regex rejects the paths that don't match at C speed; only the rest are scored
+        pattern = re.compile(''.join(f'[^{c}]*{_POSSESSIVE}{c}' for c in map(re.escape, query)), re.IGNORECASE)
+        scored = []
+        for rel_path in self._name_list():
+            if pattern.match(rel_path) is None:
+                continue
+            score = fuzzy_score(query, rel_path)
+            if score is not None:
+                scored.append((-score, len(rel_path), rel_path))
+        return [rel_path for _, _, rel_path in heapq.nsmallest(limit, scored)]
+
+    def _content_candidates(self, query):
+        with self._lock:
+            lists = []
+            for gram in trigrams(query):
+                postings = self._postings.get(gram)
+                if postings is None:
+                    return []
+                lists.append(postings)
+            lists.sort(key=len)
+            docs = set(lists[0]).intersection(*lists[1:])
+            return sorted(path for path in (self._paths[doc] for doc in docs) if path is not None)
+
+    def _check_content(self, rel_path, query):
+        # The trigrams only say the file may contain the query; look for it
+        path = os.path.join(self.root, *rel_path.split('/'))
+        try:
+            content = self.file_reader.read(path)
+        except OSError:
+            return None
+        pos = content.lower().find(query)
+        if pos < 0:
+            return None
+        start = content.rfind('\n', 0, pos) + 1
+        end = content.find('\n', pos)
+        result = self._result(rel_path, 'content')
+        result['line'] = content.count('\n', 0, pos) + 1
+        result['snippet'] = content[start:end if end >= 0 else len(content)].strip()[:SNIPPET_CHARS]
+        return result
+
+    def _result(self, rel_path, match):
+        return {'path': os.path.join(self.root, *rel_path.split('/')), 'rel_path': rel_path, 'match': match}
+
+    @property
+    def closed(self):
+        return self.dp.cancel is not None and self.dp.cancel.cancelled
+
+    def close(self):
+        """
+        Stop following changes, and stop the build if it is still running.
+        """
+        if self.listing_cache is not None:
+            self.listing_cache.unsubscribe(self.on_change)
+        if self.dp.cancel is not None:
+            self.dp.cancel.cancel()
@@ -0,0 +1,147 @@
+import math
+import threading
+from collections import OrderedDict, namedtuple
+from jackdir.entities.file_reader import FileReader
+
+# Rough average for source code and English text with common LLM tokenizers
+BYTES_PER_TOKEN = 4
+# Don't bother truncating a file to less than this many bytes
+MIN_TRUNCATE_BYTES = 1024
+# Cost of a placeholder such as '<File too large: ...>'
+PLACEHOLDER_TOKENS = 16
+
+PRIORITIES = ('smallest', 'recent', 'path')
+# Files whose token count is remembered at most (least recently used are dropped)
+MAX_COUNTS = 100000
+
+# files: (relative_file_path, entry) pairs to emit, in their original order
+# readers: relative_file_path -> FileReader for files that must be truncated
+# omitted: relative paths left out of the contents (still listed in the tree)
+BudgetPlan = namedtuple('BudgetPlan', ['files', 'readers', 'omitted'])
+
+
+def estimate_text_tokens(text):
+    return math.ceil(len(text) / BYTES_PER_TOKEN)
+
+
+def _block_overhead(relative_file_path):
+    return estimate_text_tokens(
+        f'----BEGINNING OF {relative_file_path}------\n\n----END OF {relative_file_path}-------\n\n'
+    )
+
+
+class TokenEstimator:
+    """
+    Per-file token estimates from stat metadata alone (size / BYTES_PER_TOKEN).
+    Once a file's content has been rendered, record() stores a count from the
+    actual text (binary or oversized files shrink to a placeholder), which is
+    reused for as long as the file's size and mtime stay the same. Counts are
+    kept per path (a new version replaces the old one), for the max_entries
+    most recently used paths.
+    """
+
+    def __init__(self, max_entries=MAX_COUNTS):
+        self.max_entries = max_entries
+        # path -> (size, mtime, token count), least recently used first
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def estimate(self, path, stat_result):
+        with self._lock:
+            hit = self._counts.get(path)
+            if hit is not None:
+                self._counts.move_to_end(path)
+        if hit is not None and hit[:2] == (stat_result.st_size, stat_result.st_mtime_ns):
+            return hit[2]
+        return math.ceil(stat_result.st_size / BYTES_PER_TOKEN)
+
+    def record(self, path, stat_result, text):
+        count = estimate_text_tokens(text)
+        with self._lock:
+            self._counts[path] = (stat_result.st_size, stat_result.st_mtime_ns, count)
+            self._counts.move_to_end(path)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+
+# Shared so counts recorded by one run (or request) help the next ones
+DEFAULT_ESTIMATOR = TokenEstimator()
+
+
+class TokenBudget:
+    """
+    Chooses which files fit in a token budget before any of them is read.
+
+    Files are considered in priority order ('smallest' first, most 'recent'
+    first, or 'path' order). Each one is included in full if it fits; the
+    first one that doesn't is truncated to what's left (with truncate=True),
+    and the rest are only listed in the tree. The budget is spent across
+    calls to pack(), so one TokenBudget covers a whole output.
+    """
+
+    def __init__(self, max_tokens, priority='smallest', truncate=True, estimator=None):
+        if priority not in PRIORITIES:
+            raise ValueError(f'Unknown token priority: {priority}')
+        self.max_tokens = max_tokens
+        self.remaining = max_tokens
+        self.priority = priority
+        self.truncate = truncate
+        self.estimator = estimator or DEFAULT_ESTIMATOR
+
+    def _cost(self, entry, stat_result, file_reader):
+        # Files over the reader's size cap never cost more than the cap allows
+        cap = file_reader.max_file_size if file_reader is not None else None
+        if cap is not None and stat_result.st_size > cap:
+            return math.ceil(cap / BYTES_PER_TOKEN) if file_reader.truncate else PLACEHOLDER_TOKENS
+        return self.estimator.estimate(entry.path, stat_result)
+
+    def pack(self, files, reserved_tokens=0, file_reader=None):
+        """
+        Plan the (relative_file_path, entry) pairs of one output section.
+        reserved_tokens is deducted first (e.g. for the tree itself).
+        """
+        self.remaining -= reserved_tokens
+        candidates = []
+        for index, (relative_file_path, entry) in enumerate(files):
+            try:
+                stat_result = entry.stat()
+            except OSError:
+                stat_result = None
+            candidates.append((index, relative_file_path, entry, stat_result))
+
+        if self.priority == 'smallest':
+            candidates.sort(key=lambda c: c[3].st_size if c[3] else 0)
+        elif self.priority == 'recent':
+            candidates.sort(key=lambda c: -c[3].st_mtime_ns if c[3] else 0)
+
+        chosen = []
+        readers = {}
+        omitted = []
+        for index, relative_file_path, entry, stat_result in candidates:
+            overhead = _block_overhead(relative_file_path)
+            if stat_result is None:
+                # Unreadable: costs only the error placeholder
+                cost = PLACEHOLDER_TOKENS
+            else:
+                cost = self._cost(entry, stat_result, file_reader)
+            if overhead + cost <= self.remaining:
+                self.remaining -= overhead + cost
+                chosen.append(index)
+                continue
+
+            truncate_bytes = (self.remaining - overhead - PLACEHOLDER_TOKENS) * BYTES_PER_TOKEN
+            if self.truncate and truncate_bytes >= MIN_TRUNCATE_BYTES:
+                readers[relative_file_path] = FileReader(
+                    max_file_size=truncate_bytes,
+                    truncate=True,
+                    encoding=file_reader.encoding if file_reader else 'utf-8',
+                    errors=file_reader.errors if file_reader else 'strict',
+                )
+                self.remaining = 0
+                chosen.append(index)
+            else:
+                omitted.append(relative_file_path)
+
+        chosen.sort()
+        omitted.sort()
+        return BudgetPlan([files[i] for i in chosen], readers, omitted)
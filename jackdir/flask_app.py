@@ -1,17 +1,323 @@
+import argparse
+import bisect
+import hashlib
+import heapq
 import json
 import logging
-from flask import Flask, request, jsonify, send_from_directory
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 import os
 from flask_cors import CORS
-from jackdir.entities.directory_processor import DirectoryProcessor
+from werkzeug.exceptions import GatewayTimeout, ServiceUnavailable
+from werkzeug.serving import ThreadedWSGIServer
+from jackdir.entities.cancel_token import CancelToken, Cancelled
+from jackdir.entities.chat_cache import ExpiringCache, context_key, response_key
+from jackdir.entities.directory_processor import DEFAULT_WALK_JOBS, DirectoryProcessor, PathEntry
+from jackdir.entities.file_reader import FileReader
 from jackdir.adapters.clipboard_adapter import ClipboardAdapter
+from jackdir.adapters.compression_adapter import CompressionAdapter
+from jackdir.adapters.content_cache import open_content_cache
+from jackdir.adapters.fs_watcher import create_watcher
+from jackdir.adapters.llm_adapter import LLMAdapter
+from jackdir.adapters.metrics import Metrics
+from jackdir.entities.listing_cache import ListingCache
+from jackdir.entities.run_stats import RunStats, timed
+from jackdir.entities.search_index import DEFAULT_LIMIT, SearchIndex
+from jackdir.entities.token_budget import TokenBudget, estimate_text_tokens
 from jackdir.use_cases.copy_to_clipboard import CopyMultiplePathsUseCase
-from jackdir.main import load_gitignore_spec
-from openai import OpenAI
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
 
 app = Flask(__name__, static_folder='client/build')
 CORS(app) 
 
+# On-disk content cache shared by all requests, opened on first use
+_content_cache = None
+
+
+# Watcher-backed listing caches, one per (include_hidden, respect_gitignore)
+_listing_caches = {}
+_listing_caches_lock = threading.Lock()
+app.config.setdefault("TREE_CACHE", True)
+
+
+def get_listing_cache(include_hidden, respect_gitignore):
+    if not app.config["TREE_CACHE"]:
+        return None
+    key = (bool(include_hidden), bool(respect_gitignore))
+    with _listing_caches_lock:
+        if key not in _listing_caches:
+            _listing_caches[key] = ListingCache(watcher_factory=create_watcher)
+        return _listing_caches[key]
+
+
+def _tree_etag(listing_cache, *parts):
+    # Changes whenever the watcher reports a change, or the server restarts
+    raw = "|".join([listing_cache.instance_id, str(listing_cache.generation)] + [json.dumps(p) for p in parts])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# Pooled LLM clients, one adapter per backend URL. LLM_BASE_URL points the chat
+# at any OpenAI-compatible server (e.g. a local stand-in); None means OpenAI.
+_llm_adapters = {}
+_llm_adapters_lock = threading.Lock()
+app.config.setdefault("LLM_BASE_URL", os.environ.get("JACKDIR_LLM_BASE_URL") or None)
+
+CHAT_INSTRUCTIONS = "You are a coding assistant that talks like a pirate."
+
+
+# Blocking work runs on bounded pools, so a few huge walks or slow LLM calls
+# can't take every request thread. REQUEST_TIMEOUT (seconds) cancels walks
+# and reads that run longer; requests beyond MAX_QUEUED_PER_WORKER jobs per
+# worker are turned away with 503 instead of queueing without bound.
+app.config.setdefault("FS_WORKERS", 4)
+app.config.setdefault("LLM_WORKERS", 8)
+app.config.setdefault("MAX_QUEUED_PER_WORKER", 4)
+app.config.setdefault("REQUEST_TIMEOUT", 300)
+# Directories each walk lists at once (worth raising for network file systems)
+app.config.setdefault("WALK_JOBS", DEFAULT_WALK_JOBS)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(name):
+    with _pools_lock:
+        if name not in _pools:
+            workers = app.config[f"{name.upper()}_WORKERS"]
+            _pools[name] = (
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"jackdir-{name}"),
+                threading.BoundedSemaphore(workers * app.config["MAX_QUEUED_PER_WORKER"]),
+            )
+        return _pools[name]
+
+
+def get_cancel_token():
+    """
+    CancelToken of the current request: it expires after REQUEST_TIMEOUT and
+    is cancelled when the response is closed (e.g. the client went away).
+    """
+    if "cancel_token" not in g:
+        g.cancel_token = CancelToken(app.config["REQUEST_TIMEOUT"])
+    return g.cancel_token
+
+
+def run_blocking(pool_name, func):
+    """
+    Run func() on the "fs" or "llm" pool and wait for its result, for at most
+    what is left of the request's timeout. Raises ServiceUnavailable (503) if
+    the pool is saturated and GatewayTimeout (504) if the time runs out, in
+    which case the request's cancel token stops the work at its next check.
+    """
+    executor, slots = _pool(pool_name)
+    if not slots.acquire(blocking=False):
+        raise ServiceUnavailable("The server is busy, please try again shortly.")
+    try:
+        future = executor.submit(func)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+
+    cancel = get_cancel_token()
+    try:
+        return future.result(timeout=cancel.remaining())
+    except (FutureTimeout, Cancelled):
+        cancel.cancel()
+        future.cancel()
+        raise GatewayTimeout(f"The request took longer than {app.config['REQUEST_TIMEOUT']} seconds.")
+
+
+def hold_slot(pool_name):
+    """
+    Take one of the pool's slots for work that runs on the request thread
+    instead (streamed responses), so it counts against the same limit as
+    run_blocking. Raises ServiceUnavailable (503) if the pool is saturated.
+    Returns a function releasing the slot (once, however often it's called);
+    register it with response.call_on_close.
+    """
+    _, slots = _pool(pool_name)
+    if not slots.acquire(blocking=False):
+        raise ServiceUnavailable("The server is busy, please try again shortly.")
+    held = True
+    lock = threading.Lock()
+
+    def release():
+        nonlocal held
+        with lock:
+            if held:
+                held = False
+                slots.release()
+    return release
+
+
+def until_cancelled(chunks, cancel):
+    """
+    Pass chunks through, raising Cancelled at the first one produced after
+    the request's timeout ran out (or it was cancelled).
+    """
+    for chunk in chunks:
+        cancel.check()
+        yield chunk
+
+
+@app.errorhandler(ServiceUnavailable)
+@app.errorhandler(GatewayTimeout)
+def _json_error(e):
+    return jsonify({"error": e.description}), e.code
+
+
+# Cumulative counters and latency histograms, served at /api/metrics
+metrics = Metrics()
+
+
+def get_run_stats():
+    """
+    RunStats of the current request, folded into the metrics when it ends.
+    """
+    if "run_stats" not in g:
+        g.run_stats = RunStats()
+    return g.run_stats
+
+
+@app.before_request
+def _start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    started = g.get("started")
+    if started is None:
+        return response
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    method = request.method
+    stats = g.get("run_stats")
+    cancel = g.get("cancel_token")
+
+    # Streamed responses are only done once they're closed
+    def record():
+        if cancel is not None:
+            # Stops whatever still works for a response nobody reads anymore
+            cancel.cancel()
+        metrics.observe_request(endpoint, method, response.status_code, time.perf_counter() - started)
+        if stats is not None:
+            metrics.add_run(stats)
+
+    response.call_on_close(record)
+    return response
+
+
+# Chat caches, created on first use. Contexts are keyed by the selected paths
+# and their metadata, so they never go stale; answers are keyed by the model,
+# instructions, prompt and context, and only cached for RESPONSE_CACHE_TTL
+# seconds (0 turns that cache off). Both are bounded in characters.
+_chat_caches = {}
+_chat_caches_lock = threading.Lock()
+app.config.setdefault("CONTEXT_CACHE_CHARS", 32 * 1024 * 1024)
+app.config.setdefault("RESPONSE_CACHE_CHARS", 8 * 1024 * 1024)
+app.config.setdefault("RESPONSE_CACHE_TTL", 0)
+
+
+def get_chat_cache(name):
+    """
+    ExpiringCache for "context" or "response", or None if it is turned off.
+    """
+    with _chat_caches_lock:
+        if name not in _chat_caches:
+            max_chars = app.config[f"{name.upper()}_CACHE_CHARS"]
+            ttl = app.config["RESPONSE_CACHE_TTL"] if name == "response" else None
+            enabled = max_chars and (name != "response" or ttl)
+            _chat_caches[name] = ExpiringCache(max_chars, ttl) if enabled else None
+        return _chat_caches[name]
+
+
+def get_llm_adapter():
+    base_url = app.config["LLM_BASE_URL"]
+    with _llm_adapters_lock:
+        if base_url not in _llm_adapters:
+            _llm_adapters[base_url] = LLMAdapter(base_url=base_url)
+        return _llm_adapters[base_url]
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+def get_count(data, name, default):
+    """
+    The request's data[name] (or 'default') as a count of at least 1.
+    Raises ValueError if it isn't a number.
+    """
+    value = data.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"Invalid {name}: {value!r}")
+    try:
+        return max(1, int(value))
+    except (ValueError, OverflowError):
+        raise ValueError(f"Invalid {name}: {value!r}") from None
+
+
+def get_token_budget(data):
+    """
+    TokenBudget for the request's "max_tokens" / "token_priority", if any.
+    Raises ValueError for an unknown priority.
+    """
+    max_tokens = data.get("max_tokens")
+    if not max_tokens:
+        return None
+    return TokenBudget(int(max_tokens), priority=data.get("token_priority", "smallest"))
+
+
+# Search indexes, one per (directory, include_hidden, respect_gitignore); the
+# least recently used ones are dropped beyond MAX_SEARCH_INDEXES
+_search_indexes = OrderedDict()
+_search_indexes_lock = threading.Lock()
+app.config.setdefault("MAX_SEARCH_INDEXES", 4)
+
+
+def get_search_index(directory, include_hidden, respect_gitignore):
+    """
+    SearchIndex for the directory, started in the background on first use.
+    It follows changes through the tree cache's watcher; with TREE_CACHE
+    off it is a snapshot of the first walk.
+    """
+    key = (directory, bool(include_hidden), bool(respect_gitignore))
+    with _search_indexes_lock:
+        index = _search_indexes.get(key)
+        if index is not None:
+            _search_indexes.move_to_end(key)
+            return index
+        listing_cache = get_listing_cache(include_hidden, respect_gitignore)
+        dp = DirectoryProcessor(
+            include_hidden=include_hidden,
+            respect_gitignore=respect_gitignore,
+            listing_cache=listing_cache,
+            walk_jobs=app.config["WALK_JOBS"],
+            # Cancelled when the index is evicted, which stops its build
+            cancel=CancelToken(),
+        )
+        index = _search_indexes[key] = SearchIndex(directory, dp, listing_cache)
+        while len(_search_indexes) > app.config["MAX_SEARCH_INDEXES"]:
+            _, evicted = _search_indexes.popitem(last=False)
+            evicted.close()
+    index.start()
+    return index
+
+
+def get_content_cache(use_cache=True):
+    global _content_cache
+    if not use_cache:
+        return None
+    if _content_cache is None:
+        _content_cache = open_content_cache()
+    return _content_cache
+
 # Serve React App
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -24,27 +330,127 @@ def serve(path):
 
 def build_tree(path, dp):
     """
-    Recursively build a tree (as a Python dict) for the given path.
+    Build a tree (as a Python dict) for the given path from a single
+    DirectoryProcessor.walk() pass.
     """
     name = os.path.basename(path) or path
-    node = {
+    root = {
         "name": name,
         "path": path,
         "type": "directory" if os.path.isdir(path) else "file",
         "children": []
     }
-    if not os.path.isdir(path):
-        return node
+    if root["type"] != "directory":
+        return root
+
+    # Directory nodes waiting for their own listing, keyed by relative path
+    pending = {"": root}
+    for rel_dir, dirs, files in dp.walk(path):
+        node = pending.pop(rel_dir)
+        for entry in dirs:
+            child = {"name": entry.name, "path": entry.path, "type": "directory", "children": []}
+            pending[f"{rel_dir}/{entry.name}" if rel_dir else entry.name] = child
+            node["children"].append(child)
+        for entry in files:
+            node["children"].append({"name": entry.name, "path": entry.path, "type": "file", "children": []})
+        # Keep directories and files interleaved by name, as in a plain listing
+        node["children"].sort(key=lambda child: child["name"])
+    return root
+
+
+def build_flat_tree(path, dp):
+    """
+    Same tree as build_tree, as parallel arrays instead of nested dicts:
+    node i is called name[i], is a directory if kind[i] == "d" (else "f"),
+    and is a child of node parent[i] (-1 for the root, node 0). Nodes come
+    after their parent and siblings are sorted by name. Paths aren't sent:
+    a node's path is "path" joined (with "sep") with the names down to it.
+    """
+    is_dir = os.path.isdir(path)
+    parent = [-1]
+    names = [os.path.basename(path) or path]
+    kinds = ["d" if is_dir else "f"]
+    if is_dir:
+        # Index of directory nodes waiting for their own listing, keyed by relative path
+        pending = {"": 0}
+        for rel_dir, dirs, files in dp.walk(path):
+            node = pending.pop(rel_dir)
+            entries = heapq.merge(
+                ((entry.name, "d") for entry in dirs),
+                ((entry.name, "f") for entry in files),
+            )
+            for name, kind in entries:
+                if kind == "d":
+                    pending[f"{rel_dir}/{name}" if rel_dir else name] = len(names)
+                parent.append(node)
+                names.append(name)
+                kinds.append(kind)
+    return {
+        "format": "flat",
+        "path": path,
+        "sep": os.sep,
+        "parent": parent,
+        "name": names,
+        "kind": "".join(kinds),
+    }
+
+
+# Maximum number of children returned per directory in lazy mode
+DEFAULT_PAGE_SIZE = 500
+
+
+def _count_children(dp, root, rel_dir, chain):
     try:
-        entries = sorted(os.listdir(path))
-    except PermissionError:
-        return node
-    for entry in entries:
-        full_child = os.path.join(path, entry)
-        is_dir = os.path.isdir(full_child)
-        if dp.should_exclude(full_child, is_dir, os.path.dirname(path)):
+        dirs, files, _ = dp.list_dir(root, rel_dir, chain)
+    except OSError:
+        return 0
+    return len(dirs) + len(files)
+
+
+def build_lazy_tree(root, rel_dir, dp, depth=1, cursor=None, limit=DEFAULT_PAGE_SIZE, chain=None):
+    """
+    Build one page of the tree for root/rel_dir, going 'depth' levels down.
+    Children are sorted by name and paginated: at most 'limit' are returned,
+    starting after the name given as 'cursor', and "next_cursor" is set when
+    more remain. Directories below the requested depth are returned with
+    "children": None and a "child_count", so the UI can show an expander
+    without walking their subtree.
+    """
+    path = os.path.join(root, *rel_dir.split("/")) if rel_dir else root
+    dirs, files, child_chain = dp.list_dir(root, rel_dir, chain)
+    entries = list(heapq.merge(dirs, files, key=lambda entry: entry.name))
+
+    start = bisect.bisect_right([entry.name for entry in entries], cursor) if cursor else 0
+    page = entries[start:start + limit]
+    node = {
+        "name": os.path.basename(path) or path,
+        "path": path,
+        "type": "directory",
+        "child_count": len(entries),
+        "next_cursor": page[-1].name if start + limit < len(entries) else None,
+        "children": [],
+    }
+    for entry in page:
+        if not entry.is_dir():
+            node["children"].append({"name": entry.name, "path": entry.path, "type": "file", "children": []})
             continue
-        node["children"].append(build_tree(full_child, dp))
+        child_rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+        if depth > 1:
+            try:
+                child = build_lazy_tree(root, child_rel, dp, depth - 1, None, limit, child_chain)
+            except OSError:
+                child = {"name": entry.name, "path": entry.path, "type": "directory",
+                         "child_count": 0, "next_cursor": None, "children": []}
+        else:
+            child = {
+                "name": entry.name,
+                "path": entry.path,
+                "type": "directory",
+                "child_count": _count_children(dp, root, child_rel, child_chain),
+                "next_cursor": None,
+                "children": None,
+            }
+        node["children"].append(child)
     return node
 
 
@@ -53,6 +459,21 @@ def api_tree():
     """
     Build a nested JSON tree for the entire directory.
     Expects JSON body: { "directory": "...", "include_hidden": bool, "respect_gitignore": bool }
+
+    Lazy mode ("lazy": true) returns one page of one directory instead:
+      - path (optional): directory inside "directory" to expand (default: the root).
+      - depth (optional): how many levels to include (default 1).
+      - cursor (optional): "next_cursor" from the previous page of the same directory.
+      - limit (optional): maximum children per directory (default 500).
+
+    "format": "flat" returns the full tree as parallel arrays (see
+    build_flat_tree), which is several times smaller than the nested dicts
+    for deep trees. Lazy pages are always nested. With "Accept:
+    application/msgpack" (and the msgpack package installed), the response
+    is MessagePack instead of JSON.
+
+    Responses carry an ETag; a request with a matching If-None-Match header
+    gets "304 Not Modified" without touching the disk.
     """
     print("Received request for directory tree")
     data = request.get_json(force=True)
@@ -66,47 +487,335 @@ def api_tree():
             "tree": None
         })
 
-    # Load .gitignore spec only if requested
-    spec = load_gitignore_spec(directory) if respect_gitignore else None
-    dp = DirectoryProcessor(include_hidden=include_hidden, spec=spec)
+    # Nested .gitignore files are only applied if requested
+    listing_cache = get_listing_cache(include_hidden, respect_gitignore)
+    dp = DirectoryProcessor(
+        include_hidden=include_hidden,
+        respect_gitignore=respect_gitignore,
+        listing_cache=listing_cache,
+        walk_jobs=app.config["WALK_JOBS"],
+        stats=get_run_stats(),
+        cancel=get_cancel_token(),
+    )
+
+    flat = data.get("format", "nested") == "flat" and not data.get("lazy", False)
+    use_msgpack = msgpack is not None and request.accept_mimetypes.best_match(
+        ["application/json", "application/msgpack"]) == "application/msgpack"
+
+    etag = None
+    if listing_cache is not None:
+        # The watcher doesn't see the ignore files above the directory
+        dp.check_ignore_files(directory)
+        generation = listing_cache.generation
+        etag = _tree_etag(listing_cache, directory, data.get("lazy", False), data.get("path"),
+                          data.get("depth"), data.get("cursor"), data.get("limit"), flat, use_msgpack)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+    if data.get("lazy", False):
+        path = os.path.abspath(data.get("path") or directory)
+        if os.path.commonpath([directory, path]) != directory or not os.path.isdir(path):
+            return jsonify({
+                "error": f"Invalid path: {path}",
+                "tree": None
+            })
+        rel_dir = os.path.relpath(path, directory).replace(os.sep, "/")
+        try:
+            depth = get_count(data, "depth", 1)
+            limit = get_count(data, "limit", DEFAULT_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({
+                "error": str(e),
+                "tree": None
+            })
+        try:
+            tree = run_blocking("fs", lambda: build_lazy_tree(
+                directory,
+                "" if rel_dir == "." else rel_dir,
+                dp,
+                depth=depth,
+                cursor=data.get("cursor"),
+                limit=limit,
+            ))
+        except OSError as e:
+            return jsonify({
+                "error": f"Could not list {path}: {e}",
+                "tree": None
+            })
+    else:
+        build = build_flat_tree if flat else build_tree
 
-    tree = build_tree(directory, dp)
+        def walk():
+            with timed(dp.stats, "walk"):
+                if listing_cache is not None:
+                    key = ("flat_tree" if flat else "tree", directory)
+                    return listing_cache.memoize(key, lambda: build(directory, dp))
+                return build(directory, dp)
+
+        tree = run_blocking("fs", walk)
+
+    if use_msgpack:
+        response = app.response_class(
+            msgpack.packb({"error": None, "tree": tree}), mimetype="application/msgpack"
+        )
+    else:
+        response = jsonify({
+            "error": None,
+            "tree": tree
+        })
+    response.vary.add("Accept")
+    # No ETag if the tree changed while it was built, or some directory in
+    # it can't be watched (which counts as a change too)
+    if etag is not None and listing_cache.generation == generation:
+        response.set_etag(etag)
+    return response
 
+@app.route("/api/search", methods=["POST"])
+def api_search():
+    """
+    Find files below a directory by name and by content.
+    Expects JSON: { "directory": "...", "query": "...", "limit": int (optional, default 50),
+                    "mode": "all" | "name" | "content" (optional, default "all"),
+                    "include_hidden": bool, "respect_gitignore": bool }
+    File names are matched fuzzily (the query's characters in order) and
+    ranked; contents are matched as a case-insensitive substring. The index
+    is built in the background on the first search of a directory: until it
+    is done, "ready" is false and the results only cover what it has seen.
+    """
+    data = request.get_json(force=True)
+    directory = os.path.abspath(data.get("directory", "."))
+    query = data.get("query", "")
+    mode = data.get("mode", "all")
+
+    if not os.path.isdir(directory):
+        return jsonify({
+            "error": f"Invalid directory: {directory}",
+            "results": None
+        })
+    if mode not in ("all", "name", "content"):
+        return jsonify({
+            "error": f"Invalid mode: {mode}",
+            "results": None
+        })
+    try:
+        limit = get_count(data, "limit", DEFAULT_LIMIT)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "results": None
+        })
+
+    index = get_search_index(directory, data.get("include_hidden", False), data.get("respect_gitignore", True))
+    # Read before searching, so "ready" never claims more than the results cover
+    ready = index.ready
+    results = run_blocking("fs", lambda: index.search(query, limit, mode))
     return jsonify({
         "error": None,
-        "tree": tree
+        "ready": ready,
+        "results": results
     })
 
 @app.route("/api/copy_selected", methods=["POST"])
 def api_copy_selected():
     """
-    Expects JSON: { "selected_paths": [...], "include_hidden": bool, "respect_gitignore": bool }
-    Uses CopyMultiplePathsUseCase to copy all selected items.
+    Expects JSON: { "selected_paths": [...], "include_hidden": bool, "respect_gitignore": bool,
+                    "max_file_size": int (optional), "truncate": bool (optional),
+                    "use_cache": bool (optional, default true),
+                    "max_tokens": int (optional), "token_priority": "smallest" | "recent" | "path",
+                    "dedupe": bool (optional) }
+    Uses CopyMultiplePathsUseCase to copy all selected items. Overlapping
+    selections are read once; with "dedupe", files whose content was already
+    included are replaced by a reference to the first copy.
     """
     data = request.get_json(force=True)
     selected_paths = data.get("selected_paths", [])
     include_hidden = data.get("include_hidden", False)
     respect_gitignore = data.get("respect_gitignore", True)
+    file_reader = FileReader(max_file_size=data.get("max_file_size"), truncate=data.get("truncate", False))
 
     if not selected_paths:
         return jsonify({
             "error": "No items selected.",
             "message": None
         })
+    try:
+        token_budget = get_token_budget(data)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "message": None
+        })
 
-    base_dir = os.path.dirname(selected_paths[0]) if selected_paths else '.'
-    spec = load_gitignore_spec(base_dir) if respect_gitignore else None
-    dp = DirectoryProcessor(include_hidden=include_hidden, spec=spec)
+    dp = DirectoryProcessor(
+        include_hidden=include_hidden,
+        respect_gitignore=respect_gitignore,
+        file_reader=file_reader,
+        content_cache=get_content_cache(data.get("use_cache", True)),
+        listing_cache=get_listing_cache(include_hidden, respect_gitignore),
+        walk_jobs=app.config["WALK_JOBS"],
+        token_budget=token_budget,
+        dedupe_content=data.get("dedupe", False),
+        stats=get_run_stats(),
+        cancel=get_cancel_token(),
+    )
     clipboard = ClipboardAdapter()
 
     use_case = CopyMultiplePathsUseCase(dp, clipboard)
-    msg = use_case.execute(selected_paths)
+    msg = run_blocking("fs", lambda: use_case.execute(selected_paths))
 
     return jsonify({
         "error": None,
         "message": msg
     })
 
+@app.route("/api/export", methods=["POST"])
+def api_export():
+    """
+    Same input as /api/copy_selected, but streams the combined output back to
+    the client (chunked transfer encoding) instead of copying it, so large
+    bundles start arriving right away and never sit in server memory.
+    Optional "compression": "gzip" or "zstd" (if the zstandard package is
+    installed) sets the matching Content-Encoding.
+    """
+    data = request.get_json(force=True)
+    selected_paths = data.get("selected_paths", [])
+    include_hidden = data.get("include_hidden", False)
+    respect_gitignore = data.get("respect_gitignore", True)
+    file_reader = FileReader(max_file_size=data.get("max_file_size"), truncate=data.get("truncate", False))
+
+    if not selected_paths:
+        return jsonify({
+            "error": "No items selected.",
+            "message": None
+        }), 400
+    try:
+        token_budget = get_token_budget(data)
+        compression = data.get("compression")
+        compressor = CompressionAdapter(compression) if compression else None
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "message": None
+        }), 400
+
+    dp = DirectoryProcessor(
+        include_hidden=include_hidden,
+        respect_gitignore=respect_gitignore,
+        file_reader=file_reader,
+        content_cache=get_content_cache(data.get("use_cache", True)),
+        listing_cache=get_listing_cache(include_hidden, respect_gitignore),
+        walk_jobs=app.config["WALK_JOBS"],
+        token_budget=token_budget,
+        dedupe_content=data.get("dedupe", False),
+        stats=get_run_stats(),
+        cancel=get_cancel_token(),
+    )
+    # The walk and reads happen while the response streams, on the request
+    # thread, so they hold an "fs" slot until it's closed
+    release = hold_slot("fs")
+    # The clipboard adapter is never used when streaming
+    use_case = CopyMultiplePathsUseCase(dp, None)
+    chunks = until_cancelled(use_case.stream(selected_paths), dp.cancel)
+    headers = {"Content-Disposition": 'attachment; filename="jackdir-export.txt"'}
+    if compressor is not None:
+        chunks = compressor.compress(chunks)
+        headers["Content-Encoding"] = compressor.encoding
+    response = Response(stream_with_context(chunks), mimetype="text/plain", headers=headers)
+    response.call_on_close(release)
+    return response
+
+def build_chat_context(prompt, selected_paths, dp, file_reader, token_budget=None):
+    """
+    Structural context (directory trees) and file contents for the selected
+    paths, in selection order, to append to the chat prompt. With a token
+    budget, files are fitted into what the prompt and trees leave over.
+    """
+    # Sections keyed by position, so files can be budgeted after the rest
+    sections = {}
+    selected_files = []
+    for i, path in enumerate(selected_paths):
+        abs_path = os.path.abspath(path)
+        if not os.path.exists(abs_path):
+            sections[i] = f"[Error] Path does not exist: {abs_path}"
+        elif os.path.isfile(abs_path):
+            selected_files.append((i, abs_path))
+        elif os.path.isdir(abs_path):
+            with timed(dp.stats, "walk"):
+                tree_lines = dp.generate_tree(abs_path)
+            # The indented text tree of the CLI output: a fraction of the tokens of JSON
+            sections[i] = (
+                f"\n--- Directory Structure for: {abs_path} ---\n"
+                + "\n".join(tree_lines)
+                + "\n-----------------------------------------"
+            )
+
+    readers = {}
+    omitted = set()
+    if token_budget is not None:
+        reserved = estimate_text_tokens(prompt) + sum(estimate_text_tokens(s) for s in sections.values())
+        plan = token_budget.pack(
+            [(abs_path, PathEntry(abs_path)) for _, abs_path in selected_files], reserved, file_reader
+        )
+        readers = plan.readers
+        omitted = set(plan.omitted)
+
+    for i, abs_path in selected_files:
+        if dp.cancel is not None:
+            dp.cancel.check()
+        if abs_path in omitted:
+            sections[i] = f"[Omitted] {abs_path}: does not fit the {token_budget.max_tokens} token budget"
+            continue
+        try:
+            with timed(dp.stats, "read"):
+                file_content = dp.read_file(abs_path, file_reader=readers.get(abs_path))
+            sections[i] = (
+                f"\n--- Content of File: {abs_path} ---\n"
+                f"{file_content}\n"
+                "-----------------------------------------"
+            )
+        except Exception as e:
+            sections[i] = f"[Error] Could not read file: {abs_path}. Exception: {str(e)}"
+    context_sections = [sections[i] for i in sorted(sections)]
+    # Join all context sections into one extra context string, appended to the chat prompt
+    return "\n\n--- File/Directory Context ---\n" + "\n".join(context_sections)
+
+
+def cached_chat_context(prompt, selected_paths, dp, file_reader, token_budget=None, use_cache=True):
+    """
+    build_chat_context, served from the context cache while none of the
+    selected files changed (and, for directories, the watcher reported no
+    change), so repeated chat turns don't read or walk anything again.
+    """
+    cache = get_chat_cache("context") if use_cache else None
+    key = None
+    listing_cache = dp.listing_cache
+    tree_version = None
+    if cache is not None:
+        if listing_cache is not None and listing_cache.watcher is not None:
+            # The watcher doesn't see the ignore files above the directories
+            for path in selected_paths:
+                abs_path = os.path.abspath(path)
+                if os.path.isdir(abs_path):
+                    dp.check_ignore_files(abs_path)
+            tree_version = [listing_cache.instance_id, listing_cache.generation]
+        options = [dp.include_hidden, dp.ignore_rules is not None, file_reader.cache_signature()]
+        if token_budget is not None:
+            # What the files get depends on what the prompt leaves over
+            options += [token_budget.max_tokens, token_budget.priority, estimate_text_tokens(prompt)]
+        key = context_key(selected_paths, options, tree_version)
+        if key is not None:
+            context = cache.get(key)
+            if context is not None:
+                return context
+    context = build_chat_context(prompt, selected_paths, dp, file_reader, token_budget)
+    # Not if the tree changed while the context was built (see memoize)
+    if key is not None and (tree_version is None or listing_cache.generation == tree_version[1]):
+        cache.put(key, context)
+    return context
+
+
 @app.route("/api/chat", methods=["POST"])
 def api_chat():
     """
@@ -121,63 +830,116 @@ def api_chat():
       - selected_paths: A list of paths (files and/or directories) to process.
       - include_hidden (optional): whether to include hidden files.
       - respect_gitignore (optional): whether to apply the .gitignore rules.
+      - max_file_size (optional): byte limit above which file contents are skipped.
+      - truncate (optional): keep the head and tail of files over max_file_size.
+      - use_cache (optional): whether to use the on-disk content cache, and the
+        context and response caches (default true).
+      - max_tokens (optional): token budget for the prompt and its context; files
+        that don't fit are truncated or left out before being read.
+      - token_priority (optional): "smallest" (default), "recent" or "path" first.
+      - stream (optional): send the answer as server-sent events while it is
+        generated (also chosen by an "Accept: text/event-stream" header). Each
+        "delta" event carries {"delta": text}; the stream ends with a "done"
+        event, or an "error" event carrying {"error": message}.
     """
     data = request.get_json(force=True)
+    stream = data.get("stream", request.accept_mimetypes.best == "text/event-stream")
     prompt = data.get("prompt", "")
     api_key = data.get("api_key", None)
     model = data.get("model", "gpt-4o")
     selected_paths = data.get("selected_paths", [])
     include_hidden = data.get("include_hidden", False)
     respect_gitignore = data.get("respect_gitignore", True)
+    use_cache = data.get("use_cache", True)
+    file_reader = FileReader(
+        max_file_size=data.get("max_file_size"),
+        truncate=data.get("truncate", False),
+        errors="ignore",
+    )
+    try:
+        token_budget = get_token_budget(data)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "response": None
+        })
 
-    extra_context = ""
+    context = ""
     if selected_paths:
-        base_dir = os.path.dirname(selected_paths[0]) if selected_paths else '.'
-        spec = load_gitignore_spec(base_dir) if respect_gitignore else None
-        dp = DirectoryProcessor(include_hidden=include_hidden, spec=spec)
-        context_sections = []
-        for path in selected_paths:
-            abs_path = os.path.abspath(path)
-            if not os.path.exists(abs_path):
-                context_sections.append(f"[Error] Path does not exist: {abs_path}")
-            elif os.path.isfile(abs_path):
-                try:
-                    with open(abs_path, "r", encoding="utf-8", errors="ignore") as f:
-                        file_content = f.read()
-                    section = (
-                        f"\n--- Content of File: {abs_path} ---\n"
-                        f"{file_content}\n"
-                        "-----------------------------------------"
-                    )
-                    context_sections.append(section)
-                except Exception as e:
-                    context_sections.append(f"[Error] Could not read file: {abs_path}. Exception: {str(e)}")
-            elif os.path.isdir(abs_path):
-                tree_representation = build_tree(abs_path, dp)
-                # Convert the tree to a pretty JSON string for context
-                section = (
-                    f"\n--- Directory Structure for: {abs_path} ---\n"
-                    f"{json.dumps(tree_representation, indent=2)}\n"
-                    "-----------------------------------------"
-                )
-                context_sections.append(section)
-        # Join all context sections into one extra context string.
-        extra_context = "\n".join(context_sections)
-        # Append the extra context to the chat prompt.
-        prompt += "\n\n--- File/Directory Context ---\n" + extra_context
+        dp = DirectoryProcessor(
+            include_hidden=include_hidden,
+            respect_gitignore=respect_gitignore,
+            file_reader=file_reader,
+            content_cache=get_content_cache(use_cache),
+            listing_cache=get_listing_cache(include_hidden, respect_gitignore),
+            walk_jobs=app.config["WALK_JOBS"],
+            stats=get_run_stats(),
+            cancel=get_cancel_token(),
+        )
+        context = run_blocking("fs", lambda: cached_chat_context(
+            prompt, selected_paths, dp, file_reader, token_budget, use_cache))
+
+    llm = get_llm_adapter()
+    stats = get_run_stats()
+    response_cache = get_chat_cache("response") if use_cache else None
+    key = None
+    cached = None
+    if response_cache is not None:
+        key = response_key(model, CHAT_INSTRUCTIONS, prompt, context, app.config["LLM_BASE_URL"], api_key)
+        cached = response_cache.get(key)
+    prompt += context
+
+    if stream:
+        # The answer streams from the request thread, holding an "llm" slot until it's done
+        release = hold_slot("llm") if cached is None else None
+        cancel = get_cancel_token()
+
+        def generate():
+            if cached is not None:
+                yield _sse("delta", {"delta": cached})
+                yield _sse("done", {})
+                return
+            deltas = []
+            try:
+                chunks = llm.stream(api_key, model, CHAT_INSTRUCTIONS, prompt)
+                for delta in stats.timed_iter("llm", until_cancelled(chunks, cancel)):
+                    deltas.append(delta)
+                    yield _sse("delta", {"delta": delta})
+            except Cancelled:
+                yield _sse("error", {"error": f"The request took longer than {app.config['REQUEST_TIMEOUT']} seconds."})
+                return
+            except Exception as e:
+                logging.exception("Error during chat processing")
+                yield _sse("error", {"error": str(e)})
+                return
+            if key is not None:
+                response_cache.put(key, "".join(deltas))
+            yield _sse("done", {})
+
+        # No proxy buffering, so every delta reaches the client as soon as it's sent
+        response = Response(stream_with_context(generate()), mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        if release is not None:
+            response.call_on_close(release)
+        return response
+
+    def complete():
+        with stats.phase("llm"):
+            return llm.complete(api_key, model, CHAT_INSTRUCTIONS, prompt)
 
     try:
-        client = OpenAI(api_key=api_key)
-        response = client.responses.create(
-            model=model,
-            instructions="You are a coding assistant that talks like a pirate.",
-            input=prompt,
-        )
-        logging.info(response)
+        if cached is not None:
+            text = cached
+        else:
+            text = run_blocking("llm", complete)
+            if key is not None:
+                response_cache.put(key, text)
         return jsonify({
             "error": None,
-            "response": response.output_text
+            "response": text
         })
+    except (ServiceUnavailable, GatewayTimeout):
+        raise
     except Exception as e:
         logging.exception("Error during chat processing")
         return jsonify({
@@ -186,10 +948,78 @@ def api_chat():
         }), 500
 
 
-def run_flask_app():
-    # Disable debugger pin and reloader for daemon thread compatibility
-    os.environ['FLASK_DEBUG'] = '1'
-    os.environ['FLASK_RUN_PORT'] = '6789'
+@app.route("/api/metrics", methods=["GET"])
+def api_metrics():
+    """
+    Cumulative request counts, latency histograms and walk/read counters
+    since the server started, in the Prometheus text format.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+class BoundedWSGIServer(ThreadedWSGIServer):
+    """
+    Werkzeug's threaded server, with at most 'threads' requests handled at
+    once; further connections wait in the listen backlog. Used when waitress
+    isn't installed.
+    """
+
+    def __init__(self, host, port, wsgi_app, threads):
+        super().__init__(host, port, wsgi_app)
+        self._slots = threading.BoundedSemaphore(threads)
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+
+def run_server(host, port, threads):
+    """
+    Serve the app with a production WSGI server: waitress if it is
+    installed (pip install jackdir[server]), else BoundedWSGIServer.
+    Both run requests on threads of a single process, so the listing and
+    content caches are shared by every request.
+    """
+    try:
+        import waitress
+    except ImportError:
+        app.logger.info(f"Serving on http://{host}:{port} with {threads} threads")
+        BoundedWSGIServer(host, port, app, threads).serve_forever()
+    else:
+        waitress.serve(app, host=host, port=port, threads=threads)
+
+
+def parse_server_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the jackdir web UI and API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=6789, help="Port to listen on (default: 6789)")
+    parser.add_argument("--threads", type=int, default=16, help="Requests handled at once (default: 16)")
+    parser.add_argument("--fs-workers", type=int, default=app.config["FS_WORKERS"], help=f"Tree walks and file reads run at once (default: {app.config['FS_WORKERS']})")
+    parser.add_argument("--llm-workers", type=int, default=app.config["LLM_WORKERS"], help=f"LLM calls run at once (default: {app.config['LLM_WORKERS']})")
+    parser.add_argument("--walk-jobs", type=int, default=app.config["WALK_JOBS"], help=f"Directories listed at once per tree walk; raise for network or FUSE mounts (default: {app.config['WALK_JOBS']})")
+    parser.add_argument("--response-cache-ttl", type=float, default=app.config["RESPONSE_CACHE_TTL"], metavar="SECONDS", help="Answer repeated chat requests (same model, prompt and context) from memory for SECONDS (default: off)")
+    parser.add_argument("--timeout", type=float, default=app.config["REQUEST_TIMEOUT"], help=f"Seconds before a request's work is cancelled (default: {app.config['REQUEST_TIMEOUT']})")
+    parser.add_argument("--debug", action="store_true", help="Run Flask's development server with the debugger (never expose this)")
+    return parser.parse_args(argv)
+
+
+def run_flask_app(argv=None):
+    args = parse_server_args(argv)
+    app.config["FS_WORKERS"] = args.fs_workers
+    app.config["LLM_WORKERS"] = args.llm_workers
+    app.config["REQUEST_TIMEOUT"] = args.timeout
+    app.config["WALK_JOBS"] = args.walk_jobs
+    app.config["RESPONSE_CACHE_TTL"] = args.response_cache_ttl
 
     # Set static folder to React build directory
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -203,8 +1033,12 @@ def run_flask_app():
         app.logger.error("Static folder does not exist!")
     else:
         app.logger.info(f"Static folder contents: {os.listdir(app.static_folder)}")
-    
-    app.run(port=6789, debug=True, use_reloader=False)
+
+    if args.debug:
+        # No reloader, so the watcher threads and caches aren't started twice
+        app.run(host=args.host, port=args.port, debug=True, use_reloader=False, threaded=True)
+    else:
+        run_server(args.host, args.port, args.threads)
 
 if __name__ == "__main__":
     run_flask_app()
@@ -1,37 +1,217 @@
 import os
+import sys
+import time
 import argparse
-from pathspec import PathSpec
 
-from jackdir.entities.directory_processor import DirectoryProcessor
-from jackdir.use_cases.copy_to_clipboard import CopyToClipboardUseCase
-from jackdir.adapters.clipboard_adapter import ClipboardAdapter
+from jackdir.adapters.daemon import DaemonClient, DaemonError, DaemonUnavailable, default_socket_path, stop_daemon
+from jackdir.adapters.git_index import GitError
+from jackdir.entities.token_budget import PRIORITIES
 
-def parse_args():
+# Kept in sync with directory_processor.DEFAULT_JOBS and DEFAULT_WALK_JOBS; not
+# imported from there so that the thin client (which talks to the daemon)
+# starts quickly
+DEFAULT_JOBS = 8
+DEFAULT_WALK_JOBS = 1
+
+# Options that change the output, and are therefore forwarded to the daemon
+PROCESSING_OPTIONS = (
+    'include_hidden', 'jobs', 'max_file_size', 'truncate', 'max_tokens',
+    'token_priority', 'dedupe', 'stats', 'no_cache', 'clear_cache',
+    'git', 'untracked', 'changed_since', 'walk_jobs', 'follow_symlinks', 'one_file_system',
+)
+
+def parse_size(value):
+    """
+    Parse a byte size such as '2048', '500K', '2M' or '1G'.
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    value = value.strip().upper().rstrip('B')
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid size: {value!r}')
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description='Copy directory tree and file contents to clipboard')
     parser.add_argument('directory', nargs='?', default='.', help='Directory to process (default: current directory)')
     parser.add_argument('--include-hidden', '-i', action='store_true', help='Include hidden files and directories')
-    return parser.parse_args()
-
-def load_gitignore_spec(dir_path):
-    gitignore_path = os.path.join(dir_path, '.gitignore')
-    if os.path.exists(gitignore_path):
-        with open(gitignore_path, 'r') as f:
-            gitignore_content = f.read()
-        patterns = gitignore_content.splitlines()
-        return PathSpec.from_lines('gitwildmatch', patterns)
-    return None
-
-def main():
-    args = parse_args()
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS, help=f'Number of files to read concurrently (default: {DEFAULT_JOBS})')
+    parser.add_argument('--walk-jobs', type=int, default=DEFAULT_WALK_JOBS, help=f'Number of directories to list concurrently; raise it for network or FUSE mounts (default: {DEFAULT_WALK_JOBS})')
+    parser.add_argument('--follow-symlinks', action='store_true', help='Descend into symlinked directories (links back up the tree are skipped)')
+    parser.add_argument('--one-file-system', '-x', action='store_true', help='Do not descend into directories on other file systems')
+    parser.add_argument('--max-file-size', type=parse_size, metavar='SIZE', help='Skip the contents of files larger than SIZE (e.g. 500K, 2M)')
+    parser.add_argument('--truncate', action='store_true', help='Keep the head and tail of files over --max-file-size instead of skipping them')
+    parser.add_argument('--max-tokens', type=int, metavar='N', help='Fit the output in about N LLM tokens; files that do not fit are truncated or listed in the tree only')
+    parser.add_argument('--token-priority', choices=PRIORITIES, default='smallest', help='Which files to keep first under --max-tokens (default: smallest)')
+    parser.add_argument('--dedupe', action='store_true', help='Print files with identical contents once, and a reference for the copies')
+    parser.add_argument('--stats', action='store_true', help='Print timings and counters of the run to stderr')
+    parser.add_argument('--no-cache', action='store_true', help='Do not use the on-disk content cache')
+    parser.add_argument('--clear-cache', action='store_true', help='Empty the on-disk content cache before running')
+    git = parser.add_argument_group('git')
+    git.add_argument('--git', action='store_true', help='Take the files tracked by git (read from .git/index) instead of walking the directory')
+    git.add_argument('--untracked', action='store_true', help='Also include untracked files that are not ignored (implies --git)')
+    git.add_argument('--changed-since', metavar='REF', help='Only include files that differ from REF in the work tree, e.g. HEAD or main (implies --git)')
+    sink = parser.add_mutually_exclusive_group()
+    sink.add_argument('--output', '-o', metavar='FILE', help='Write the output to FILE instead of the clipboard')
+    sink.add_argument('--stdout', action='store_true', help='Write the output to stdout instead of the clipboard')
+    daemon = parser.add_argument_group('daemon')
+    daemon.add_argument('--daemon', action='store_true', help='Run a daemon that keeps walks, ignore rules and file contents warm for later runs')
+    daemon.add_argument('--stop-daemon', action='store_true', help='Stop the running daemon')
+    daemon.add_argument('--no-daemon', action='store_true', help='Run in this process even if a daemon is running')
+    daemon.add_argument('--socket', metavar='PATH', help='Unix socket of the daemon (default: $JACKDIR_SOCKET, or one in $XDG_RUNTIME_DIR or the cache directory)')
+    return parser.parse_args(argv)
+
+def build_processor(args, content_cache=None, listing_cache=None, ignore_rules=None, stats=None):
+    from jackdir.entities.directory_processor import DirectoryProcessor
+    from jackdir.entities.file_reader import FileReader
+    from jackdir.entities.token_budget import TokenBudget
+
+    file_source = None
+    if args.git or args.untracked or args.changed_since:
+        from jackdir.adapters.git_index import GitFileSource
+
+        file_source = GitFileSource(untracked=args.untracked, changed_since=args.changed_since)
+    return DirectoryProcessor(
+        args.include_hidden,
+        jobs=args.jobs,
+        file_reader=FileReader(max_file_size=args.max_file_size, truncate=args.truncate),
+        content_cache=content_cache,
+        respect_gitignore=True,
+        listing_cache=listing_cache,
+        token_budget=TokenBudget(args.max_tokens, args.token_priority) if args.max_tokens else None,
+        dedupe_content=args.dedupe,
+        stats=stats,
+        ignore_rules=ignore_rules,
+        file_source=file_source,
+        walk_jobs=args.walk_jobs,
+        follow_symlinks=args.follow_symlinks,
+        one_filesystem=args.one_file_system,
+    )
+
+def open_cache(args):
+    from jackdir.adapters.content_cache import open_content_cache
+
+    content_cache = None if args.no_cache and not args.clear_cache else open_content_cache()
+    if args.clear_cache and content_cache is not None:
+        content_cache.clear()
+    if args.no_cache:
+        content_cache = None
+    return content_cache
+
+def serve_daemon(socket_path):
+    """
+    Run the daemon in the foreground until it is stopped. Listings (kept
+    current by a file system watcher), compiled ignore files and file
+    contents stay in memory between requests.
+    """
+    import threading
+    from jackdir.adapters.content_cache import MemoryContentCache, open_content_cache
+    from jackdir.adapters.daemon import DaemonServer
+    from jackdir.adapters.fs_watcher import create_watcher
+    from jackdir.entities.ignore_rules import IgnoreRules
+    from jackdir.entities.listing_cache import ListingCache
+    from jackdir.entities.run_stats import RunStats
+    from jackdir.use_cases.write_to_stream import WriteToStreamUseCase
+
+    memory_cache = MemoryContentCache(backing=open_content_cache())
+    ignore_rules = IgnoreRules()
+    listing_caches = {}
+    lock = threading.Lock()
+
+    def handle(options, stream_adapter):
+        started = time.perf_counter()
+        args = argparse.Namespace(**options)
+        if args.clear_cache:
+            memory_cache.clear()
+        # Listings differ by these options, so each combination gets its own cache
+        key = (args.include_hidden, args.follow_symlinks)
+        with lock:
+            if key not in listing_caches:
+                listing_caches[key] = ListingCache(watcher_factory=create_watcher)
+            listing_cache = listing_caches[key]
+        stats = RunStats(explain=True) if args.stats else None
+        processor = build_processor(
+            args,
+            content_cache=None if args.no_cache else memory_cache,
+            listing_cache=listing_cache,
+            ignore_rules=ignore_rules,
+            stats=stats,
+        )
+        WriteToStreamUseCase(processor, stream_adapter).execute(args.directory)
+        return {'stats': stats.format(time.perf_counter() - started) if stats is not None else None}
+
+    server = DaemonServer(socket_path, handle)
+    print(f'jackdir daemon listening on {socket_path}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for listing_cache in listing_caches.values():
+            listing_cache.close()
+        memory_cache.close()
+
+def connect_daemon(args):
+    """
+    DaemonClient for this run, or None if no daemon is running.
+    """
+    options = {name: getattr(args, name) for name in PROCESSING_OPTIONS}
+    try:
+        return DaemonClient(args.socket or default_socket_path(), options)
+    except DaemonUnavailable:
+        return None
+
+def main(argv=None):
+    started = time.perf_counter()
+    args = parse_args(argv)
+
+    if args.daemon or args.stop_daemon:
+        socket_path = args.socket or default_socket_path()
+        if args.daemon:
+            serve_daemon(socket_path)
+            return
+        try:
+            stop_daemon(socket_path)
+            print('Daemon stopped.')
+        except (DaemonUnavailable, DaemonError):
+            print('No daemon is running.')
+        return
+
     dir_path = os.path.abspath(args.directory)
-    spec = load_gitignore_spec(dir_path)
-
-    directory_processor = DirectoryProcessor(args.include_hidden, spec)
-    clipboard_adapter = ClipboardAdapter()
-    copy_to_clipboard_use_case = CopyToClipboardUseCase(directory_processor, clipboard_adapter)
-    
-    result = copy_to_clipboard_use_case.execute(dir_path)
-    print(result)
+    stats = None
+    # Use the warm daemon when one is running, and fall back to doing the work here
+    directory_processor = None if args.no_daemon else connect_daemon(args)
+    if directory_processor is None:
+        from jackdir.entities.run_stats import RunStats
+
+        stats = RunStats(explain=True) if args.stats else None
+        directory_processor = build_processor(args, content_cache=open_cache(args), stats=stats)
+
+    if args.output or args.stdout:
+        from jackdir.adapters.stream_adapter import StreamAdapter
+        from jackdir.use_cases.write_to_stream import WriteToStreamUseCase
+
+        stream_adapter = StreamAdapter(args.output)
+        use_case = WriteToStreamUseCase(directory_processor, stream_adapter)
+    else:
+        from jackdir.adapters.clipboard_adapter import ClipboardAdapter
+        from jackdir.use_cases.copy_to_clipboard import CopyToClipboardUseCase
+
+        clipboard_adapter = ClipboardAdapter()
+        use_case = CopyToClipboardUseCase(directory_processor, clipboard_adapter)
+
+    try:
+        result = use_case.execute(dir_path)
+    except (DaemonError, GitError) as e:
+        sys.exit(f'jackdir: {e}')
+    if result:
+        print(result)
+    if stats is not None:
+        print(stats.format(time.perf_counter() - started), end='', file=sys.stderr)
+    elif args.stats and getattr(directory_processor, 'result', None):
+        print(directory_processor.result['stats'], end='', file=sys.stderr)
 
 if __name__ == '__main__':
     main()
@@ -1,4 +1,6 @@
 import os
+from jackdir.entities.directory_processor import PathEntry
+from jackdir.entities.run_stats import timed
 
 class CopyToClipboardUseCase:
     
@@ -11,10 +13,10 @@ class CopyToClipboardUseCase:
         Existing single-directory use case. 
         Grabs the entire 'dir_path' recursively and copies it.
         """
-        tree_lines = self.directory_processor.generate_tree(dir_path)
-        file_contents = self.directory_processor.collect_file_contents(dir_path)
-        output = '\n'.join(tree_lines) + '\n\n' + '\n'.join(file_contents)
-        self.clipboard_adapter.copy(output)
+        # The clipboard needs a single string, so gather the streamed chunks here
+        output = ''.join(self.directory_processor.iter_output(dir_path))
+        with timed(self.directory_processor.stats, 'clipboard'):
+            self.clipboard_adapter.copy(output)
         return 'Directory tree and file contents copied to clipboard.'
 
 
@@ -32,34 +34,63 @@ class CopyMultiplePathsUseCase:
         - 'paths' can be a mix of files and directories
         - We create a single big text block from them all.
         """
-        combined_text_blocks = []
+        final_output = ''.join(self.stream(paths))
+        with timed(self.directory_processor.stats, 'clipboard'):
+            self.clipboard_adapter.copy(final_output)
 
-        for path in paths:
+        return "Selected items copied to clipboard!"
+
+    def select_roots(self, paths):
+        """
+        Reduce 'paths' to the minimal set of roots to process, in their
+        original order: duplicates are dropped, and so are paths that a
+        selected directory's walk already covers. A path nested in a selected
+        directory but excluded from its walk (e.g. inside node_modules) is
+        kept, since it was picked explicitly.
+        """
+        unique = list(dict.fromkeys(os.path.abspath(path) for path in paths))
+        dirs = [path for path in unique if os.path.isdir(path)]
+        roots = []
+        for path in unique:
+            if any(
+                parent != path
+                and os.path.commonpath([parent, path]) == parent
+                and self.directory_processor.covers(parent, path)
+                for parent in dirs
+            ):
+                continue
+            roots.append(path)
+        return roots
+
+    def stream(self, paths):
+        """
+        Yield the combined output for 'paths' chunk by chunk.
+        Blocks for each root (see select_roots) are separated by a newline,
+        so no file is read or emitted twice.
+        """
+        for i, path in enumerate(self.select_roots(paths)):
+            if i:
+                yield "\n"
             if os.path.isfile(path):
                 # Minimal logic for a single file
                 filename = os.path.basename(path)
+                file_reader = None
+                budget = self.directory_processor.token_budget
+                if budget is not None:
+                    plan = budget.pack([(filename, PathEntry(path))], 0, self.directory_processor.file_reader)
+                    if plan.omitted:
+                        yield self.directory_processor.budget_note(plan.omitted)
+                        continue
+                    file_reader = plan.readers.get(filename)
                 try:
-                    with open(path, 'r') as f:
-                        content = f.read()
+                    with timed(self.directory_processor.stats, 'read'):
+                        content = self.directory_processor.read_file(path, file_reader=file_reader)
                 except Exception as e:
                     content = f"<Error reading file: {e}>"
-                text_block = (
-                    f"----BEGINNING OF {filename}------\n"
-                    f"{content}\n"
-                    f"----END OF {filename}-------\n"
-                )
-                combined_text_blocks.append(text_block)
+                yield self.directory_processor.render_block(filename, content)
             elif os.path.isdir(path):
-                # Reuse directory logic from DirectoryProcessor
-                tree_lines = self.directory_processor.generate_tree(path)
-                file_contents = self.directory_processor.collect_file_contents(path)
-                dir_output = '\n'.join(tree_lines) + '\n\n' + '\n'.join(file_contents)
-                combined_text_blocks.append(dir_output)
+                # Reuse directory logic from DirectoryProcessor (single walk)
+                yield from self.directory_processor.iter_output(path)
             else:
                 # Not file or folder (e.g., broken link)
-                combined_text_blocks.append(f"<Skipping unknown path: {path}>")
-
-        final_output = "\n".join(combined_text_blocks)
-        self.clipboard_adapter.copy(final_output)
-
-        return "Selected items copied to clipboard!"
+                yield f"<Skipping unknown path: {path}>"
@@ -0,0 +1,20 @@
+from jackdir.entities.run_stats import timed
+
+
+class WriteToStreamUseCase:
+    """
+    Streams the directory tree and file contents to a StreamAdapter
+    without building the whole output in memory.
+    """
+
+    def __init__(self, directory_processor, stream_adapter):
+        self.directory_processor = directory_processor
+        self.stream_adapter = stream_adapter
+
+    def execute(self, dir_path):
+        # Walking and reading are timed as their own phases, so 'write' is just the output
+        with timed(self.directory_processor.stats, 'write'):
+            self.stream_adapter.write(self.directory_processor.iter_output(dir_path))
+        if self.stream_adapter.path is None:
+            return None
+        return f'Directory tree and file contents written to {self.stream_adapter.path}.'
@@ -16,6 +16,11 @@ setup(
         'Flask-Cors',
         'openai',
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+        'server': ['waitress'],
+        'msgpack': ['msgpack'],
+    },
     entry_points={
         'console_scripts': [
             'jackdir=jackdir.main:main',
@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMServer:
+    """
+    Minimal OpenAI-compatible stand-in for the Responses API, for offline tests.
+    POST /v1/responses echoes a canned reply, streamed as server-sent events
+    when "stream" is true. 'delay' is slept before each streamed delta.
+    """
+
+    def __init__(self, reply='Ahoy from the stub', delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.requests.append({'path': self.path, 'headers': {k.lower(): v for k, v in self.headers.items()}, 'body': body})
+                if body.get('stream'):
+                    self._stream(body)
+                else:
+                    self._send_json(server._response(body))
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for i, word in enumerate(server.reply.split(' ')):
+                        time.sleep(server.delay)
+                        self._event({'type': 'response.output_text.delta', 'item_id': 'msg_1',
+                                     'output_index': 0, 'content_index': 0, 'delta': word if i == 0 else ' ' + word,
+                                     'sequence_number': 1, 'logprobs': []})
+                    self._event({'type': 'response.completed', 'sequence_number': 2,
+                                 'response': server._response(body)})
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stopped reading (e.g. the request timed out)
+                    pass
+
+            def _event(self, payload):
+                self.wfile.write(f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self._server.server_address[1]}/v1'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _response(self, body):
+        return {
+            'id': 'resp_stub', 'object': 'response', 'created_at': 0, 'status': 'completed',
+            'model': body.get('model'), 'output': [{
+                'type': 'message', 'id': 'msg_1', 'status': 'completed', 'role': 'assistant',
+                'content': [{'type': 'output_text', 'text': self.reply, 'annotations': []}],
+            }],
+            'parallel_tool_calls': False, 'tool_choice': 'auto', 'tools': [],
+        }
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,23 @@
+import gzip
+import pytest
+from jackdir.adapters import compression_adapter
+from jackdir.adapters.compression_adapter import CompressionAdapter
+
+class TestCompressionAdapter:
+    def test_gzip_round_trip(self):
+        chunks = ['tree\n\n'] + [f'block {i}\n' * 100 for i in range(50)]
+        compressed = list(CompressionAdapter('gzip').compress(iter(chunks)))
+        # The first chunk is flushed on its own so clients see bytes immediately
+        assert len(compressed) > 1
+        assert gzip.decompress(b''.join(compressed)).decode('utf-8') == ''.join(chunks)
+
+    @pytest.mark.skipif(compression_adapter.zstandard is None, reason='zstandard is not installed')
+    def test_zstd_round_trip(self):
+        chunks = ['tree\n\n', 'content\n' * 1000]
+        compressed = b''.join(CompressionAdapter('zstd').compress(iter(chunks)))
+        decompressed = compression_adapter.zstandard.ZstdDecompressor().decompressobj().decompress(compressed)
+        assert decompressed.decode('utf-8') == ''.join(chunks)
+
+    def test_unsupported_encoding(self):
+        with pytest.raises(ValueError):
+            CompressionAdapter('brotli')
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import shutil
+from jackdir.adapters.content_cache import ContentCache, MemoryContentCache
+
+class TestContentCache:
+    def setup_method(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_get_and_put(self):
+        cache = ContentCache(self.cache_dir)
+        assert cache.get('missing') is None
+        cache.put('key', 'content')
+        assert cache.get('key') == 'content'
+        cache.close()
+        # Entries survive reopening the cache
+        reopened = ContentCache(self.cache_dir)
+        assert reopened.get('key') == 'content'
+        reopened.close()
+
+    def test_make_key_changes_with_file_metadata(self):
+        path = os.path.join(self.cache_dir, 'file.txt')
+        with open(path, 'w') as f:
+            f.write('one')
+        key = ContentCache.make_key(path, os.stat(path))
+        assert key == ContentCache.make_key(path, os.stat(path))
+        assert key != ContentCache.make_key(path, os.stat(path), 'other-settings')
+        with open(path, 'w') as f:
+            f.write('three')
+        assert key != ContentCache.make_key(path, os.stat(path))
+
+    def test_lru_eviction(self):
+        cache = ContentCache(self.cache_dir, max_bytes=25)
+        cache.put('a', 'x' * 10)
+        cache.put('b', 'y' * 10)
+        cache.get('a')  # 'b' is now the least recently used entry
+        cache.put('c', 'z' * 10)
+        assert cache.get('b') is None
+        assert cache.get('a') == 'x' * 10
+        assert cache.get('c') == 'z' * 10
+        cache.close()
+
+    def test_clear(self):
+        cache = ContentCache(self.cache_dir)
+        cache.put('key', 'content')
+        cache.clear()
+        assert cache.get('key') is None
+        cache.close()
+
+    def test_memory_cache_evicts_and_falls_through(self):
+        backing = ContentCache(self.cache_dir)
+        backing.put('old', 'from disk')
+        cache = MemoryContentCache(backing=backing, max_bytes=10)
+        cache.put('a', 'aaaa')
+        cache.put('b', 'bbbb')
+        assert cache.get('a') == 'aaaa'
+        cache.put('c', 'cccc')
+        # 'b' was the least recently used entry, but the disk still has it
+        assert 'b' not in cache._entries
+        assert cache.get('b') == 'bbbb'
+        assert cache.get('old') == 'from disk'
+        assert 'old' in cache._entries
+        cache.clear()
+        assert cache.get('a') is None
+        cache.close()
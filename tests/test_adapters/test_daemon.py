@@ -0,0 +1,75 @@
+import os
+import tempfile
+import shutil
+import threading
+import time
+import pytest
+from jackdir import main as cli
+from jackdir.adapters.daemon import DaemonClient, DaemonError, DaemonServer, DaemonUnavailable, stop_daemon
+
+class TestDaemon:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.test_dir, 'd.sock')
+        self.project = os.path.join(self.test_dir, 'project')
+        os.makedirs(os.path.join(self.project, 'sub'))
+        with open(os.path.join(self.project, 'a.txt'), 'w') as f:
+            f.write('A')
+        with open(os.path.join(self.project, 'sub', 'b.txt'), 'w') as f:
+            f.write('B')
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def _start(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        for _ in range(100):
+            if os.path.exists(self.socket_path):
+                return thread
+            time.sleep(0.02)
+        raise AssertionError('daemon did not start')
+
+    def test_round_trip_and_stop(self):
+        def handle(options, stream_adapter):
+            stream_adapter.write(iter(['x' * 70000, options['directory'], 'é']))
+            return {'seen': options['flag']}
+
+        server = DaemonServer(self.socket_path, handle)
+        thread = self._start(server.serve_forever)
+        client = DaemonClient(self.socket_path, {'flag': 42})
+        assert ''.join(client.iter_output('/some/dir')) == 'x' * 70000 + '/some/dir' + 'é'
+        assert client.result == {'seen': 42}
+
+        stop_daemon(self.socket_path)
+        thread.join(5)
+        assert not thread.is_alive()
+        assert not os.path.exists(self.socket_path)
+        with pytest.raises(DaemonUnavailable):
+            DaemonClient(self.socket_path, {})
+
+    def test_handler_errors_reach_the_client(self):
+        def handle(options, stream_adapter):
+            raise ValueError('boom')
+
+        server = DaemonServer(self.socket_path, handle)
+        thread = self._start(server.serve_forever)
+        with pytest.raises(DaemonError, match='boom'):
+            list(DaemonClient(self.socket_path, {}).iter_output('/'))
+        server.shutdown()
+        thread.join(5)
+
+    def test_cli_output_matches_in_process(self, capsys, monkeypatch):
+        monkeypatch.setenv('JACKDIR_CACHE_DIR', os.path.join(self.test_dir, 'cache'))
+        cli.main([self.project, '--stdout', '--no-daemon', '--no-cache'])
+        expected = capsys.readouterr().out
+
+        thread = self._start(lambda: cli.main(['--daemon', '--socket', self.socket_path]))
+        try:
+            for _ in range(2):
+                cli.main([self.project, '--stdout', '--socket', self.socket_path])
+                assert capsys.readouterr().out == expected
+        finally:
+            cli.main(['--stop-daemon', '--socket', self.socket_path])
+            thread.join(5)
+        assert 'Daemon stopped.' in capsys.readouterr().out
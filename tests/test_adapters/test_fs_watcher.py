@@ -0,0 +1,75 @@
+import os
+import sys
+import tempfile
+import shutil
+import threading
+import pytest
+from jackdir.adapters.fs_watcher import InotifyWatcher, PollingWatcher
+
+class TestFsWatcher:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.changes = []
+        self.changed = threading.Event()
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def on_change(self, dir_path, name):
+        self.changes.append((dir_path, name))
+        self.changed.set()
+
+    def test_polling_watcher_reports_new_entries(self):
+        watcher = PollingWatcher(self.on_change, interval=3600)
+        try:
+            watcher.watch(self.test_dir)
+            watcher.poll()
+            assert self.changes == []
+            with open(os.path.join(self.test_dir, 'new.txt'), 'w') as f:
+                f.write('x')
+            # Make sure the directory mtime moves even on coarse clocks
+            stat = os.stat(self.test_dir)
+            os.utime(self.test_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            watcher.poll()
+            assert self.changes == [(self.test_dir, '')]
+        finally:
+            watcher.close()
+
+    def test_polling_watcher_reports_gitignore_and_removal(self):
+        watcher = PollingWatcher(self.on_change, interval=3600)
+        try:
+            watcher.watch(self.test_dir)
+            gitignore = os.path.join(self.test_dir, '.gitignore')
+            with open(gitignore, 'w') as f:
+                f.write('*.log\n')
+            watcher.poll()
+            assert self.changes[-1] == (self.test_dir, '.gitignore')
+            shutil.rmtree(self.test_dir)
+            watcher.poll()
+            assert self.changes[-1] == (self.test_dir, None)
+        finally:
+            watcher.close()
+
+    @pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+    def test_inotify_watcher_reports_changes(self):
+        watcher = InotifyWatcher(self.on_change)
+        try:
+            assert watcher.watch(self.test_dir)
+            with open(os.path.join(self.test_dir, 'new.txt'), 'w') as f:
+                f.write('x')
+            assert self.changed.wait(5)
+            assert (self.test_dir, 'new.txt') in self.changes
+        finally:
+            watcher.close()
+
+    @pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+    def test_inotify_watcher_unwatch(self):
+        watcher = InotifyWatcher(self.on_change)
+        try:
+            assert watcher.watch(self.test_dir)
+            watcher.unwatch(self.test_dir)
+            with open(os.path.join(self.test_dir, 'new.txt'), 'w') as f:
+                f.write('x')
+            assert not self.changed.wait(0.5)
+        finally:
+            watcher.close()
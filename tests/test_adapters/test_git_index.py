@@ -0,0 +1,110 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import pytest
+from jackdir import main as cli
+from jackdir.adapters.git_index import GitError, GitFileSource, find_repository, read_index
+from jackdir.entities.directory_processor import DirectoryProcessor
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='git is not installed')
+
+
+def _git(cwd, *args):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+class TestGitIndex:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.files = {
+            'a.txt': 'A',
+            'src/main.py': 'print(1)',
+            'src/deep/er/util.py': 'x = 1',
+            'src/deep/long_' + 'n' * 40 + '.py': 'y = 2',
+            'docs/é.md': 'doc',
+            '.gitignore': 'ignored/\n*.log\n',
+        }
+        for rel_path, content in self.files.items():
+            path = os.path.join(self.test_dir, *rel_path.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(content)
+        _git(self.test_dir, 'init', '-q')
+        _git(self.test_dir, 'add', '.')
+        _git(self.test_dir, 'commit', '-q', '-m', 'init')
+        # Untracked: one to pick up, and ignored ones that must never show up
+        os.makedirs(os.path.join(self.test_dir, 'ignored'))
+        with open(os.path.join(self.test_dir, 'ignored', 'big.txt'), 'w') as f:
+            f.write('big')
+        with open(os.path.join(self.test_dir, 'debug.log'), 'w') as f:
+            f.write('log')
+        with open(os.path.join(self.test_dir, 'src', 'new.py'), 'w') as f:
+            f.write('new')
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def _ls_files(self):
+        out = subprocess.run(['git', 'ls-files', '-z'], cwd=self.test_dir, check=True, capture_output=True).stdout
+        return [os.fsdecode(path) for path in out.split(b'\0') if path]
+
+    @pytest.mark.parametrize('version', ['2', '3', '4'])
+    def test_read_index_versions(self, version):
+        _git(self.test_dir, 'update-index', '--index-version', version)
+        work_tree, git_dir = find_repository(os.path.join(self.test_dir, 'src', 'deep'))
+        assert os.path.samefile(work_tree, self.test_dir)
+        assert read_index(git_dir) == self._ls_files()
+
+    def test_read_index_skips_submodules(self):
+        _git(self.test_dir, 'update-index', '--add', '--cacheinfo',
+             '160000,0123456789012345678901234567890123456789,vendor/lib')
+        assert 'vendor/lib' not in read_index(os.path.join(self.test_dir, '.git'))
+
+    def test_untracked_and_subdirectory(self):
+        source = GitFileSource(untracked=True)
+        assert source.list_files(os.path.join(self.test_dir, 'src')) == [
+            'deep/er/util.py', 'deep/long_' + 'n' * 40 + '.py', 'main.py', 'new.py',
+        ]
+        assert 'debug.log' not in source.list_files(self.test_dir)
+
+    def test_changed_since(self):
+        with open(os.path.join(self.test_dir, 'a.txt'), 'w') as f:
+            f.write('changed')
+        os.remove(os.path.join(self.test_dir, 'docs', 'é.md'))
+        assert GitFileSource(changed_since='HEAD').list_files(self.test_dir) == ['a.txt']
+        with pytest.raises(GitError):
+            GitFileSource(changed_since='no-such-ref').list_files(self.test_dir)
+
+    def test_not_a_repository(self):
+        outside = tempfile.mkdtemp()
+        try:
+            with pytest.raises(GitError):
+                GitFileSource().list_files(outside)
+        finally:
+            shutil.rmtree(outside)
+
+    def test_processor_output_matches_walk(self):
+        walked = DirectoryProcessor(respect_gitignore=True)
+        listed = DirectoryProcessor(respect_gitignore=True, file_source=GitFileSource(untracked=True))
+        assert ''.join(listed.iter_output(self.test_dir)) == ''.join(walked.iter_output(self.test_dir))
+
+    def test_processor_skips_deleted_files(self):
+        os.remove(os.path.join(self.test_dir, 'src', 'main.py'))
+        dp = DirectoryProcessor(file_source=GitFileSource())
+        assert [rel for rel, _ in dp.scan(self.test_dir).files] == [
+            'a.txt',
+            os.path.join('docs', 'é.md'),
+            os.path.join('src', 'deep', 'er', 'util.py'),
+            os.path.join('src', 'deep', 'long_' + 'n' * 40 + '.py'),
+        ]
+
+    def test_cli(self, capsys):
+        cli.main([self.test_dir, '--changed-since', 'HEAD', '--untracked', '--stdout', '--no-daemon'])
+        assert capsys.readouterr().out == (
+            '.\n    src/\n        new.py\n\n'
+            '----BEGINNING OF src/new.py------\nnew\n----END OF src/new.py-------\n'
+        )
+        with pytest.raises(SystemExit, match='jackdir: '):
+            cli.main([self.test_dir, '--changed-since', 'no-such-ref', '--stdout', '--no-daemon'])
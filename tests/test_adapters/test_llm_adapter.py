@@ -0,0 +1,69 @@
+import threading
+from unittest import mock
+from jackdir.adapters.llm_adapter import LLMAdapter
+from tests.llm_stub import StubLLMServer
+
+class TestLLMAdapter:
+    def test_complete_against_stub(self):
+        with StubLLMServer(reply='Arr matey') as server:
+            adapter = LLMAdapter(base_url=server.base_url)
+            assert adapter.complete('key', 'model-x', 'Be brief.', 'Hello') == 'Arr matey'
+            adapter.close()
+        request = server.requests[0]
+        assert request['path'] == '/v1/responses'
+        assert request['headers']['authorization'] == 'Bearer key'
+        assert request['body']['instructions'] == 'Be brief.'
+        assert request['body']['input'] == 'Hello'
+
+    def test_stream_yields_deltas(self):
+        with StubLLMServer(reply='one two three') as server:
+            adapter = LLMAdapter(base_url=server.base_url)
+            deltas = list(adapter.stream('key', 'model-x', 'Be brief.', 'Hello'))
+            adapter.close()
+        assert deltas == ['one', ' two', ' three']
+
+    def test_clients_are_pooled_per_key(self):
+        factory = mock.Mock(side_effect=lambda **kwargs: mock.Mock())
+        adapter = LLMAdapter(base_url='http://localhost:1/v1', client_factory=factory, max_clients=2)
+        first = adapter.client('a')
+        assert adapter.client('a') is first
+        adapter.client('b')
+        adapter.client('a')
+        adapter.client('c')
+        # 'b' was the least recently used one
+        assert factory.call_count == 3
+        assert factory.call_args.kwargs == {'api_key': 'c', 'base_url': 'http://localhost:1/v1'}
+        assert not first.close.called
+        assert adapter.client('a') is first
+        adapter.client('b')
+        assert factory.call_count == 4
+
+    def test_clients_in_use_are_not_closed(self):
+        # More keys than clients kept, all streaming at once
+        keys = [f'key-{i}' for i in range(4)]
+        results = {}
+        with StubLLMServer(reply='one two three', delay=0.05) as server:
+            adapter = LLMAdapter(base_url=server.base_url, max_clients=1)
+
+            def chat(key):
+                try:
+                    results[key] = list(adapter.stream(key, 'model-x', 'Be brief.', 'Hello'))
+                except Exception as e:
+                    results[key] = e
+
+            threads = [threading.Thread(target=chat, args=(key,)) for key in keys]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            adapter.close()
+        assert results == {key: ['one', ' two', ' three'] for key in keys}
+
+    def test_evicted_clients_are_closed_after_their_last_call(self):
+        factory = mock.Mock(side_effect=lambda **kwargs: mock.Mock())
+        adapter = LLMAdapter(client_factory=factory, max_clients=1)
+        with adapter._leased('a') as first:
+            adapter.client('b')
+            assert not first.close.called
+        assert first.close.called
+        assert adapter.client('a') is not first
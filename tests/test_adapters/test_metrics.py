@@ -0,0 +1,29 @@
+from collections import Counter
+
+from jackdir.adapters.metrics import Metrics
+from jackdir.entities.run_stats import RunStats
+
+class TestMetrics:
+    def test_render_counters_and_histogram(self):
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe_request('/api/tree', 'POST', 200, 0.05)
+        metrics.observe_request('/api/tree', 'POST', 200, 0.5)
+        stats = RunStats()
+        stats.record_file('a', 0.01, 123456789)
+        stats.record_dir('a', 0.01, 3, Counter(default=2))
+        metrics.add_run(stats)
+        text = metrics.render()
+        assert '# TYPE jackdir_bytes_read_total counter\njackdir_bytes_read_total 123456789\n' in text
+        assert 'jackdir_entries_excluded_total{reason="default"} 2\n' in text
+        assert 'jackdir_http_requests_total{endpoint="/api/tree",method="POST",status="200"} 2\n' in text
+        assert '# TYPE jackdir_http_request_duration_seconds histogram\n' in text
+        assert 'jackdir_http_request_duration_seconds_bucket{endpoint="/api/tree",method="POST",le="0.1"} 1\n' in text
+        assert 'jackdir_http_request_duration_seconds_bucket{endpoint="/api/tree",method="POST",le="1"} 2\n' in text
+        assert 'jackdir_http_request_duration_seconds_bucket{endpoint="/api/tree",method="POST",le="+Inf"} 2\n' in text
+        assert 'jackdir_http_request_duration_seconds_sum{endpoint="/api/tree",method="POST"} 0.55\n' in text
+        assert 'jackdir_http_request_duration_seconds_count{endpoint="/api/tree",method="POST"} 2\n' in text
+
+    def test_label_values_are_escaped(self):
+        metrics = Metrics()
+        metrics.inc('x_total', 'X.', reason='a"b\\c')
+        assert 'x_total{reason="a\\"b\\\\c"} 1\n' in metrics.render()
@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+from jackdir.adapters.stream_adapter import StreamAdapter
+
+class TestStreamAdapter:
+    def test_write_to_file(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            StreamAdapter(path).write(iter(['first ', 'second']))
+            with open(path, 'r') as f:
+                assert f.read() == 'first second'
+        finally:
+            os.remove(path)
+
+    def test_write_to_stdout(self, capsys):
+        StreamAdapter().write(iter(['a', 'b', 'c']))
+        assert capsys.readouterr().out == 'abc'
+
+    def test_closed_stdout_stops_quietly(self, monkeypatch):
+        read_fd, write_fd = os.pipe()
+        os.close(read_fd)
+        stdout = os.fdopen(write_fd, 'w')
+        monkeypatch.setattr(sys, 'stdout', stdout)
+        produced = []
+
+        def chunks():
+            for i in range(100000):
+                produced.append(i)
+                yield 'x' * 1024
+
+        try:
+            StreamAdapter().write(chunks())
+            # Stopped at the first failed write, and stdout now takes anything
+            assert len(produced) < 100
+            stdout.write('more')
+            stdout.flush()
+        finally:
+            stdout.close()
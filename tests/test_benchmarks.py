@@ -0,0 +1,36 @@
+import os
+import tempfile
+import shutil
+from benchmarks.run import check_regressions
+from benchmarks.synthetic_repo import generate
+
+def _listing(root):
+    found = []
+    for dir_path, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(dir_path, name)
+            found.append((os.path.relpath(path, root), os.path.getsize(path)))
+    return sorted(found)
+
+class TestBenchmarks:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_generator_is_deterministic(self):
+        first = os.path.join(self.test_dir, 'first')
+        second = os.path.join(self.test_dir, 'second')
+        summary = generate(first, files=300, seed=7)
+        assert generate(second, files=300, seed=7) == summary
+        assert _listing(first) == _listing(second)
+        assert summary['source_files'] + summary['binary_files'] + summary['large_files'] + summary['hidden_files'] == 300
+        assert os.path.exists(os.path.join(first, '.gitignore'))
+
+    def test_check_regressions(self):
+        baseline = {'scenarios': {'fast': {'median': 1.0}, 'slow': {'median': 1.0}}}
+        results = {'scenarios': {'fast': {'median': 1.1}, 'slow': {'median': 1.5}, 'new': {'median': 9.0}}}
+        failures = check_regressions(results, baseline, 0.2)
+        assert len(failures) == 1
+        assert failures[0].startswith('slow: 1.500s vs 1.000s baseline')
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import shutil
+import time
+import pytest
+from jackdir.entities.cancel_token import CancelToken, Cancelled
+from jackdir.entities.directory_processor import DirectoryProcessor
+
+class TestCancelToken:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.test_dir, 'a.txt'), 'w') as f:
+            f.write('A')
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_no_timeout(self):
+        token = CancelToken()
+        assert not token.cancelled
+        assert token.remaining() is None
+        token.check()
+
+    def test_cancel(self):
+        token = CancelToken(timeout=60)
+        token.cancel()
+        assert token.cancelled
+        with pytest.raises(Cancelled, match='Cancelled'):
+            token.check()
+
+    def test_timeout(self):
+        token = CancelToken(timeout=0.01)
+        assert 0 < token.remaining() <= 0.01
+        time.sleep(0.02)
+        assert token.cancelled
+        assert token.remaining() == 0.0
+        with pytest.raises(Cancelled, match='Timed out'):
+            token.check()
+
+    def test_processor_stops_when_cancelled(self):
+        token = CancelToken()
+        dp = DirectoryProcessor(cancel=token)
+        assert '    a.txt' in dp.generate_tree(self.test_dir)
+        token.cancel()
+        with pytest.raises(Cancelled):
+            dp.generate_tree(self.test_dir)
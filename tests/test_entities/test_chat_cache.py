@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+from jackdir.entities.chat_cache import ExpiringCache, context_key, response_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestExpiringCache:
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = ExpiringCache(100, ttl=10, clock=clock)
+        cache.put('a', 'answer')
+        clock.now = 9.9
+        assert cache.get('a') == 'answer'
+        clock.now = 10
+        assert cache.get('a') is None
+        assert len(cache) == 0
+
+    def test_least_recently_used_are_evicted(self):
+        cache = ExpiringCache(10)
+        cache.put('a', 'aaaa')
+        cache.put('b', 'bbbb')
+        cache.get('a')
+        cache.put('c', 'cccc')
+        assert (cache.get('a'), cache.get('b'), cache.get('c')) == ('aaaa', None, 'cccc')
+        # Values larger than the whole cache are not kept
+        cache.put('d', 'd' * 11)
+        assert cache.get('d') is None and len(cache) == 2
+
+
+class TestKeys:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.test_dir, 'a.txt')
+        with open(self.file, 'w') as f:
+            f.write('A')
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_context_key_follows_file_metadata(self):
+        key = context_key([self.file], ['options'])
+        assert context_key([self.file], ['options']) == key
+        assert context_key([self.file], ['other options']) != key
+        with open(self.file, 'w') as f:
+            f.write('AB')
+        assert context_key([self.file], ['options']) != key
+        missing = os.path.join(self.test_dir, 'missing.txt')
+        assert context_key([missing], ['options']) != context_key([self.file, missing], ['options'])
+
+    def test_context_key_needs_tree_version_for_directories(self):
+        assert context_key([self.test_dir], []) is None
+        assert context_key([self.test_dir], [], ['cache', 1]) != context_key([self.test_dir], [], ['cache', 2])
+
+    def test_response_key(self):
+        key = response_key('gpt-4o', 'Be brief', 'Hi', 'context')
+        assert response_key('gpt-4o', 'Be brief', 'Hi', 'context') == key
+        assert response_key('gpt-4o', 'Be brief', 'Hi', 'other context') != key
+        assert response_key('gpt-4o-mini', 'Be brief', 'Hi', 'context') != key
+        with_key = response_key('gpt-4o', 'Be brief', 'Hi', 'context', api_key='sk-one')
+        assert response_key('gpt-4o', 'Be brief', 'Hi', 'context', api_key='sk-two') != with_key
+        assert 'sk-one' not in with_key
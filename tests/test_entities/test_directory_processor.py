@@ -1,6 +1,7 @@
 import os
 import tempfile
 import shutil
+import pytest
 from jackdir.entities.directory_processor import DirectoryProcessor
 from pathspec import PathSpec
 
@@ -84,3 +85,143 @@ class TestDirectoryProcessor:
         ]
         assert tree == expected_tree
 
+    def test_scan_returns_tree_and_sorted_files_in_one_pass(self):
+        with open(os.path.join(self.test_dir, 'zzz.txt'), 'w') as f:
+            f.write('Last at top level')
+        dp = DirectoryProcessor(include_hidden=False)
+        scan = dp.scan(self.test_dir)
+        assert scan.tree_lines == [
+            '.',
+            '    file1.txt',
+            '    zzz.txt',
+            '    subdir/',
+            '        file2.txt'
+        ]
+        # Files are ordered by relative path, not by walk order
+        assert [rel for rel, _ in scan.files] == ['file1.txt', os.path.join('subdir', 'file2.txt'), 'zzz.txt']
+        assert scan.files[1][1].path == os.path.join(self.test_dir, 'subdir', 'file2.txt')
+
+    def test_walk_prunes_excluded_directories(self):
+        os.makedirs(os.path.join(self.test_dir, 'node_modules', 'pkg'))
+        dp = DirectoryProcessor(include_hidden=False)
+        walked = [rel_dir for rel_dir, _, _ in dp.walk(self.test_dir)]
+        assert walked == ['', 'subdir']
+
+    def test_concurrent_reads_keep_sorted_order(self):
+        for i in range(20):
+            with open(os.path.join(self.test_dir, 'subdir', f'many_{i:02d}.txt'), 'w') as f:
+                f.write(f'Content {i}' * (i + 1))
+        sequential = DirectoryProcessor(jobs=1).collect_file_contents(self.test_dir)
+        # A tiny in-flight budget forces the pool to drain between submissions
+        concurrent = DirectoryProcessor(jobs=4, max_inflight_bytes=16).collect_file_contents(self.test_dir)
+        assert concurrent == sequential
+        assert len(concurrent) == 22
+
+    def test_iter_output_matches_joined_output(self):
+        dp = DirectoryProcessor(include_hidden=False)
+        expected = '\n'.join(dp.generate_tree(self.test_dir)) + '\n\n' + '\n'.join(dp.collect_file_contents(self.test_dir))
+        assert ''.join(dp.iter_output(self.test_dir)) == expected
+
+    def test_collect_file_contents_skips_binary_files(self):
+        with open(os.path.join(self.test_dir, 'image.bin'), 'wb') as f:
+            f.write(b'\x00\x01\x02binary')
+        dp = DirectoryProcessor(include_hidden=False)
+        contents = dp.collect_file_contents(self.test_dir)
+        assert contents[1] == '----BEGINNING OF image.bin------\n<Binary file skipped>\n----END OF image.bin-------\n'
+
+    def test_content_cache_serves_unchanged_files(self):
+        from unittest import mock
+        from jackdir.adapters.content_cache import ContentCache
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = ContentCache(cache_dir)
+            dp = DirectoryProcessor(include_hidden=False, content_cache=cache)
+            first = dp.collect_file_contents(self.test_dir)
+            with mock.patch.object(dp.file_reader, 'read') as mock_read:
+                assert dp.collect_file_contents(self.test_dir) == first
+            mock_read.assert_not_called()
+
+            # A modified file misses the cache and is read again
+            with open(os.path.join(self.test_dir, 'file1.txt'), 'w') as f:
+                f.write('Changed content')
+            assert 'Changed content' in dp.collect_file_contents(self.test_dir)[0]
+            cache.close()
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_covers_follows_exclusion_rules(self):
+        os.makedirs(os.path.join(self.test_dir, 'node_modules', 'pkg'))
+        processor = DirectoryProcessor()
+        assert processor.covers(self.test_dir, os.path.join(self.test_dir, 'subdir', 'file2.txt'))
+        assert processor.covers(self.test_dir, self.test_dir)
+        assert not processor.covers(self.test_dir, os.path.join(self.test_dir, 'node_modules', 'pkg'))
+        assert not processor.covers(self.test_dir, os.path.join(self.test_dir, '.hidden_file'))
+        assert not processor.covers(os.path.join(self.test_dir, 'subdir'), self.test_dir)
+
+    def test_dedupe_content_references_first_copy(self):
+        body = 'shared line\n' * 40
+        for name in ('a.txt', 'b.txt'):
+            with open(os.path.join(self.test_dir, 'subdir', name), 'w') as f:
+                f.write(body)
+        blocks = DirectoryProcessor(dedupe_content=True).collect_file_contents(self.test_dir)
+        first = os.path.join('subdir', 'a.txt')
+        assert blocks[1] == f'----BEGINNING OF {first}------\n{body}\n----END OF {first}-------\n'
+        second = os.path.join('subdir', 'b.txt')
+        assert blocks[2] == (
+            f'----BEGINNING OF {second}------\n<Same content as {first}>\n----END OF {second}-------\n'
+        )
+        # Short contents are always kept
+        assert 'Content of file2' in blocks[3]
+
+    def _walked(self, dp):
+        return [(rel_dir, [e.name for e in dirs], [e.name for e in files]) for rel_dir, dirs, files in dp.walk(self.test_dir)]
+
+    def test_parallel_walk_matches_serial_walk(self):
+        for i in range(6):
+            for j in range(4):
+                path = os.path.join(self.test_dir, f'dir{i}', f'sub{j}', 'deep')
+                os.makedirs(path)
+                with open(os.path.join(path, f'file{i}{j}.txt'), 'w') as f:
+                    f.write('x')
+        with open(os.path.join(self.test_dir, 'dir3', '.gitignore'), 'w') as f:
+            f.write('sub1/\n')
+        serial = self._walked(DirectoryProcessor(respect_gitignore=True))
+        assert len(serial) == 2 + 6 + 6 * 4 * 2 - 2
+        for _ in range(5):
+            assert self._walked(DirectoryProcessor(respect_gitignore=True, walk_jobs=8)) == serial
+
+    def test_parallel_walk_can_be_abandoned(self):
+        walk = DirectoryProcessor(walk_jobs=4).walk(self.test_dir)
+        assert next(walk)[0] == ''
+        walk.close()
+
+    def test_follow_symlinks_skips_loops(self):
+        other = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(other, 'linked.txt'), 'w') as f:
+                f.write('linked')
+            os.symlink(other, os.path.join(self.test_dir, 'subdir', 'other'))
+            os.symlink(self.test_dir, os.path.join(self.test_dir, 'subdir', 'loop'))
+            assert [rel for rel, _, _ in self._walked(DirectoryProcessor())] == ['', 'subdir']
+            for walk_jobs in (1, 4):
+                walked = self._walked(DirectoryProcessor(follow_symlinks=True, walk_jobs=walk_jobs))
+                assert walked == [
+                    ('', ['subdir'], ['file1.txt']),
+                    ('subdir', ['other'], ['file2.txt']),
+                    ('subdir/other', [], ['linked.txt']),
+                ]
+        finally:
+            shutil.rmtree(other)
+
+    def test_one_filesystem(self):
+        if not os.path.isdir('/dev/shm') or os.stat('/dev/shm').st_dev == os.stat(self.test_dir).st_dev:
+            pytest.skip('needs a second file system')
+        mount = tempfile.mkdtemp(dir='/dev/shm')
+        try:
+            os.symlink(mount, os.path.join(self.test_dir, 'subdir', 'mounted'))
+            walked = [rel for rel, _, _ in self._walked(DirectoryProcessor(follow_symlinks=True))]
+            assert walked == ['', 'subdir', 'subdir/mounted']
+            walked = [rel for rel, _, _ in self._walked(DirectoryProcessor(follow_symlinks=True, one_filesystem=True))]
+            assert walked == ['', 'subdir']
+        finally:
+            shutil.rmtree(mount)
@@ -0,0 +1,72 @@
+import random
+from pathspec import PathSpec
+from jackdir.entities.exclusion_matcher import ExclusionMatcher
+
+DEFAULT_PATTERNS = [
+    'node_modules/', '__pycache__/', '*.py[co]', '*.pyd', '.env', 'venv/', 'env/',
+    '.venv/', 'dist/', 'build/', '*.egg-info/', 'package-lock.json', 'yarn.lock',
+    'pnpm-lock.yaml', 'venv/',
+]
+EXTRA_PATTERNS = [
+    '# comment', '', '*.log', '!keep.log', '/root_only.txt', 'docs/*.md', 'src/**/gen/',
+    'a*b', '?x', '*.[ch]', 'cache/', '!build/', 'foo/**', '**/bar', 'name\\ ', '\\!bang',
+    'trailing   ', '*.txt/', '[Mm]akefile',
+]
+COMPONENTS = [
+    'node_modules', '__pycache__', 'x.pyc', 'x.pyo', 'mod.pyd', '.env', 'venv', 'env', 'dist',
+    'build', 'pkg.egg-info', 'package-lock.json', 'yarn.lock', 'app.log', 'keep.log',
+    'root_only.txt', 'docs', 'readme.md', 'src', 'gen', 'ab', 'axxb', 'zx', 'main.c', 'main.h',
+    'cache', 'foo', 'bar', 'name ', '!bang', 'trailing', 'notes.txt', 'Makefile', 'makefile',
+    'plain', 'x.py', 'env.py', 'xvenv',
+]
+
+
+def pathspec_check(spec, rel_path):
+    # Reference semantics: the last matching pattern decides
+    result = None
+    for pattern in spec.patterns:
+        if pattern.include is not None and pattern.match_file(rel_path) is not None:
+            result = pattern.include
+    return result
+
+
+def random_paths(count, seed=1234):
+    rng = random.Random(seed)
+    for _ in range(count):
+        parts = [rng.choice(COMPONENTS) for _ in range(rng.randint(1, 5))]
+        rel_path = '/'.join(parts)
+        yield rel_path + '/' if rng.random() < 0.4 else rel_path
+
+
+class TestExclusionMatcher:
+    def test_default_patterns_match_pathspec(self):
+        spec = PathSpec.from_lines('gitwildmatch', DEFAULT_PATTERNS)
+        matcher = ExclusionMatcher(DEFAULT_PATTERNS)
+        for rel_path in random_paths(5000):
+            assert matcher.match_file(rel_path) == spec.match_file(rel_path), rel_path
+
+    def test_mixed_patterns_with_negations_match_pathspec(self):
+        lines = DEFAULT_PATTERNS + EXTRA_PATTERNS
+        spec = PathSpec.from_lines('gitwildmatch', lines)
+        matcher = ExclusionMatcher(lines)
+        for rel_path in random_paths(5000, seed=99):
+            assert matcher.check(rel_path) == pathspec_check(spec, rel_path), rel_path
+            assert matcher.match_file(rel_path) == spec.match_file(rel_path), rel_path
+
+    def test_shuffled_pattern_orders_match_pathspec(self):
+        rng = random.Random(7)
+        for _ in range(20):
+            lines = rng.sample(DEFAULT_PATTERNS + EXTRA_PATTERNS, 12)
+            spec = PathSpec.from_lines('gitwildmatch', lines)
+            matcher = ExclusionMatcher(lines)
+            for rel_path in random_paths(300, seed=rng.random()):
+                assert matcher.check(rel_path) == pathspec_check(spec, rel_path), (lines, rel_path)
+
+    def test_basename_patterns_use_fast_path(self):
+        matcher = ExclusionMatcher(DEFAULT_PATTERNS)
+        ((include, segment),) = matcher.segments
+        assert include is True
+        assert segment.regex is None
+        assert 'node_modules' in segment.dir_names
+        assert set(segment.suffixes) >= {'.pyc', '.pyo', '.pyd'}
+        assert segment.dir_suffixes == ('.egg-info',)
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import shutil
+from unittest import mock
+from jackdir.entities import file_reader
+from jackdir.entities.file_reader import FileReader, is_binary, BINARY_PLACEHOLDER
+
+class TestFileReader:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_is_binary(self):
+        assert not is_binary(b'')
+        assert not is_binary(b'plain text\nwith\ttabs\r\n')
+        assert not is_binary('ünïcödé'.encode('utf-8'))
+        assert is_binary(b'SQLite format 3\x00')
+        assert is_binary(bytes(range(1, 7)) * 10)
+
+    def test_reads_text_with_universal_newlines(self):
+        path = self.write('a.txt', b'one\r\ntwo\rthree\n')
+        assert FileReader().read(path) == 'one\ntwo\nthree\n'
+
+    def test_skips_binary(self):
+        path = self.write('img.png', b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR')
+        assert FileReader().read(path) == BINARY_PLACEHOLDER
+
+    def test_max_file_size_placeholder_does_not_open_file(self):
+        path = self.write('big.log', b'x' * 100)
+        with mock.patch('builtins.open') as mock_open:
+            content = FileReader(max_file_size=10).read(path)
+        mock_open.assert_not_called()
+        assert content == '<File too large: 100 bytes, limit is 10 bytes>'
+
+    def test_truncate_keeps_head_and_tail(self):
+        path = self.write('big.log', b'HEAD' + b'.' * 92 + b'TAIL')
+        content = FileReader(max_file_size=8, truncate=True).read(path)
+        assert content == 'HEAD\n<... truncated 92 bytes ...>\nTAIL'
+
+    def test_large_files_are_read_through_mmap(self):
+        path = self.write('large.txt', b'line\r\n' * 100)
+        with mock.patch.object(file_reader, 'MMAP_THRESHOLD', 10):
+            with mock.patch('mmap.mmap', wraps=file_reader.mmap.mmap) as mock_mmap:
+                content = FileReader().read(path)
+        mock_mmap.assert_called_once()
+        assert content == 'line\n' * 100
+
+    def test_decode_errors_are_raised_or_ignored(self):
+        path = self.write('latin1.txt', b'caf\xe9 au lait')
+        try:
+            FileReader().read(path)
+            assert False, 'expected UnicodeDecodeError'
+        except UnicodeDecodeError:
+            pass
+        assert FileReader(errors='ignore').read(path) == 'caf au lait'
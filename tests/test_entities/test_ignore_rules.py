@@ -0,0 +1,89 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import pytest
+from jackdir.entities.directory_processor import DirectoryProcessor
+from jackdir.entities.ignore_rules import IgnoreRules
+
+class TestIgnoreRules:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.write('.gitignore', '*.log\nbuild_out/\n')
+        self.write('keep.log', '')
+        self.write('main.py', '')
+        self.write('pkg/.gitignore', 'generated/\n!keep.log\nsecret.txt\n')
+        self.write('pkg/keep.log', '')
+        self.write('pkg/secret.txt', '')
+        self.write('pkg/module.py', '')
+        self.write('pkg/generated/out.py', '')
+        self.write('pkg/sub/deep.log', '')
+        self.write('pkg/sub/secret.txt', '')
+        self.write('other/secret.txt', '')
+        self.write('build_out/artifact.bin', '')
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, rel_path, content):
+        path = os.path.join(self.test_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def walked_files(self, dp, dir_path=None):
+        scan = dp.scan(dir_path or self.test_dir)
+        return [rel.replace(os.sep, '/') for rel, _ in scan.files]
+
+    def test_nested_gitignore_with_negation(self):
+        dp = DirectoryProcessor(respect_gitignore=True)
+        assert self.walked_files(dp) == [
+            'main.py',
+            'other/secret.txt',
+            'pkg/keep.log',
+            'pkg/module.py',
+        ]
+
+    def test_gitignore_not_applied_unless_requested(self):
+        dp = DirectoryProcessor()
+        assert 'pkg/generated/out.py' in self.walked_files(dp)
+
+    def test_ancestor_gitignore_and_info_exclude_apply_to_subdirectory(self):
+        os.makedirs(os.path.join(self.test_dir, '.git', 'info'))
+        self.write('.git/info/exclude', 'module.py\n')
+        dp = DirectoryProcessor(respect_gitignore=True)
+        assert self.walked_files(dp, os.path.join(self.test_dir, 'pkg')) == ['keep.log']
+
+    def test_ignored_directories_are_pruned(self):
+        dp = DirectoryProcessor(respect_gitignore=True)
+        walked = [rel_dir for rel_dir, _, _ in dp.walk(self.test_dir)]
+        assert walked == ['', 'other', 'pkg', 'pkg/sub']
+
+    def test_should_exclude_uses_nested_rules(self):
+        dp = DirectoryProcessor(respect_gitignore=True)
+        assert dp.should_exclude(os.path.join(self.test_dir, 'pkg', 'sub', 'secret.txt'), False, self.test_dir)
+        assert not dp.should_exclude(os.path.join(self.test_dir, 'other', 'secret.txt'), False, self.test_dir)
+
+    def test_matchers_are_compiled_once(self):
+        rules = IgnoreRules()
+        path = os.path.join(self.test_dir, '.gitignore')
+        assert rules.load(path) is rules.load(path)
+        # Editing the file invalidates the cached matcher
+        self.write('.gitignore', '*.tmp\n*.bak\n')
+        assert rules.load(path).check('x.bak') is True
+
+    @pytest.mark.skipif(shutil.which('git') is None, reason='git is not installed')
+    def test_matches_git_check_ignore(self):
+        subprocess.run(['git', 'init', '-q', self.test_dir], check=True)
+        self.write('.git/info/exclude', 'other/\n')
+        all_files = []
+        for root, dirs, files in os.walk(self.test_dir):
+            dirs[:] = [d for d in dirs if d != '.git']
+            all_files += [os.path.relpath(os.path.join(root, f), self.test_dir) for f in files if f != '.gitignore']
+        result = subprocess.run(
+            ['git', 'check-ignore', '--no-index', '--stdin'],
+            cwd=self.test_dir, input='\n'.join(all_files), capture_output=True, text=True,
+        )
+        git_ignored = set(result.stdout.split())
+        expected = sorted(f for f in all_files if f not in git_ignored)
+        assert self.walked_files(DirectoryProcessor(respect_gitignore=True)) == expected
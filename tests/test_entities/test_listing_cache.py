@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+from jackdir.entities import listing_cache
+from jackdir.entities.directory_processor import DirectoryProcessor
+from jackdir.entities.listing_cache import ListingCache
+
+class FakeWatcher:
+    def __init__(self, on_change):
+        self.on_change = on_change
+        self.watched = []
+        self.closed = False
+
+    def watch(self, dir_path):
+        if dir_path not in self.watched:
+            self.watched.append(dir_path)
+        return True
+
+    def unwatch(self, dir_path):
+        self.watched.remove(dir_path)
+
+    def close(self):
+        self.closed = True
+
+
+class LimitedWatcher(FakeWatcher):
+    # Refuses watches past the first one, like inotify past its watch limit
+    def watch(self, dir_path):
+        if self.watched and dir_path not in self.watched:
+            return False
+        return super().watch(dir_path)
+
+
+class TestListingCache:
+    def setup_method(self):
+        self.cache = ListingCache(watcher_factory=FakeWatcher)
+
+    def store(self, dir_path, rel_dir, listing):
+        token = self.cache.begin(dir_path)
+        self.cache.put(dir_path, rel_dir, listing, token)
+
+    def test_put_and_get(self):
+        self.store('/root', '', 'root listing')
+        assert self.cache.get('/root', '') == 'root listing'
+        # The same directory walked from another root is a different listing
+        assert self.cache.get('/root', 'root') is None
+        assert self.cache.watcher.watched == ['/root']
+
+    def test_nothing_is_cached_without_watcher(self):
+        cache = ListingCache()
+        token = cache.begin('/root')
+        cache.put('/root', '', 'listing', token)
+        assert token is None
+        assert cache.get('/root', '') is None
+
+    def test_change_invalidates_directory_and_entry(self):
+        self.store('/root', '', 'root')
+        self.store(os.path.join('/root', 'sub'), 'sub', 'sub')
+        self.store(os.path.join('/root', 'other'), 'other', 'other')
+        generation = self.cache.generation
+        self.cache.watcher.on_change('/root', 'sub')
+        assert self.cache.generation > generation
+        assert self.cache.get('/root', '') is None
+        assert self.cache.get(os.path.join('/root', 'sub'), 'sub') is None
+        assert self.cache.get(os.path.join('/root', 'other'), 'other') == 'other'
+
+    def test_gitignore_change_invalidates_subtree(self):
+        self.store('/root', '', 'root')
+        self.store(os.path.join('/root', 'a', 'b'), 'a/b', 'deep')
+        self.store('/rootless', '', 'sibling')
+        self.cache.invalidate('/root', '.gitignore')
+        assert self.cache.get(os.path.join('/root', 'a', 'b'), 'a/b') is None
+        assert self.cache.get('/rootless', '') == 'sibling'
+
+    def test_listing_changed_while_scanning_is_not_stored(self):
+        token = self.cache.begin('/root')
+        self.cache.invalidate('/root', 'new_file')
+        self.cache.put('/root', '', 'stale', token)
+        assert self.cache.get('/root', '') is None
+
+    def test_memoize(self):
+        calls = []
+        build = lambda: calls.append(1) or len(calls)
+        assert self.cache.memoize('tree', build) == 1
+        assert self.cache.memoize('tree', build) == 1
+        self.cache.invalidate('/root')
+        assert self.cache.memoize('tree', build) == 2
+
+    def test_least_recently_used_directories_are_dropped(self):
+        cache = ListingCache(watcher_factory=FakeWatcher, max_dirs=2)
+        for path in ('/a', '/b'):
+            cache.put(path, '', path, cache.begin(path))
+        assert cache.get('/a', '') == '/a'
+        generation = cache.generation
+        cache.put('/c', '', '/c', cache.begin('/c'))
+        # /b was used least recently: its listing and watch are gone
+        assert cache.get('/b', '') is None
+        assert cache.watcher.watched == ['/a', '/c']
+        assert cache.generation > generation
+
+    def test_memoize_keeps_recent_values(self, monkeypatch):
+        monkeypatch.setattr(listing_cache, 'MAX_MEMOS', 2)
+        for key in ('a', 'b', 'c'):
+            self.cache.memoize(key, lambda: key)
+        assert list(self.cache._memo) == ['b', 'c']
+
+    def test_ignore_files_above_the_root_are_checked(self):
+        repo = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(repo, '.git', 'info'))
+            os.makedirs(os.path.join(repo, 'sub'))
+            for name in ('a.txt', 'b.log'):
+                with open(os.path.join(repo, 'sub', name), 'w') as f:
+                    f.write(name)
+            dp = DirectoryProcessor(respect_gitignore=True, listing_cache=self.cache)
+            sub = os.path.join(repo, 'sub')
+            assert dp.generate_tree(sub) == ['.', '    a.txt', '    b.log']
+            with open(os.path.join(repo, '.gitignore'), 'w') as f:
+                f.write('*.log\n')
+            assert dp.generate_tree(sub) == ['.', '    a.txt']
+            generation = self.cache.generation
+            assert generation > 0
+            with open(os.path.join(repo, '.git', 'info', 'exclude'), 'w') as f:
+                f.write('a.txt\n')
+            dp.check_ignore_files(sub)
+            assert self.cache.generation > generation
+            assert dp.generate_tree(sub) == ['.']
+        finally:
+            shutil.rmtree(repo)
+
+    def test_unwatched_directories_are_not_trusted(self):
+        root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(root, 'sub'))
+            with open(os.path.join(root, 'sub', 'a.txt'), 'w') as f:
+                f.write('a')
+            cache = ListingCache(watcher_factory=LimitedWatcher)
+            dp = DirectoryProcessor(listing_cache=cache)
+            walk = lambda: cache.memoize(('tree', root), lambda: dp.generate_tree(root))
+            assert walk() == ['.', '    sub/', '        a.txt']
+            assert cache.watcher.watched == [root]
+            generation = cache.generation
+            # Nothing reports this change, as sub isn't watched
+            with open(os.path.join(root, 'sub', 'b.txt'), 'w') as f:
+                f.write('b')
+            assert walk() == ['.', '    sub/', '        a.txt', '        b.txt']
+            assert cache.generation > generation
+        finally:
+            shutil.rmtree(root)
+
+    def test_memoize_skips_values_built_during_a_change(self):
+        build = lambda: self.cache.invalidate('/root') or 'stale'
+        assert self.cache.memoize('tree', build) == 'stale'
+        assert 'tree' not in self.cache._memo
+        assert self.cache.memoize('tree', lambda: 'fresh') == 'fresh'
+
+    def test_close_stops_watcher(self):
+        self.cache.close()
+        assert self.cache.watcher.closed
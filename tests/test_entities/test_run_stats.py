@@ -0,0 +1,71 @@
+import os
+import tempfile
+import shutil
+import time
+from jackdir.entities.directory_processor import DirectoryProcessor
+from jackdir.entities.run_stats import RunStats, SLOWEST_KEPT
+
+class TestRunStats:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.test_dir, 'node_modules'))
+        os.makedirs(os.path.join(self.test_dir, 'src'))
+        with open(os.path.join(self.test_dir, 'src', 'main.py'), 'w') as f:
+            f.write('print(1)')
+        with open(os.path.join(self.test_dir, 'src', 'main.pyc'), 'w') as f:
+            f.write('x')
+        with open(os.path.join(self.test_dir, '.env'), 'w') as f:
+            f.write('SECRET=1')
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_nested_phases_are_exclusive(self):
+        stats = RunStats()
+        with stats.phase('outer'):
+            time.sleep(0.02)
+            with stats.phase('inner'):
+                time.sleep(0.05)
+        assert stats.phase_seconds['inner'] >= 0.05
+        assert 0.02 <= stats.phase_seconds['outer'] < 0.05
+
+    def test_timed_iter_excludes_consumer_time(self):
+        def produce():
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+
+        stats = RunStats()
+        with stats.phase('consume'):
+            for _ in stats.timed_iter('produce', produce()):
+                time.sleep(0.02)
+        assert 0.03 <= stats.phase_seconds['produce'] < 0.06
+        assert stats.phase_seconds['consume'] >= 0.06
+
+    def test_processor_counts_exclusions_and_reads(self):
+        stats = RunStats(explain=True)
+        output = ''.join(DirectoryProcessor(stats=stats).iter_output(self.test_dir))
+        assert 'print(1)' in output
+        assert stats.dirs_scanned == 2
+        assert stats.entries_scanned == 5
+        assert stats.excluded_by == {'node_modules/': 1, 'hidden': 1, '*.py[co]': 1}
+        assert stats.excluded_kinds == {'default': 2, 'hidden': 1}
+        assert stats.entries_excluded == 3
+        assert stats.files_read == 1
+        assert stats.bytes_read == len('print(1)')
+        assert set(stats.phase_seconds) == {'walk', 'read'}
+        assert stats.slowest_files[0][1] == os.path.join(self.test_dir, 'src', 'main.py')
+
+    def test_processor_explains_only_on_request(self):
+        stats = RunStats()
+        list(DirectoryProcessor(stats=stats).iter_output(self.test_dir))
+        assert stats.excluded_kinds == {'default': 2, 'hidden': 1}
+        assert not stats.excluded_by
+        assert stats.entries_excluded == 3
+
+    def test_slowest_are_bounded(self):
+        stats = RunStats()
+        for i in range(SLOWEST_KEPT * 2):
+            stats.record_file(f'f{i}', i, 1)
+        assert sorted(path for _, path in stats.slowest_files) == sorted(f'f{i}' for i in range(SLOWEST_KEPT, SLOWEST_KEPT * 2))
+        assert 'slowest files:' in stats.format(1.0)
@@ -0,0 +1,132 @@
+import os
+import tempfile
+import shutil
+from jackdir.entities import search_index
+from jackdir.entities.cancel_token import CancelToken
+from jackdir.entities.directory_processor import DirectoryProcessor
+from jackdir.entities.listing_cache import ListingCache
+from jackdir.entities.search_index import SearchIndex, fuzzy_score, trigrams
+from tests.test_entities.test_listing_cache import FakeWatcher
+
+class TestSearchIndex:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.write('src/user_model.py', 'class UserModel:\n    def Save(self):\n        pass\n')
+        self.write('src/views.py', 'from user_model import UserModel\n')
+        self.write('docs/model-guide.md', 'How to save a model.\n')
+        self.write('node_modules/lib/user_model.js', 'module.exports = {}\n')
+        with open(os.path.join(self.test_dir, 'logo.png'), 'wb') as f:
+            f.write(b'\x89PNG\x00\x00save')
+        self.cache = ListingCache(watcher_factory=FakeWatcher)
+        self.index = SearchIndex(self.test_dir, DirectoryProcessor(listing_cache=self.cache), self.cache)
+        self.index.build()
+
+    def teardown_method(self):
+        self.index.close()
+        shutil.rmtree(self.test_dir)
+
+    def write(self, rel_path, content):
+        path = os.path.join(self.test_dir, *rel_path.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def changed(self, rel_dir, name=''):
+        # What the watcher reports, through the listing cache
+        self.cache.watcher.on_change(os.path.join(self.test_dir, *rel_dir.split('/')) if rel_dir else self.test_dir, name)
+
+    def names(self, query, **kwargs):
+        return [result['rel_path'] for result in self.index.search(query, **kwargs)]
+
+    def test_trigrams(self):
+        assert trigrams('abcd') == {'abc', 'bcd'}
+        assert trigrams('ab') == set()
+
+    def test_fuzzy_score(self):
+        assert fuzzy_score('view', 'src/views.py') > fuzzy_score('view', 'src/v_i_e_w.py')
+        assert fuzzy_score('xyz', 'src/user_model.py') is None
+        # Matches in the file name beat matches spread over the path
+        assert fuzzy_score('model', 'src/user_model.py') > fuzzy_score('model', 'models/src/x.py')
+
+    def test_name_search(self):
+        assert self.index.names_ready and self.index.ready
+        assert self.names('usermodel', mode='name') == ['src/user_model.py']
+        assert self.names('guide', mode='name') == ['docs/model-guide.md']
+        assert self.names('', mode='name') == []
+
+    def test_content_search(self):
+        results = self.index.search('SAVE', mode='content')
+        assert [r['rel_path'] for r in results] == ['docs/model-guide.md', 'src/user_model.py']
+        assert results[1]['line'] == 2
+        assert results[1]['snippet'] == 'def Save(self):'
+        assert results[1]['path'] == os.path.join(self.test_dir, 'src', 'user_model.py')
+        # Too short for the trigram index
+        assert self.index.search('sa', mode='content') == []
+
+    def test_all_mode_and_limit(self):
+        results = self.index.search('usermodel')
+        assert [(r['rel_path'], r['match']) for r in results] == [
+            ('src/user_model.py', 'name'), ('src/views.py', 'content'),
+        ]
+        assert len(self.index.search('model', limit=1)) == 1
+
+    def test_updates_follow_watcher(self):
+        self.write('src/views.py', 'print("refreshed content")\n')
+        self.changed('src', 'views.py')
+        self.write('lib/new/helper.py', 'def helper(): pass\n')
+        self.changed('', 'lib')
+        os.remove(os.path.join(self.test_dir, 'docs', 'model-guide.md'))
+        self.changed('docs', 'model-guide.md')
+
+        assert self.names('refreshed') == ['src/views.py']
+        assert self.names('import usermodel', mode='content') == []
+        assert self.names('helper') == ['lib/new/helper.py']
+        assert 'docs/model-guide.md' not in self.names('guide')
+
+        shutil.rmtree(os.path.join(self.test_dir, 'lib'))
+        self.changed('lib', None)
+        assert self.names('helper') == []
+
+    def test_gitignore_change(self):
+        index = SearchIndex(self.test_dir, DirectoryProcessor(listing_cache=self.cache, respect_gitignore=True), self.cache)
+        index.build()
+        try:
+            assert 'docs/model-guide.md' in [r['rel_path'] for r in index.search('guide')]
+            self.write('.gitignore', 'docs/\n')
+            self.changed('', '.gitignore')
+            assert index.search('guide') == []
+        finally:
+            index.close()
+
+    def test_stale_documents_are_compacted(self, monkeypatch):
+        monkeypatch.setattr(search_index, 'COMPACT_MIN_STALE', 1)
+        self.write('src/views.py', 'rewritten\n')
+        os.remove(os.path.join(self.test_dir, 'src', 'user_model.py'))
+        self.changed('src')
+        shutil.rmtree(os.path.join(self.test_dir, 'docs'))
+        self.changed('docs', None)
+        assert self.names('rewritten') == ['src/views.py']
+        assert self.index._stale == 0
+        live = {doc for doc, _ in self.index._docs.values()}
+        assert all(set(postings) <= live for postings in self.index._postings.values())
+
+    def test_close_stops_the_build(self, monkeypatch):
+        index = SearchIndex(self.test_dir, DirectoryProcessor(cancel=CancelToken()))
+        reads = []
+
+        def read_trigrams(path, size):
+            # Closed while the contents are being indexed
+            reads.append(path)
+            index.close()
+            return set()
+
+        monkeypatch.setattr(index, '_read_trigrams', read_trigrams)
+        index.build()
+        assert index.names_ready and not index.ready
+        assert len(reads) == 1
+        assert index.closed
+
+        index = SearchIndex(self.test_dir, DirectoryProcessor(cancel=CancelToken()))
+        index.close()
+        index.build()
+        assert not index.names_ready and index._docs == {}
@@ -0,0 +1,90 @@
+import os
+import tempfile
+import shutil
+from unittest import mock
+from jackdir.entities.directory_processor import DirectoryProcessor, PathEntry
+from jackdir.entities.token_budget import TokenBudget, TokenEstimator, estimate_text_tokens
+
+class TestTokenBudget:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.write('small.txt', 'a' * 40, mtime=1_000)
+        self.write('medium.txt', 'b' * 400, mtime=3_000)
+        self.write('large.txt', 'c' * 8000, mtime=2_000)
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, content, mtime):
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        os.utime(path, (mtime, mtime))
+
+    def files(self, *names):
+        return [(name, PathEntry(os.path.join(self.test_dir, name))) for name in names]
+
+    def test_estimator_uses_size_then_recorded_counts(self):
+        estimator = TokenEstimator()
+        path = os.path.join(self.test_dir, 'large.txt')
+        stat_result = os.stat(path)
+        assert estimator.estimate(path, stat_result) == 2000
+        estimator.record(path, stat_result, '<Binary file skipped>')
+        assert estimator.estimate(path, stat_result) == estimate_text_tokens('<Binary file skipped>')
+
+    def test_estimator_keeps_one_bounded_count_per_path(self):
+        estimator = TokenEstimator(max_entries=2)
+        paths = [os.path.join(self.test_dir, name) for name in ('small.txt', 'medium.txt', 'large.txt')]
+        for path in paths:
+            estimator.record(path, os.stat(path), 'x')
+        assert list(estimator._counts) == paths[1:]
+        # A new version of a file replaces its count
+        self.write('large.txt', 'c' * 80, mtime=4_000)
+        assert estimator.estimate(paths[2], os.stat(paths[2])) == 20
+        estimator.record(paths[2], os.stat(paths[2]), 'y')
+        assert len(estimator._counts) == 2
+
+    def test_smallest_first_fills_budget_and_omits_the_rest(self):
+        budget = TokenBudget(200, truncate=False, estimator=TokenEstimator())
+        plan = budget.pack(self.files('large.txt', 'medium.txt', 'small.txt'))
+        # Output order is preserved for the files that made it
+        assert [rel for rel, _ in plan.files] == ['medium.txt', 'small.txt']
+        assert plan.omitted == ['large.txt']
+        assert plan.readers == {}
+
+    def test_recent_first(self):
+        budget = TokenBudget(130, priority='recent', truncate=False, estimator=TokenEstimator())
+        plan = budget.pack(self.files('large.txt', 'medium.txt', 'small.txt'))
+        assert [rel for rel, _ in plan.files] == ['medium.txt']
+        assert plan.omitted == ['large.txt', 'small.txt']
+
+    def test_truncates_file_that_does_not_fit(self):
+        budget = TokenBudget(1000, estimator=TokenEstimator())
+        plan = budget.pack(self.files('large.txt', 'medium.txt', 'small.txt'))
+        assert [rel for rel, _ in plan.files] == ['large.txt', 'medium.txt', 'small.txt']
+        reader = plan.readers['large.txt']
+        assert reader.truncate and reader.max_file_size < 8000
+        assert budget.remaining == 0
+
+    def test_budget_is_shared_across_calls(self):
+        budget = TokenBudget(150, truncate=False, estimator=TokenEstimator())
+        assert budget.pack(self.files('medium.txt'), reserved_tokens=10).omitted == []
+        assert budget.pack(self.files('small.txt')).omitted == ['small.txt']
+
+    def test_unknown_priority(self):
+        try:
+            TokenBudget(10, priority='random')
+            assert False, 'expected ValueError'
+        except ValueError:
+            pass
+
+    def test_directory_output_skips_reading_omitted_files(self):
+        budget = TokenBudget(200, truncate=False, estimator=TokenEstimator())
+        dp = DirectoryProcessor(token_budget=budget, jobs=1)
+        with mock.patch.object(dp.file_reader, 'read', wraps=dp.file_reader.read) as mock_read:
+            output = ''.join(dp.iter_output(self.test_dir))
+        read_paths = [call.args[0] for call in mock_read.call_args_list]
+        assert os.path.join(self.test_dir, 'large.txt') not in read_paths
+        assert '    large.txt' in output
+        assert '----BEGINNING OF large.txt' not in output
+        assert output.endswith('<1 file(s) listed in the tree only, to fit the 200 token budget>\n')
@@ -0,0 +1,434 @@
+import os
+import tempfile
+import shutil
+import pytest
+from jackdir.entities.directory_processor import DirectoryProcessor
+from jackdir.flask_app import app, build_tree, build_flat_tree
+from tests.llm_stub import StubLLMServer
+
+class TestFlaskApp:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.test_dir, 'b_dir'))
+        os.makedirs(os.path.join(self.test_dir, 'node_modules'))
+        with open(os.path.join(self.test_dir, 'a.txt'), 'w') as f:
+            f.write('A')
+        with open(os.path.join(self.test_dir, 'c.txt'), 'w') as f:
+            f.write('C')
+        with open(os.path.join(self.test_dir, 'b_dir', 'inner.txt'), 'w') as f:
+            f.write('Inner')
+        self.client = app.test_client()
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_build_tree(self):
+        tree = build_tree(self.test_dir, DirectoryProcessor())
+        assert tree['type'] == 'directory'
+        assert [child['name'] for child in tree['children']] == ['a.txt', 'b_dir', 'c.txt']
+        b_dir = tree['children'][1]
+        assert b_dir['path'] == os.path.join(self.test_dir, 'b_dir')
+        assert b_dir['children'] == [{
+            'name': 'inner.txt',
+            'path': os.path.join(self.test_dir, 'b_dir', 'inner.txt'),
+            'type': 'file',
+            'children': []
+        }]
+
+    def test_build_flat_tree(self):
+        flat = build_flat_tree(self.test_dir, DirectoryProcessor())
+        assert flat['name'] == [os.path.basename(self.test_dir), 'a.txt', 'b_dir', 'c.txt', 'inner.txt']
+        assert flat['parent'] == [-1, 0, 0, 0, 2]
+        assert flat['kind'] == 'dfdff'
+
+        # Rebuilding the nested form gives exactly build_tree's output
+        nodes = []
+        for i, name in enumerate(flat['name']):
+            parent = nodes[flat['parent'][i]] if i else None
+            node = {
+                'name': name,
+                'path': parent['path'] + flat['sep'] + name if parent else flat['path'],
+                'type': 'directory' if flat['kind'][i] == 'd' else 'file',
+                'children': [],
+            }
+            if parent:
+                parent['children'].append(node)
+            nodes.append(node)
+        assert nodes[0] == build_tree(self.test_dir, DirectoryProcessor())
+
+    def test_api_tree_flat(self):
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir, 'format': 'flat'})
+        data = resp.get_json()
+        assert data['error'] is None
+        assert data['tree']['format'] == 'flat'
+        assert data['tree']['name'][1:] == ['a.txt', 'b_dir', 'c.txt', 'inner.txt']
+
+    def test_api_tree_msgpack(self):
+        msgpack = pytest.importorskip('msgpack')
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir, 'format': 'flat'},
+                                headers={'Accept': 'application/msgpack'})
+        assert resp.mimetype == 'application/msgpack'
+        data = msgpack.unpackb(resp.data)
+        assert data['tree']['kind'] == 'dfdff'
+
+    def test_api_tree(self):
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir})
+        data = resp.get_json()
+        assert data['error'] is None
+        assert [child['name'] for child in data['tree']['children']] == ['a.txt', 'b_dir', 'c.txt']
+
+    def test_api_tree_lazy_first_level(self):
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir, 'lazy': True})
+        tree = resp.get_json()['tree']
+        assert tree['child_count'] == 3
+        assert tree['next_cursor'] is None
+        assert [child['name'] for child in tree['children']] == ['a.txt', 'b_dir', 'c.txt']
+        b_dir = tree['children'][1]
+        # Not expanded yet, but the UI knows it has one child
+        assert b_dir['children'] is None
+        assert b_dir['child_count'] == 1
+
+    def test_api_tree_lazy_pagination(self):
+        names = []
+        cursor = None
+        while True:
+            resp = self.client.post('/api/tree', json={
+                'directory': self.test_dir, 'lazy': True, 'limit': 2, 'cursor': cursor
+            })
+            tree = resp.get_json()['tree']
+            names += [child['name'] for child in tree['children']]
+            cursor = tree['next_cursor']
+            if cursor is None:
+                break
+        assert names == ['a.txt', 'b_dir', 'c.txt']
+
+    def test_api_tree_lazy_subdirectory_and_depth(self):
+        resp = self.client.post('/api/tree', json={
+            'directory': self.test_dir, 'lazy': True, 'path': os.path.join(self.test_dir, 'b_dir')
+        })
+        tree = resp.get_json()['tree']
+        assert tree['path'] == os.path.join(self.test_dir, 'b_dir')
+        assert [child['name'] for child in tree['children']] == ['inner.txt']
+
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir, 'lazy': True, 'depth': 2})
+        b_dir = resp.get_json()['tree']['children'][1]
+        assert [child['name'] for child in b_dir['children']] == ['inner.txt']
+
+    def test_api_tree_lazy_rejects_paths_outside_root(self):
+        resp = self.client.post('/api/tree', json={
+            'directory': os.path.join(self.test_dir, 'b_dir'), 'lazy': True, 'path': self.test_dir
+        })
+        data = resp.get_json()
+        assert data['tree'] is None
+        assert data['error'].startswith('Invalid path')
+
+    def test_api_tree_lazy_rejects_bad_numbers(self):
+        for params in ({'depth': 'deep'}, {'limit': None}, {'limit': [1]}, {'depth': True}):
+            resp = self.client.post('/api/tree', json=dict(params, directory=self.test_dir, lazy=True))
+            assert resp.status_code == 200
+            data = resp.get_json()
+            assert data['tree'] is None
+            assert data['error'].startswith('Invalid ')
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir, 'lazy': True, 'depth': '2', 'limit': 0})
+        assert resp.get_json()['error'] is None
+
+    def test_api_tree_etag_and_invalidation(self):
+        import time
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir})
+        etag = resp.headers['ETag']
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir},
+                                headers={'If-None-Match': etag})
+        assert resp.status_code == 304
+
+        with open(os.path.join(self.test_dir, 'd.txt'), 'w') as f:
+            f.write('D')
+        # Wait for the watcher to report the new file
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            resp = self.client.post('/api/tree', json={'directory': self.test_dir},
+                                    headers={'If-None-Match': etag})
+            if resp.status_code == 200:
+                break
+            time.sleep(0.05)
+        assert resp.status_code == 200
+        names = [child['name'] for child in resp.get_json()['tree']['children']]
+        assert names == ['a.txt', 'b_dir', 'c.txt', 'd.txt']
+
+    def test_api_tree_etag_follows_ignore_files_above(self):
+        os.makedirs(os.path.join(self.test_dir, '.git'))
+        sub = os.path.join(self.test_dir, 'b_dir')
+        resp = self.client.post('/api/tree', json={'directory': sub})
+        etag = resp.headers['ETag']
+        with open(os.path.join(self.test_dir, '.gitignore'), 'w') as f:
+            f.write('inner.txt\n')
+        # Not watched, but checked on every request
+        resp = self.client.post('/api/tree', json={'directory': sub}, headers={'If-None-Match': etag})
+        assert resp.status_code == 200
+        assert resp.get_json()['tree']['children'] == []
+
+    def test_api_tree_no_etag_for_unwatched_directories(self, monkeypatch):
+        from jackdir import flask_app
+        from tests.test_entities.test_listing_cache import LimitedWatcher
+        monkeypatch.setattr(flask_app, 'create_watcher', LimitedWatcher)
+        monkeypatch.setattr(flask_app, '_listing_caches', {})
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir})
+        assert 'ETag' not in resp.headers
+        with open(os.path.join(self.test_dir, 'b_dir', 'new.txt'), 'w') as f:
+            f.write('new')
+        resp = self.client.post('/api/tree', json={'directory': self.test_dir})
+        b_dir = resp.get_json()['tree']['children'][1]
+        assert [child['name'] for child in b_dir['children']] == ['inner.txt', 'new.txt']
+
+    def test_api_chat_token_budget(self):
+        with open(os.path.join(self.test_dir, 'big.txt'), 'w') as f:
+            f.write('x' * 4000)
+        with StubLLMServer(reply='Arr') as server:
+            app.config['LLM_BASE_URL'] = server.base_url
+            try:
+                resp = self.client.post('/api/chat', json={
+                    'prompt': 'Review',
+                    'api_key': 'test',
+                    'selected_paths': [os.path.join(self.test_dir, 'a.txt'), os.path.join(self.test_dir, 'big.txt')],
+                    'max_tokens': 200,
+                    'use_cache': False,
+                })
+            finally:
+                app.config['LLM_BASE_URL'] = None
+        assert resp.get_json() == {'error': None, 'response': 'Arr'}
+        sent = server.requests[0]['body']['input']
+        assert '--- Content of File: ' + os.path.join(self.test_dir, 'a.txt') in sent
+        assert '[Omitted] ' + os.path.join(self.test_dir, 'big.txt') + ': does not fit the 200 token budget' in sent
+
+    def test_api_chat_directory_context(self):
+        with StubLLMServer(reply='Arr') as server:
+            app.config['LLM_BASE_URL'] = server.base_url
+            try:
+                resp = self.client.post('/api/chat', json={
+                    'prompt': 'Review', 'api_key': 'test', 'selected_paths': [self.test_dir],
+                })
+            finally:
+                app.config['LLM_BASE_URL'] = None
+        assert resp.get_json()['error'] is None
+        sent = server.requests[0]['body']['input']
+        assert '--- Directory Structure for: ' + self.test_dir + ' ---\n.\n    a.txt\n    c.txt\n    b_dir/\n        inner.txt\n' in sent
+        assert '"children"' not in sent
+
+    def test_api_chat_reuses_unchanged_context(self, monkeypatch):
+        from jackdir import flask_app
+        selected = [os.path.join(self.test_dir, 'a.txt')]
+        with StubLLMServer(reply='Arr') as server:
+            app.config['LLM_BASE_URL'] = server.base_url
+            try:
+                self.client.post('/api/chat', json={'prompt': 'Hi', 'api_key': 'test', 'selected_paths': selected})
+                # Nothing changed: the context is served without building it again
+                monkeypatch.setattr(flask_app, 'build_chat_context', lambda *args: pytest.fail('context rebuilt'))
+                self.client.post('/api/chat', json={'prompt': 'Again', 'api_key': 'test', 'selected_paths': selected})
+                monkeypatch.undo()
+                with open(selected[0], 'w') as f:
+                    f.write('Changed')
+                self.client.post('/api/chat', json={'prompt': 'Hi', 'api_key': 'test', 'selected_paths': selected})
+            finally:
+                app.config['LLM_BASE_URL'] = None
+        sent = [request['body']['input'] for request in server.requests]
+        assert sent[0].startswith('Hi\n\n') and sent[1].startswith('Again\n\n')
+        assert sent[0][len('Hi'):] == sent[1][len('Again'):]
+        assert '\nA\n' in sent[1] and '\nChanged\n' in sent[2]
+
+    def test_api_chat_context_follows_ignore_files_above(self):
+        os.makedirs(os.path.join(self.test_dir, '.git', 'info'))
+        chat = {'prompt': 'Hi', 'api_key': 'test', 'selected_paths': [os.path.join(self.test_dir, 'b_dir')]}
+        with StubLLMServer(reply='Arr') as server:
+            app.config['LLM_BASE_URL'] = server.base_url
+            try:
+                self.client.post('/api/chat', json=chat)
+                with open(os.path.join(self.test_dir, '.git', 'info', 'exclude'), 'w') as f:
+                    f.write('inner.txt\n')
+                self.client.post('/api/chat', json=chat)
+            finally:
+                app.config['LLM_BASE_URL'] = None
+        sent = [request['body']['input'] for request in server.requests]
+        assert '    inner.txt' in sent[0]
+        assert '    inner.txt' not in sent[1]
+
+    def test_api_chat_response_cache(self, monkeypatch):
+        from jackdir import flask_app
+        monkeypatch.setitem(app.config, 'RESPONSE_CACHE_TTL', 60)
+        monkeypatch.setattr(flask_app, '_chat_caches', {})
+        chat = {'prompt': 'Hi', 'api_key': 'test', 'selected_paths': [os.path.join(self.test_dir, 'c.txt')]}
+        with StubLLMServer(reply='Arr matey') as server:
+            app.config['LLM_BASE_URL'] = server.base_url
+            try:
+                first = self.client.post('/api/chat', json=chat).get_json()
+                second = self.client.post('/api/chat', json=chat).get_json()
+                streamed = self.client.post('/api/chat', json=dict(chat, stream=True)).get_data(as_text=True)
+                self.client.post('/api/chat', json=dict(chat, prompt='Other'))
+                self.client.post('/api/chat', json=dict(chat, use_cache=False))
+                other_key = self.client.post('/api/chat', json=dict(chat, api_key='other')).get_json()
+            finally:
+                app.config['LLM_BASE_URL'] = None
+        assert first == second == {'error': None, 'response': 'Arr matey'}
+        assert streamed == 'event: delta\ndata: {"delta": "Arr matey"}\n\nevent: done\ndata: {}\n\n'
+        assert other_key == first
+        # Only the new prompt, the uncached request and the other key reached the model again
+        assert [request['body']['input'][:5] for request in server.requests] == ['Hi\n\n-', 'Other', 'Hi\n\n-', 'Hi\n\n-']
+        assert server.requests[-1]['headers']['authorization'] == 'Bearer other'
+
+    def test_api_chat_stream(self):
+        with StubLLMServer(reply='Arr matey') as server:
+            app.config['LLM_BASE_URL'] = server.base_url
+            try:
+                resp = self.client.post('/api/chat', json={'prompt': 'Hi', 'api_key': 'test', 'stream': True})
+                body = resp.get_data(as_text=True)
+            finally:
+                app.config['LLM_BASE_URL'] = None
+        assert resp.mimetype == 'text/event-stream'
+        assert body == (
+            'event: delta\ndata: {"delta": "Arr"}\n\n'
+            'event: delta\ndata: {"delta": " matey"}\n\n'
+            'event: done\ndata: {}\n\n'
+        )
+
+    def test_api_chat_stream_error(self):
+        # Nothing listens on this port, so the request fails after the stream started
+        app.config['LLM_BASE_URL'] = 'http://127.0.0.1:9/v1'
+        try:
+            resp = self.client.post('/api/chat', json={'prompt': 'Hi', 'api_key': 'test'},
+                                    headers={'Accept': 'text/event-stream'})
+            body = resp.get_data(as_text=True)
+        finally:
+            app.config['LLM_BASE_URL'] = None
+        assert resp.status_code == 200
+        assert body.startswith('event: error\ndata: {"error": ')
+
+    def test_api_export_streams_output(self):
+        resp = self.client.post('/api/export', json={'selected_paths': [self.test_dir], 'use_cache': False})
+        assert resp.status_code == 200
+        assert resp.is_streamed
+        body = resp.get_data(as_text=True)
+        assert body.startswith('.\n    a.txt\n    c.txt\n    b_dir/\n        inner.txt\n\n')
+        assert '----BEGINNING OF b_dir/inner.txt------\nInner\n' in body
+
+    def test_api_export_gzip(self):
+        import gzip
+        plain = self.client.post('/api/export', json={'selected_paths': [self.test_dir], 'use_cache': False})
+        resp = self.client.post('/api/export', json={
+            'selected_paths': [self.test_dir], 'use_cache': False, 'compression': 'gzip'
+        })
+        assert resp.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(resp.get_data()) == plain.get_data()
+
+    def test_api_export_rejects_unknown_compression(self):
+        resp = self.client.post('/api/export', json={'selected_paths': [self.test_dir], 'compression': 'brotli'})
+        assert resp.status_code == 400
+        assert resp.get_json()['error'] == 'Unsupported compression: brotli'
+
+    def test_api_metrics(self):
+        from unittest import mock
+        with mock.patch('jackdir.flask_app.ClipboardAdapter'):
+            resp = self.client.post('/api/copy_selected', json={
+                'selected_paths': [os.path.join(self.test_dir, 'a.txt')], 'use_cache': False,
+            })
+        resp.close()
+        resp = self.client.get('/api/metrics')
+        assert resp.mimetype == 'text/plain'
+        text = resp.get_data(as_text=True)
+        assert 'jackdir_http_requests_total{endpoint="/api/copy_selected",method="POST",status="200"}' in text
+        assert 'jackdir_http_request_duration_seconds_count{endpoint="/api/copy_selected",method="POST"}' in text
+        assert '# TYPE jackdir_files_read_total counter' in text
+
+    def test_api_search(self):
+        import time
+        deadline = time.time() + 5
+        while True:
+            resp = self.client.post('/api/search', json={'directory': self.test_dir, 'query': 'inner'})
+            data = resp.get_json()
+            if data['ready'] or time.time() > deadline:
+                break
+            time.sleep(0.02)
+        assert data['error'] is None
+        assert [(r['rel_path'], r['match']) for r in data['results']] == [
+            ('b_dir/inner.txt', 'name'),
+        ]
+        resp = self.client.post('/api/search', json={'directory': self.test_dir, 'query': 'Inner', 'mode': 'content'})
+        assert resp.get_json()['results'][0]['snippet'] == 'Inner'
+        resp = self.client.post('/api/search', json={'directory': self.test_dir, 'query': 'x', 'mode': 'regex'})
+        assert resp.get_json()['error'] == 'Invalid mode: regex'
+        resp = self.client.post('/api/search', json={'directory': self.test_dir, 'query': 'x', 'limit': 'ten'})
+        assert resp.status_code == 200
+        assert resp.get_json() == {'error': "Invalid limit: 'ten'", 'results': None}
+
+    def test_api_tree_times_out(self):
+        import time
+        from unittest import mock
+        app.config['REQUEST_TIMEOUT'] = 0.05
+        try:
+            with mock.patch('jackdir.flask_app.build_tree', side_effect=lambda *a: time.sleep(0.5)):
+                resp = self.client.post('/api/tree', json={'directory': self.test_dir, 'use_cache': False})
+        finally:
+            app.config['REQUEST_TIMEOUT'] = 300
+        assert resp.status_code == 504
+        assert 'longer than' in resp.get_json()['error']
+
+    def test_index_view_is_not_shadowed(self):
+        from jackdir import flask_app
+        assert app.view_functions['serve'] is flask_app.serve
+
+    def test_api_tree_busy(self):
+        from jackdir.flask_app import _pool
+        _, slots = _pool('fs')
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            resp = self.client.post('/api/tree', json={'directory': self.test_dir})
+        finally:
+            for _ in range(taken):
+                slots.release()
+        assert resp.status_code == 503
+        assert resp.get_json()['error']
+
+    def _drain(self, pool_name):
+        from jackdir.flask_app import _pool
+        _, slots = _pool(pool_name)
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        return slots, taken
+
+    def test_streamed_responses_take_pool_slots(self):
+        slots, taken = self._drain('llm')
+        try:
+            resp = self.client.post('/api/chat', json={'prompt': 'Hi', 'api_key': 'test', 'stream': True})
+        finally:
+            for _ in range(taken):
+                slots.release()
+        assert resp.status_code == 503
+
+        slots, taken = self._drain('fs')
+        try:
+            resp = self.client.post('/api/export', json={'selected_paths': [self.test_dir], 'use_cache': False})
+        finally:
+            for _ in range(taken):
+                slots.release()
+        assert resp.status_code == 503
+
+        # The slot is given back once the streamed response is closed
+        resp = self.client.post('/api/export', json={'selected_paths': [self.test_dir], 'use_cache': False})
+        resp.get_data()
+        resp.close()
+        slots, available = self._drain('fs')
+        for _ in range(available):
+            slots.release()
+        assert available == taken
+
+    def test_api_chat_stream_times_out_between_deltas(self):
+        with StubLLMServer(reply='Arr matey ahoy', delay=0.2) as server:
+            app.config['LLM_BASE_URL'] = server.base_url
+            app.config['REQUEST_TIMEOUT'] = 0.1
+            try:
+                body = self.client.post('/api/chat', json={'prompt': 'Hi', 'api_key': 'test', 'stream': True}).get_data(as_text=True)
+            finally:
+                app.config['LLM_BASE_URL'] = None
+                app.config['REQUEST_TIMEOUT'] = 300
+        assert 'event: done' not in body
+        assert body.endswith('event: error\ndata: {"error": "The request took longer than 0.1 seconds."}\n\n')
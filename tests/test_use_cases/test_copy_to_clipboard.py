@@ -1,14 +1,19 @@
-from jackdir.use_cases.copy_to_clipboard import CopyToClipboardUseCase
+import os
+import shutil
+import tempfile
+from jackdir.entities.directory_processor import DirectoryProcessor
+from jackdir.use_cases.copy_to_clipboard import CopyToClipboardUseCase, CopyMultiplePathsUseCase
 from unittest import mock
 
 class TestCopyToClipboardUseCase:
     def test_execute(self):
         # Mock DirectoryProcessor
-        mock_directory_processor = mock.Mock()
-        mock_directory_processor.generate_tree.return_value = ['.', '    file.txt']
-        mock_directory_processor.collect_file_contents.return_value = [
+        mock_directory_processor = mock.Mock(stats=None)
+        mock_directory_processor.iter_output.return_value = iter([
+            '.\n    file.txt',
+            '\n\n',
             '----BEGINNING OF file.txt------\nContent\n----END OF file.txt-------\n'
-        ]
+        ])
 
         # Mock ClipboardAdapter
         mock_clipboard_adapter = mock.Mock()
@@ -16,6 +21,40 @@ class TestCopyToClipboardUseCase:
         use_case = CopyToClipboardUseCase(mock_directory_processor, mock_clipboard_adapter)
         result = use_case.execute('/fake/path')
 
+        mock_directory_processor.iter_output.assert_called_once_with('/fake/path')
         expected_output = '.\n    file.txt\n\n----BEGINNING OF file.txt------\nContent\n----END OF file.txt-------\n'
         mock_clipboard_adapter.copy.assert_called_once_with(expected_output)
         assert result == 'Directory tree and file contents copied to clipboard.'
+
+
+class TestCopyMultiplePathsUseCase:
+    def setup_method(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.test_dir, 'src', 'app'))
+        os.makedirs(os.path.join(self.test_dir, 'src', 'node_modules'))
+        with open(os.path.join(self.test_dir, 'src', 'app', 'main.py'), 'w') as f:
+            f.write('print(1)')
+        with open(os.path.join(self.test_dir, 'src', 'node_modules', 'lib.js'), 'w') as f:
+            f.write('lib')
+
+    def teardown_method(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_overlapping_selections_are_read_once(self):
+        src = os.path.join(self.test_dir, 'src')
+        processor = DirectoryProcessor()
+        use_case = CopyMultiplePathsUseCase(processor, mock.Mock())
+        paths = [src, os.path.join(src, 'app', 'main.py'), os.path.join(src, 'app'), src + os.sep]
+        assert use_case.select_roots(paths) == [src]
+
+        with mock.patch.object(processor, 'read_file', wraps=processor.read_file) as read_file:
+            output = ''.join(use_case.stream(paths))
+        assert read_file.call_count == 1
+        assert output.count('print(1)') == 1
+
+    def test_explicit_selection_inside_excluded_directory_is_kept(self):
+        src = os.path.join(self.test_dir, 'src')
+        lib = os.path.join(src, 'node_modules', 'lib.js')
+        use_case = CopyMultiplePathsUseCase(DirectoryProcessor(), mock.Mock())
+        assert use_case.select_roots([src, lib]) == [src, lib]
+        assert '----BEGINNING OF lib.js------\nlib\n' in ''.join(use_case.stream([src, lib]))
@@ -0,0 +1,21 @@
+from jackdir.use_cases.write_to_stream import WriteToStreamUseCase
+from unittest import mock
+
+class TestWriteToStreamUseCase:
+    def test_execute_streams_chunks(self):
+        chunks = iter(['.', '\n\n', 'block'])
+        mock_directory_processor = mock.Mock(stats=None)
+        mock_directory_processor.iter_output.return_value = chunks
+        mock_stream_adapter = mock.Mock(path='/tmp/out.txt')
+
+        use_case = WriteToStreamUseCase(mock_directory_processor, mock_stream_adapter)
+        result = use_case.execute('/fake/path')
+
+        # The generator is handed over as-is, never joined into one string
+        mock_stream_adapter.write.assert_called_once_with(chunks)
+        assert result == 'Directory tree and file contents written to /tmp/out.txt.'
+
+    def test_execute_to_stdout_returns_no_message(self):
+        mock_stream_adapter = mock.Mock(path=None)
+        use_case = WriteToStreamUseCase(mock.Mock(stats=None), mock_stream_adapter)
+        assert use_case.execute('/fake/path') is None